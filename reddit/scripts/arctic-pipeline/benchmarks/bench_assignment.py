@@ -0,0 +1,97 @@
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.assignment import _min_cost_assignment, assign_controls
+
+# Checks the control assignment of match_controls.py --assignment optimal.
+# On small random instances the number of diagnosed users that get all their
+# controls (and the total cost of those controls) is compared with an
+# exhaustive search over the sets of users to fill; the run exits with
+# status 1 on any difference. Then one large instance is timed, next to the
+# plain min-cost max-flow, which assigns the most controls in total.
+# Example runs:
+#     python3 bench_assignment.py
+#     python3 bench_assignment.py --instances 2000 --users 300 --candidates 2100
+
+
+# Function to generate an instance: every user gets eligible pairs with a
+# random share of the candidates, with costs from 0 to max_cost
+def generate_instance(rng, users, candidates, pairs_per_user, max_cost):
+    return [(user, f'candidate{candidate}', rng.randint(0, max_cost))
+            for user in range(users) for candidate in rng.sample(range(candidates), min(pairs_per_user, candidates))]
+
+
+# Function to score an assignment: the users with all their controls, and the total cost of their controls
+def score(capacities, pairs, assigned):
+    costs = {(user, candidate): cost for user, candidate, cost in pairs}
+    full = [user for user, capacity in enumerate(capacities) if capacity and len(assigned[user]) == capacity]
+    return len(full), sum(costs[user, candidate] for user in full for candidate in assigned[user])
+
+
+# Function to find the best score by trying every set of users, largest first
+def brute_force(capacities, pairs):
+    users = [user for user, capacity in enumerate(capacities) if capacity]
+    for size in range(len(users), 0, -1):
+        costs = []
+        for kept in itertools.combinations(users, size):
+            kept_capacities = [capacity if user in kept else 0 for user, capacity in enumerate(capacities)]
+            assigned = _min_cost_assignment(kept_capacities, [pair for pair in pairs if pair[0] in kept])
+            full, cost = score(kept_capacities, pairs, assigned)
+            if full == size:
+                costs.append(cost)
+        if costs:
+            return size, min(costs)
+    return 0, 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the control assignment against exhaustive search and time it.')
+    parser.add_argument('--instances', type=int, default=500, help='Number of small instances checked')
+    parser.add_argument('--users', type=int, default=100, help='Diagnosed users in the timed instance')
+    parser.add_argument('--candidates', type=int, default=700, help='Candidates in the timed instance')
+    parser.add_argument('--pairs_per_user', type=int, default=30, help='Eligible pairs per user in the timed instance')
+    parser.add_argument('--controls', type=int, default=9, help='Controls per diagnosed user in the timed instance')
+    parser.add_argument('--seed', type=int, default=3, help='Random seed')
+
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    mismatches = 0
+    for _ in range(args.instances):
+        users, controls, candidates = rng.randint(1, 6), rng.randint(1, 3), rng.randint(1, 10)
+        capacities = [controls] * users
+        pairs = generate_instance(rng, users, candidates, rng.randint(1, candidates), 20)
+        expected = brute_force(capacities, pairs)
+        found = score(capacities, pairs, assign_controls(capacities, pairs))
+        if found != expected:
+            mismatches += 1
+            print(f"Mismatch: capacities {capacities}, pairs {pairs}")
+            print(f"    expected {expected[0]} full users costing {expected[1]}, got {found[0]} costing {found[1]}")
+
+    capacities = [args.controls] * args.users
+    pairs = generate_instance(rng, args.users, args.candidates, args.pairs_per_user, 100)
+    start_time = time.perf_counter()
+    assigned = assign_controls(capacities, pairs)
+    elapsed = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    flow_assigned = _min_cost_assignment(capacities, pairs)
+    flow_elapsed = time.perf_counter() - start_time
+
+    print("-------------Summary-----------------")
+    print(f"Small instances matching exhaustive search: {args.instances - mismatches} of {args.instances}")
+    print(f"{args.users} users, {len(pairs)} pairs:")
+    print(f"    assign_controls: {score(capacities, pairs, assigned)[0]} users full, "
+          f"{sum(map(len, assigned))} controls, {elapsed:.2f} s")
+    print(f"    max flow:        {score(capacities, pairs, flow_assigned)[0]} users full, "
+          f"{sum(map(len, flow_assigned))} controls, {flow_elapsed:.2f} s")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
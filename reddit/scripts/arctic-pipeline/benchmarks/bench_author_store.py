@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import zstandard
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.arctic_client import BlockingArcticClient
+from common.author_store import AuthorStoreBuilder, OfflineArcticClient
+from common.rate_limiter import get_rate_limiter
+from stub_arctic_server import StubArcticServer, synthetic_history
+
+# Builds an author store from synthetic zstd dumps (the same histories the
+# stub server serves), checks that offline lookups return exactly what the
+# paginated API client fetches, and compares lookup times.
+# Runs without network access.
+# Example run:
+#     python3 bench_author_store.py --authors 2000 --history_size 60
+
+
+def write_dumps(folder, authors, history_size, months=3):
+    # Spread every author's history over a few monthly RS_/RC_ files
+    for kind, prefix in (('posts', 'RS'), ('comments', 'RC')):
+        files = [zstandard.ZstdCompressor().stream_writer(open(os.path.join(folder, f'{prefix}_2024-{month + 1:02d}.zst'), 'wb'))
+                 for month in range(months)]
+        for author in authors:
+            for index, record in enumerate(synthetic_history(author, kind, history_size)):
+                files[index % months].write((json.dumps(record) + '\n').encode('utf-8'))
+        for file in files:
+            file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the offline author store against the API client.')
+    parser.add_argument('--authors', type=int, default=1000, help='Number of authors in the dumps')
+    parser.add_argument('--history_size', type=int, default=60, help='Posts and comments per author')
+    parser.add_argument('--lookups', type=int, default=200, help='Authors looked up in each backend')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds of stub API latency per request')
+
+    args = parser.parse_args()
+
+    authors = [f'user{index}' for index in range(args.authors)]
+    sample = random.Random(0).sample(authors, min(args.lookups, len(authors)))
+
+    with tempfile.TemporaryDirectory() as folder:
+        dump_folder = os.path.join(folder, 'dumps')
+        os.makedirs(dump_folder)
+        write_dumps(dump_folder, authors, args.history_size)
+
+        start_time = time.perf_counter()
+        builder = AuthorStoreBuilder(os.path.join(folder, 'store'), partitions=16)
+        builder.build(sorted(os.path.join(dump_folder, name) for name in os.listdir(dump_folder)))
+        build_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        with OfflineArcticClient(builder.store_path) as offline:
+            offline_results = {author: offline.fetch_user_submissions(author) for author in sample}
+            missing = offline.fetch_user_submissions('not-in-store')
+        offline_time = time.perf_counter() - start_time
+
+        get_rate_limiter().configure(rate=1000, max_rate=1000, burst=100)
+        server = StubArcticServer(latency=args.latency, history_size=args.history_size).start()
+        start_time = time.perf_counter()
+        with BlockingArcticClient(base_url=server.base_url, concurrency=16) as client:
+            api_results = {author: submissions for author, submissions, _ in client.iter_user_submissions(sample)}
+        api_time = time.perf_counter() - start_time
+        server.shutdown()
+
+    mismatches = [author for author in sample if offline_results[author] != api_results[author]]
+    if mismatches or missing:
+        print(f"MISMATCH: offline store differs from the API for {len(mismatches)} authors, e.g. {mismatches[:3]}")
+        sys.exit(1)
+
+    print("-------------Summary-----------------")
+    print(builder.summary())
+    print(f"Build time: {build_time:.2f} s")
+    print(f"Offline lookups: {offline_time / len(sample) * 1000:.2f} ms per author")
+    print(f"API client ({args.latency * 1000:.0f} ms latency, 16 in flight): {api_time / len(sample) * 1000:.2f} ms per author")
+    print(f"All {len(sample)} sampled histories identical")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.dedup import DigestSet
+
+# Compares deduplication with a set of whole texts (the original approach)
+# against DigestSet, in memory and speed, and checks both keep the same texts.
+# A small --memory_mb makes DigestSet spill to disk.
+# Example runs:
+#     python3 bench_dedup.py --posts 500000
+#     python3 bench_dedup.py --posts 500000 --memory_mb 2 --bits 64
+
+WORDS = [
+    'the', 'game', 'was', 'really', 'good', 'last', 'night', 'and', 'think', 'we', 'should', 'go', 'again',
+    'next', 'week', 'my', 'car', 'broke', 'down', 'on', 'highway', 'so', 'had', 'to', 'call', 'friend',
+]
+
+
+# Function to generate posts of 20 to 80 words, about duplicate_rate of them repeating an earlier one
+def generate_texts(count, duplicate_rate, seed):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        if texts and rng.random() < duplicate_rate:
+            texts.append(rng.choice(texts))
+        else:
+            texts.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))) + '.')
+    return texts
+
+
+# Function to run a deduplication twice, returns (kept flags, seconds, peak bytes allocated).
+# Memory is traced in a second run since tracing slows allocations down.
+def measure(texts, new_seen, add):
+    with new_seen() as seen:
+        start_time = time.perf_counter()
+        kept = [add(seen, text) for text in texts]
+        elapsed = time.perf_counter() - start_time
+
+    with new_seen() as seen:
+        tracemalloc.start()
+        # Each text is a fresh copy, as cleaned texts are, so only what is kept stays allocated
+        for text in texts:
+            add(seen, text.encode('utf-8').decode('utf-8'))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        summary = seen.summary() if isinstance(seen, DigestSet) else None
+    return kept, elapsed, peak, summary
+
+
+def add_to_set(seen, text):
+    if text in seen:
+        return False
+    seen.add(text)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark digest-based deduplication against a set of texts.')
+    parser.add_argument('--posts', type=int, default=200000, help='Number of generated posts')
+    parser.add_argument('--duplicate_rate', type=float, default=0.2, help='Share of posts repeating an earlier one')
+    parser.add_argument('--bits', type=int, choices=[64, 128], default=128, help='Digest width')
+    parser.add_argument('--memory_mb', type=float, default=None, help='Memory budget of DigestSet before spilling')
+    parser.add_argument('--seed', type=int, default=3, help='Random seed')
+
+    args = parser.parse_args()
+
+    texts = generate_texts(args.posts, args.duplicate_rate, args.seed)
+
+    expected, set_time, set_peak, _ = measure(texts, lambda: nullcontext(set()), add_to_set)
+    kept, digest_time, digest_peak, summary = measure(texts, lambda: DigestSet(args.bits, args.memory_mb), DigestSet.add)
+
+    if kept != expected:
+        print(f"ERROR: {sum(a != b for a, b in zip(kept, expected))} posts kept differently")
+        sys.exit(1)
+
+    print("-------------Summary-----------------")
+    print(f"Posts: {len(texts)}, unique: {sum(expected)}, same posts kept")
+    print(f"Set of texts: {set_peak / 1024 / 1024:.1f} MB peak, {len(texts) / set_time:.0f} posts/s")
+    print(f"DigestSet:    {digest_peak / 1024 / 1024:.1f} MB peak, {len(texts) / digest_time:.0f} posts/s")
+    print(summary)
+
+
+if __name__ == '__main__':
+    main()
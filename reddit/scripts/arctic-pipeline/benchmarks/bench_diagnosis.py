@@ -0,0 +1,181 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.diagnosis import DiagnosisEngine, MultiConditionDiagnosisEngine, diagnose_conditions_parallel, diagnose_parallel
+
+# Benchmarks the single-pass diagnosis engine against the original
+# per-pattern loop of separate_diagnosed_users.py and checks both agree.
+# With --all_conditions, compares one multi-condition pass against one
+# engine per condition instead.
+# Example run:
+#     python3 bench_diagnosis.py --posts 20000 --condition bipolar --workers 4
+#     python3 bench_diagnosis.py --posts 20000 --all_conditions --workers 4
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'resources')
+
+FILLER_WORDS = [
+    'the', 'game', 'was', 'really', 'good', 'last', 'night', 'and', 'think',
+    'we', 'should', 'go', 'again', 'next', 'week', 'my', 'car', 'broke', 'down',
+    'on', 'highway', 'so', 'had', 'to', 'call', 'friend', 'recipe', 'needs', 'more',
+]
+
+
+def load_patterns(file_path):
+    with open(file_path, 'r') as file:
+        return [line.strip() for line in file.readlines()]
+
+
+# The original implementation, kept here as the reference
+def legacy_find_self_diagnosed_users(posts, positive_patterns, negative_patterns, bipolar_synonyms):
+    diagnosed_users = []
+    unique_authors = set()
+
+    for post in posts:
+        text = post['selftext']
+        author = post['author']
+
+        if author in unique_authors:
+            continue
+
+        bipolar_mentioned = False
+        negative_diagnosis_mentioned = False
+        positive_diagnosis_mentioned = False
+
+        for pattern in negative_patterns:
+            if re.search(re.escape(pattern), text, re.IGNORECASE):
+                negative_diagnosis_mentioned = True
+                break
+
+        for pattern in positive_patterns:
+            match = re.search(re.escape(pattern), text, re.IGNORECASE)
+            if match:
+                positive_diagnosis_mentioned = True
+                start_pos = match.start()
+                end_pos = match.end()
+
+                for synonym in bipolar_synonyms:
+                    synonym_match = re.search(r'\b' + re.escape(synonym) + r'\b', text, re.IGNORECASE)
+                    if synonym_match:
+                        synonym_start_pos = synonym_match.start()
+                        synonym_end_pos = synonym_match.end()
+                        distance = min(abs(start_pos - synonym_end_pos), abs(end_pos - synonym_start_pos))
+                        if distance <= 40:
+                            bipolar_mentioned = True
+                            break
+
+        if bipolar_mentioned and not negative_diagnosis_mentioned and positive_diagnosis_mentioned:
+            diagnosed_users.append(post)
+            unique_authors.add(author)
+
+    return diagnosed_users
+
+
+def filler(rng, count):
+    return ' '.join(rng.choice(FILLER_WORDS) for _ in range(count))
+
+
+def generate_posts(count, users, positive, negative, synonyms, diagnosis_rate, seed):
+    rng = random.Random(seed)
+    posts = []
+    for _ in range(count):
+        parts = [filler(rng, rng.randint(5, 60))]
+        if rng.random() < diagnosis_rate:
+            parts.append(rng.choice(positive))
+            parts.append(filler(rng, rng.randint(0, 12)))
+            parts.append(rng.choice(synonyms))
+            if rng.random() < 0.2:
+                parts.append(rng.choice(negative))
+        parts.append(filler(rng, rng.randint(5, 60)))
+        posts.append({'author': f'user{rng.randrange(users)}', 'selftext': ' '.join(parts) + '.'})
+    return posts
+
+
+def load_all_condition_synonyms():
+    conditions_dir = os.path.join(RESOURCES_DIR, 'conditions')
+    return {file_name[:-len('-syns.txt')]: load_patterns(os.path.join(conditions_dir, file_name))
+            for file_name in sorted(os.listdir(conditions_dir)) if file_name.endswith('-syns.txt')}
+
+
+# Function to compare a multi-condition pass with one engine per condition
+def bench_all_conditions(args, positive, negative):
+    condition_synonyms = load_all_condition_synonyms()
+    all_synonyms = [synonym for synonyms in condition_synonyms.values() for synonym in synonyms if synonym]
+    posts = generate_posts(args.posts, args.users, positive, negative, all_synonyms, args.diagnosis_rate, args.seed)
+
+    start_time = time.perf_counter()
+    separate = {condition: DiagnosisEngine(positive, negative, synonyms).diagnose(posts)
+                for condition, synonyms in condition_synonyms.items()}
+    separate_time = time.perf_counter() - start_time
+
+    engine = MultiConditionDiagnosisEngine(positive, negative, condition_synonyms)
+    start_time = time.perf_counter()
+    single = engine.diagnose(posts)
+    single_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    parallel = diagnose_conditions_parallel(engine, posts, args.workers, chunk_size=max(1, len(posts) // (4 * args.workers)))
+    parallel_time = time.perf_counter() - start_time
+
+    if single != separate or parallel != separate:
+        print("ERROR: multi-condition engine disagrees with one engine per condition")
+        sys.exit(1)
+
+    print("-------------Summary-----------------")
+    print(f"Posts: {len(posts)}, conditions: {len(condition_synonyms)}, diagnosed users: "
+          + ', '.join(f"{condition} {len(diagnosed)}" for condition, diagnosed in separate.items()))
+    print(f"One engine per condition: {separate_time:.3f} s ({len(posts) / separate_time:.0f} posts/s)")
+    print(f"Multi-condition engine, 1 process: {single_time:.3f} s ({len(posts) / single_time:.0f} posts/s)")
+    print(f"Multi-condition engine, {args.workers} processes: {parallel_time:.3f} s ({len(posts) / parallel_time:.0f} posts/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the self-diagnosis engine.')
+    parser.add_argument('--posts', type=int, default=5000, help='Number of synthetic posts')
+    parser.add_argument('--users', type=int, default=2000, help='Number of distinct authors')
+    parser.add_argument('--condition', type=str, default='bipolar', help='Condition whose synonyms are used')
+    parser.add_argument('--diagnosis_rate', type=float, default=0.05, help='Fraction of posts with a diagnosis statement')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes used for the parallel run')
+    parser.add_argument('--seed', type=int, default=7, help='Random seed for the synthetic corpus')
+    parser.add_argument('--all_conditions', action='store_true', help='Benchmark the multi-condition engine on every conditions/*-syns.txt')
+
+    args = parser.parse_args()
+
+    positive = load_patterns(os.path.join(RESOURCES_DIR, 'positive_diagnosis_patterns.txt'))
+    negative = load_patterns(os.path.join(RESOURCES_DIR, 'negative_diagnosis_patterns.txt'))
+    if args.all_conditions:
+        bench_all_conditions(args, positive, negative)
+        return
+    synonyms = load_patterns(os.path.join(RESOURCES_DIR, 'conditions', f'{args.condition}-syns.txt'))
+    posts = generate_posts(args.posts, args.users, positive, negative, synonyms, args.diagnosis_rate, args.seed)
+
+    start_time = time.perf_counter()
+    legacy = legacy_find_self_diagnosed_users(posts, positive, negative, synonyms)
+    legacy_time = time.perf_counter() - start_time
+
+    engine = DiagnosisEngine(positive, negative, synonyms)
+    start_time = time.perf_counter()
+    single = engine.diagnose(posts)
+    single_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    parallel = diagnose_parallel(engine, posts, args.workers, chunk_size=max(1, len(posts) // (4 * args.workers)))
+    parallel_time = time.perf_counter() - start_time
+
+    if single != legacy or parallel != legacy:
+        print("ERROR: diagnosis engine disagrees with the per-pattern loop")
+        sys.exit(1)
+
+    print("-------------Summary-----------------")
+    print(f"Posts: {len(posts)}, diagnosed users: {len(legacy)}")
+    print(f"Per-pattern loop: {legacy_time:.3f} s ({len(posts) / legacy_time:.0f} posts/s)")
+    print(f"Engine, 1 process: {single_time:.3f} s ({len(posts) / single_time:.0f} posts/s)")
+    print(f"Engine, {args.workers} processes: {parallel_time:.3f} s ({len(posts) / parallel_time:.0f} posts/s)")
+
+
+if __name__ == '__main__':
+    main()
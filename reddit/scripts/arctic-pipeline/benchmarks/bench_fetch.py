@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import time
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.arctic_client import BlockingArcticClient
+from common.rate_limiter import AdaptiveRateLimiter
+from stub_arctic_server import StubArcticServer
+
+# Times fetching user histories from a local stub API, one blocking request
+# at a time (the old behaviour) against the pooled async client.
+# The pooled client is paced by its own rate limiter, sized for the stub by
+# default (the pipeline's limiter starts at 4 req/s and would measure that
+# instead); pass the pipeline's --rate_limit 4 --max_rate_limit 40 to see it.
+# Example run:
+#     python3 bench_fetch.py --users 50 --latency 0.1 --concurrency 16
+
+
+def fetch_sequential(base_url, usernames):
+    for username in usernames:
+        for kind in ('posts', 'comments'):
+            response = requests.get(f'{base_url}/{kind}/search?author={username}&limit=auto', verify=False)
+            response.raise_for_status()
+            response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Arctic Shift fetching against a local stub server.')
+    parser.add_argument('--users', type=int, default=40, help='Number of users to fetch')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds of server latency per request')
+    parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight for the pooled client')
+    parser.add_argument('--rate_limit', type=float, default=1000.0, help='Starting requests per second of the pooled client')
+    parser.add_argument('--max_rate_limit', type=float, default=1000.0, help='Most requests per second of the pooled client')
+
+    args = parser.parse_args()
+
+    server = StubArcticServer(latency=args.latency).start()
+    usernames = [f'user{index}' for index in range(args.users)]
+
+    start_time = time.perf_counter()
+    fetch_sequential(server.base_url, usernames)
+    sequential_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    limiter = AdaptiveRateLimiter(rate=args.rate_limit, max_rate=args.max_rate_limit, burst=args.concurrency)
+    with BlockingArcticClient(base_url=server.base_url, concurrency=args.concurrency, limiter=limiter) as client:
+        fetched = 0
+        for username, submissions, error in client.iter_user_submissions(usernames):
+            if error is not None:
+                print(f"ERROR: {username}: {error}")
+                sys.exit(1)
+            fetched += 1
+    pooled_time = time.perf_counter() - start_time
+    server.shutdown()
+
+    print("-------------Summary-----------------")
+    print(f"Users: {fetched}, server latency: {args.latency * 1000:.0f} ms")
+    print(f"Sequential requests: {sequential_time:.2f} s ({args.users / sequential_time:.1f} users/s)")
+    print(f"Pooled client: {pooled_time:.2f} s ({args.users / pooled_time:.1f} users/s)")
+    print(limiter.summary())
+
+
+if __name__ == '__main__':
+    main()
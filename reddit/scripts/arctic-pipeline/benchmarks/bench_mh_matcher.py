@@ -0,0 +1,87 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.patterns import PatternMatcher
+
+# Benchmarks the compiled MH-term matcher against the per-pattern regex loop
+# that exclude_mh_mentions.py and match_controls.py used to run on every post.
+# Example run:
+#     python3 bench_mh_matcher.py --posts 5000 --words 150
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'resources')
+
+FILLER_WORDS = [
+    'the', 'game', 'was', 'really', 'good', 'last', 'night', 'and', 'i', 'think',
+    'we', 'should', 'go', 'again', 'next', 'week', 'my', 'car', 'broke', 'down',
+    'on', 'highway', 'so', 'had', 'to', 'call', 'friend', 'recipe', 'needs', 'more',
+    'salt', 'pepper', 'anyone', 'know', 'where', 'buy', 'cheap', 'tickets', 'for', 'show',
+]
+
+
+def load_patterns(file_path):
+    with open(file_path, 'r') as file:
+        return [line.strip().lower() for line in file.readlines()]
+
+
+# The original implementation, kept here as the reference
+def legacy_contains(text, patterns):
+    text = text.lower()
+    return any(re.search(re.escape(pattern), text) for pattern in patterns)
+
+
+def generate_posts(patterns, count, words, mh_rate, seed):
+    rng = random.Random(seed)
+    posts = []
+    for _ in range(count):
+        tokens = [rng.choice(FILLER_WORDS) for _ in range(words)]
+        if rng.random() < mh_rate:
+            tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(patterns))
+        posts.append(' '.join(tokens) + '.')
+    return posts
+
+
+def time_call(func, posts):
+    start_time = time.perf_counter()
+    results = [func(post) for post in posts]
+    return results, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark MH-term matching strategies.')
+    parser.add_argument('--posts', type=int, default=2000, help='Number of synthetic posts to scan')
+    parser.add_argument('--words', type=int, default=120, help='Words per synthetic post')
+    parser.add_argument('--mh_rate', type=float, default=0.1, help='Fraction of posts containing an MH term')
+    parser.add_argument('--seed', type=int, default=13, help='Random seed for the synthetic corpus')
+
+    args = parser.parse_args()
+
+    patterns = load_patterns(os.path.join(RESOURCES_DIR, 'mh_patterns.txt'))
+    posts = generate_posts(patterns, args.posts, args.words, args.mh_rate, args.seed)
+
+    build_start = time.perf_counter()
+    matcher = PatternMatcher(patterns)
+    build_time = time.perf_counter() - build_start
+
+    legacy_results, legacy_time = time_call(lambda post: legacy_contains(post, patterns), posts)
+    matcher_results, matcher_time = time_call(lambda post: matcher.contains(post.lower()), posts)
+
+    if legacy_results != matcher_results:
+        mismatches = sum(1 for a, b in zip(legacy_results, matcher_results) if a != b)
+        print(f"ERROR: matcher disagrees with the per-pattern loop on {mismatches} posts")
+        sys.exit(1)
+
+    print("-------------Summary-----------------")
+    print(f"Patterns: {len(matcher)}, posts: {len(posts)}, flagged: {sum(matcher_results)}")
+    print(f"Matcher build time: {build_time * 1000:.2f} ms")
+    print(f"Per-pattern loop: {legacy_time:.3f} s ({len(posts) / legacy_time:.0f} posts/s)")
+    print(f"Compiled matcher: {matcher_time:.3f} s ({len(posts) / matcher_time:.0f} posts/s)")
+    print(f"Speedup: {legacy_time / matcher_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
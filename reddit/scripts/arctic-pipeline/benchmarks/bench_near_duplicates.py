@@ -0,0 +1,94 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.near_duplicates import SHINGLE_SIZE, NearDuplicateFilter
+
+# Measures the throughput of the MinHash LSH near-duplicate filter on
+# generated posts with planted copypasta (copies of a few templates with
+# some characters changed), and how many of the planted copies it drops.
+# With --check, the posts kept are also compared pairwise by exact shingle
+# Jaccard similarity (quadratic, keep --posts small).
+# Example runs:
+#     python3 bench_near_duplicates.py --posts 1000000
+#     python3 bench_near_duplicates.py --posts 3000 --check
+
+WORDS = [
+    'the', 'game', 'was', 'really', 'good', 'last', 'night', 'and', 'think', 'we', 'should', 'go', 'again',
+    'next', 'week', 'my', 'car', 'broke', 'down', 'on', 'highway', 'so', 'had', 'to', 'call', 'friend',
+    'recipe', 'needs', 'more', 'salt', 'anyone', 'know', 'where', 'buy', 'cheap', 'tickets', 'for', 'concert',
+]
+
+
+# Function to generate posts, about copy_rate of them an edited copy of one of `templates` texts.
+# Returns the posts and the flags of the planted copies.
+def generate_posts(count, copy_rate, templates, edits, seed):
+    rng = random.Random(seed)
+    template_texts = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(30, 80))) + '.' for _ in range(templates)]
+    used = set()
+    posts = []
+    copies = []
+    for index in range(count):
+        if rng.random() < copy_rate:
+            template = rng.randrange(templates)
+            characters = list(template_texts[template])
+            for _ in range(rng.randint(0, edits)):
+                characters[rng.randrange(len(characters))] = rng.choice('abcdefghij ')
+            text = ''.join(characters)
+            # The first copy of each template is the one kept
+            copies.append(template in used)
+            used.add(template)
+        else:
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))) + '.'
+            copies.append(False)
+        posts.append({'id': str(index), 'selftext': text})
+    return posts, copies
+
+
+def shingles(text):
+    data = text.encode('utf-8').ljust(SHINGLE_SIZE, b'\0')
+    return {data[i:i + SHINGLE_SIZE] for i in range(len(data) - SHINGLE_SIZE + 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the MinHash LSH near-duplicate filter.')
+    parser.add_argument('--posts', type=int, default=200000, help='Number of generated posts')
+    parser.add_argument('--copy_rate', type=float, default=0.1, help='Share of posts copying a template')
+    parser.add_argument('--templates', type=int, default=200, help='Number of copypasta templates')
+    parser.add_argument('--edits', type=int, default=3, help='Most characters changed in a copy')
+    parser.add_argument('--threshold', type=float, default=0.8, help='Similarity threshold of the filter')
+    parser.add_argument('--num_perm', type=int, default=64, help='MinHash hash functions')
+    parser.add_argument('--check', action='store_true', help='Compare the posts kept pairwise by exact Jaccard similarity')
+    parser.add_argument('--seed', type=int, default=3, help='Random seed')
+
+    args = parser.parse_args()
+
+    posts, copies = generate_posts(args.posts, args.copy_rate, args.templates, args.edits, args.seed)
+    near_duplicates = NearDuplicateFilter(args.threshold, args.num_perm)
+
+    start_time = time.perf_counter()
+    kept = list(near_duplicates.filter(posts))
+    elapsed = time.perf_counter() - start_time
+
+    kept_ids = {post['id'] for post in kept}
+    planted = sum(copies)
+    planted_dropped = sum(1 for post, copy in zip(posts, copies) if copy and post['id'] not in kept_ids)
+
+    print("-------------Summary-----------------")
+    print(f"Posts: {len(posts)}, kept: {len(kept)}, {len(posts) / elapsed:.0f} posts/s")
+    print(f"Planted copies dropped: {planted_dropped} of {planted}")
+    print(f"Other posts dropped: {len(posts) - len(kept) - planted_dropped}")
+    print(near_duplicates.summary())
+
+    if args.check:
+        kept_shingles = [shingles(post['selftext']) for post in kept]
+        similar = sum(1 for i in range(len(kept_shingles)) for j in range(i)
+                      if len(kept_shingles[i] & kept_shingles[j]) / len(kept_shingles[i] | kept_shingles[j]) >= args.threshold)
+        print(f"Pairs of posts kept with similarity >= {args.threshold}: {similar}")
+
+
+if __name__ == '__main__':
+    main()
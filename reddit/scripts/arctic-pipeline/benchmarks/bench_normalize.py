@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.normalize import normalize_text, normalize_texts
+
+# Checks that common/normalize.py is byte-identical to the original
+# preprocess_text chain, on the golden corpus and on random fuzz input,
+# then reports throughput in posts per second.
+# Example runs:
+#     python3 bench_normalize.py --posts 20000
+#     python3 bench_normalize.py --write_golden    (regenerate the golden corpus)
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'normalize_corpus.jsonl')
+
+FRAGMENTS = [
+    'Hello', 'WORLD', 'i was', 'really', 'tired', 'today', 'http://example.com/a?b=c', 'https://x.org',
+    '<b>', '</b>', '<a href="x">', '@someone', '&amp;', '&nbsp;', '#blessed', '#', '...', '..', '!!!',
+    '?!', ',,', ';;', ';', ' - ', "don't", '\n', '\t', '  ', ' ', ' ', 'café', 'İstanbul',
+    '\U0001F600', '中文', 'x.y', 'a,b', 'end.', 'why?', 'wow!', '(paren)', '[link](url)', '**bold**',
+    '100%', '$5', '_under_', 'tab\there', '’quote’', 'KK', '\x1c', '\r\n', '>', '<', '&', '@',
+]
+
+
+# The original implementation, kept here as the reference
+def legacy_preprocess_text(text):
+    text = text.lower()
+    text = re.sub(r'https?://\S+', '', text)
+    text = re.sub(r'<.*?>', '', text)
+    text = re.sub(r'@\w+', '', text)
+    text = re.sub(r'&\w+;', ' ', text)
+    text = re.sub(r'#(\w+)', r'\1', text)
+    text = re.sub(r'[^a-zA-Z0-9\s\.\'\!\?\,\;\-]', ' ', text)
+    text = re.sub(r'(?<=[.,!?])(?=[^\s])', r' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'(\.|\!|\?|\,|\;)\1+', r'\1', text)
+    text = re.sub(r'\.{3,}', '.', text)
+    text = text.strip()
+    text = re.sub(r'(?<=\w)([.,;])(?=\S)', r'\1 ', text)
+    if not re.search(r'[.!?]$', text):
+        text += '.'
+    return text
+
+
+def generate_texts(count, seed):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        pieces = [rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 40))]
+        separator = rng.choice([' ', '', ' ', '  '])
+        texts.append(separator.join(pieces))
+    return texts
+
+
+def load_golden():
+    with open(GOLDEN_FILE, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def write_golden(count, seed):
+    os.makedirs(os.path.dirname(GOLDEN_FILE), exist_ok=True)
+    with open(GOLDEN_FILE, 'w', encoding='utf-8') as file:
+        for text in generate_texts(count, seed):
+            file.write(json.dumps({'input': text, 'expected': legacy_preprocess_text(text)}) + '\n')
+    print(f"Golden corpus with {count} texts written to {GOLDEN_FILE}")
+
+
+def check(texts, expected):
+    mismatches = [(text, want, normalize_text(text)) for text, want in zip(texts, expected) if normalize_text(text) != want]
+    for text, want, got in mismatches[:5]:
+        print(f"MISMATCH input={text!r}\n    expected={want!r}\n    got={got!r}")
+    return len(mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify and benchmark the shared text normalizer.')
+    parser.add_argument('--posts', type=int, default=10000, help='Number of fuzz texts for the benchmark')
+    parser.add_argument('--workers', type=int, default=1, help='Processes used by the batch API')
+    parser.add_argument('--seed', type=int, default=3, help='Random seed for the fuzz corpus')
+    parser.add_argument('--write_golden', action='store_true', help='Regenerate the golden corpus from the reference')
+
+    args = parser.parse_args()
+
+    if args.write_golden:
+        write_golden(500, 11)
+        return
+
+    golden = load_golden()
+    failures = check([case['input'] for case in golden], [case['expected'] for case in golden])
+
+    texts = generate_texts(args.posts, args.seed)
+    start_time = time.perf_counter()
+    expected = [legacy_preprocess_text(text) for text in texts]
+    legacy_time = time.perf_counter() - start_time
+    failures += check(texts, expected)
+
+    if failures:
+        print(f"ERROR: {failures} texts differ from the reference implementation")
+        sys.exit(1)
+
+    start_time = time.perf_counter()
+    normalize_texts(texts, args.workers)
+    batch_time = time.perf_counter() - start_time
+
+    print("-------------Summary-----------------")
+    print(f"Golden texts: {len(golden)}, fuzz texts: {len(texts)}, all identical")
+    print(f"Original chain: {len(texts) / legacy_time:.0f} posts/s")
+    print(f"Shared normalizer ({args.workers} process): {len(texts) / batch_time:.0f} posts/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.author_store import OfflineArcticClient, find_dump_files
+from common.telemetry import write_run_metrics
+from generate_corpus import add_corpus_arguments, corpus_options, generate_corpus
+
+# Times the pipeline stages on synthetic corpora of several sizes, without
+# real dumps or network access, and keeps the results to compare over time.
+# For every scale (number of users):
+#   1. a corpus is generated with generate_corpus.py,
+#   2. an offline author store is built from it (utils/build_author_index.py),
+#   3. clean .. format_diagnosed run as `python3 -m pipeline --offline`, so
+#      fetch reads the store instead of the API; the stage timings come from
+#      the metrics.json of that run,
+#   4. format_clean_control.py formats the histories of undiagnosed users,
+#      saved as matched control batches (candidates and match need the API's
+#      subreddit listings, so they are not run).
+# Every step runs in its own process, so peak memory is per step (a child
+# starts from this process's resident memory, which is kept small).
+# Every run is added to --results and each stage is compared with the last
+# earlier run that used the same corpus options and workers.
+# Example runs:
+#     python3 bench_stages.py --scales 200 1000 5000 --workers 4
+#     python3 bench_stages.py --scales 20000 --posts_per_user 100 --fail_on_regression
+
+PIPELINE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BUILD_AUTHOR_INDEX = os.path.join(PIPELINE_ROOT, '..', 'utils', 'build_author_index.py')
+FORMAT_CONTROL = os.path.join(PIPELINE_ROOT, 'preprocessing', 'format_clean_control.py')
+DEFAULT_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'stages.json')
+CONTROLS_PER_DIAGNOSED = 9
+MATCHES_PER_BATCH = 10
+
+
+# Function to get the short hash of the checked out commit, None outside a git checkout
+def current_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PIPELINE_ROOT,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Function to run a command with its output in log_file, returns the wall
+# time, CPU time and peak memory of the process (and the processes it waited on)
+def run_measured(command, log_file):
+    start_time = time.perf_counter()
+    with open(log_file, 'w', encoding='utf-8') as log:
+        process = subprocess.Popen(command, cwd=PIPELINE_ROOT, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 gives the resource usage of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.perf_counter() - start_time
+    if process.returncode != 0:
+        with open(log_file, 'r', encoding='utf-8') as log:
+            print(log.read()[-3000:])
+        raise RuntimeError(f"{' '.join(command[:2])} failed with exit code {process.returncode}, see {log_file}")
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'wall_seconds': round(elapsed, 3),
+        'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 3),
+        'peak_rss_mb': round(usage.ru_maxrss * unit / 1024 / 1024, 1),
+    }
+
+
+# Function to get the metrics of a step run as one process, in the format of StageTimer.metrics
+def process_metrics(measured, records_in, records_out):
+    return {
+        'cached': False,
+        'wall_seconds': measured['wall_seconds'],
+        'cpu_seconds': measured['cpu_seconds'],
+        'child_cpu_seconds': 0.0,
+        'records_in': records_in,
+        'records_out': records_out,
+        'records_per_second': round(records_in / measured['wall_seconds'], 1) if measured['wall_seconds'] else None,
+        'peak_rss_mb': measured['peak_rss_mb'],
+        'peak_child_rss_mb': None,
+    }
+
+
+# Function to save the histories of users as matched control batches, in the
+# format match_controls.py writes, returns the number of posts saved
+def write_synthetic_matches(client, usernames, output_folder):
+    os.makedirs(output_folder, exist_ok=True)
+    group_size = CONTROLS_PER_DIAGNOSED + 1
+    matches = []
+    for start in range(0, len(usernames) - CONTROLS_PER_DIAGNOSED, group_size):
+        group = usernames[start:start + group_size]
+        matches.append({'diagnosed_user': group[0], 'controls': [
+            {'username': username, 'posts': client.fetch_user_submissions(username)} for username in group[1:]]})
+    for batch_index, start in enumerate(range(0, len(matches), MATCHES_PER_BATCH)):
+        with open(os.path.join(output_folder, f'matched_control_batch_{batch_index}.json'), 'w', encoding='utf-8') as file:
+            json.dump(matches[start:start + MATCHES_PER_BATCH], file)
+    return sum(len(control['posts']) for match in matches for control in match['controls'])
+
+
+# Function to count the rows of a CSV file without newlines in its values
+def count_rows(file_path):
+    with open(file_path, 'rb') as file:
+        return max(sum(1 for _ in file) - 1, 0)
+
+
+# Function to benchmark every stage at one scale, returns the corpus statistics and the stage metrics
+def bench_scale(users, args, work_folder):
+    corpus_folder = os.path.join(work_folder, 'corpus')
+    store_path = os.path.join(work_folder, 'author_store')
+    output_folder = os.path.join(work_folder, 'output')
+    control_folder = os.path.join(work_folder, 'control')
+    control_csv = os.path.join(work_folder, 'control-data.cymo.csv')
+
+    start_time = time.perf_counter()
+    corpus = generate_corpus(corpus_folder, users, args.compress, **corpus_options(args))
+    corpus['generate_seconds'] = round(time.perf_counter() - start_time, 3)
+    corpus['bytes'] = sum(os.path.getsize(file_path) for file_path in find_dump_files(corpus_folder))
+    records = corpus['posts'] + corpus['comments']
+
+    measured = run_measured([sys.executable, BUILD_AUTHOR_INDEX, corpus_folder, '--store', store_path, '--partitions', '16'],
+                            os.path.join(work_folder, 'author_store.log'))
+    with open(os.path.join(store_path, 'manifest.json'), 'r', encoding='utf-8') as file:
+        stored = json.load(file)['records']
+    stages = {'author_store': process_metrics(measured, records, stored)}
+
+    run_measured([sys.executable, '-m', 'pipeline', '--condition', args.condition, '--input_folder', corpus_folder,
+                  '--output_folder', output_folder, '--until', 'format_diagnosed', '--no_stage_cache',
+                  '--offline', '--author_store', store_path, '--workers', str(args.workers)],
+                 os.path.join(work_folder, 'pipeline.log'))
+    with open(os.path.join(output_folder, 'metrics.json'), 'r', encoding='utf-8') as file:
+        stages.update(json.load(file)['runs'][-1]['stages'])
+
+    diagnosed = set()
+    final_output = os.path.join(output_folder, 'diagnosed', 'data-diagnosed.final.jsonl')
+    if os.path.exists(final_output):
+        with open(final_output, 'r', encoding='utf-8') as file:
+            diagnosed = {json.loads(line)['username'] for line in file if line.strip()}
+    with OfflineArcticClient(store_path) as client:
+        control_posts = write_synthetic_matches(
+            client, [f'user{index}' for index in range(users) if f'user{index}' not in diagnosed], control_folder)
+    measured = run_measured([sys.executable, FORMAT_CONTROL, control_folder, control_csv],
+                            os.path.join(work_folder, 'format_control.log'))
+    stages['format_control'] = process_metrics(measured, control_posts, count_rows(control_csv))
+    return corpus, stages
+
+
+# Function to find the stages of the last earlier run with the same options at a scale
+def previous_stages(runs, run, users):
+    for earlier in reversed(runs):
+        if (earlier.get('corpus_options') == run['corpus_options'] and earlier.get('workers') == run['workers']
+                and str(users) in earlier.get('scales', {})):
+            return earlier['scales'][str(users)]['stages'], earlier.get('commit')
+    return None, None
+
+
+# Function to print the stages of a scale next to the previous run, returns the stages that got slower
+def print_scale(users, scale, previous, previous_commit, threshold):
+    corpus = scale['corpus']
+    slower = []
+    print(f"------------- {users} users, {corpus['posts'] + corpus['comments']} records, "
+          f"{corpus['bytes'] / 1024 / 1024:.1f} MB -------------")
+    versus = f"vs {previous_commit or 'last run'}" if previous else ''
+    print(f"{'stage':<20} {'wall s':>9} {'cpu s':>9} {'records/s':>12} {'peak MB':>9}  {versus}")
+    for name, metrics in scale['stages'].items():
+        change = ''
+        before = (previous or {}).get(name)
+        if before and before.get('wall_seconds'):
+            ratio = metrics['wall_seconds'] / before['wall_seconds'] - 1
+            change = f"{ratio:+.1%}"
+            # Very short stages are mostly noise
+            if ratio > threshold and metrics['wall_seconds'] >= 0.1:
+                change += '  slower'
+                slower.append(name)
+        rate = metrics['records_per_second']
+        rate = '-' if rate is None else f"{rate:.0f}"
+        peaks = [peak for peak in (metrics['peak_rss_mb'], metrics['peak_child_rss_mb']) if peak is not None]
+        peak = f"{max(peaks):.0f}" if peaks else '-'
+        print(f"{name:<20} {metrics['wall_seconds']:>9.2f} {metrics['cpu_seconds'] + metrics['child_cpu_seconds']:>9.2f} "
+              f"{rate:>12} {peak:>9}  {change}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic corpora of several sizes.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[200, 1000, 5000], help='Numbers of users to benchmark')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes used for cleaning and diagnosis')
+    parser.add_argument('--compress', type=str, choices=['zst', 'gz'], default=None, help='Compress the generated dumps')
+    parser.add_argument('--results', type=str, default=DEFAULT_RESULTS, help='JSON file the runs are added to')
+    parser.add_argument('--work_dir', type=str, default=None,
+                        help='Keep the corpora and outputs in this folder (default: a temporary folder)')
+    parser.add_argument('--regression_threshold', type=float, default=0.2,
+                        help='Flag stages this much slower than the last comparable run (0.2 = 20%%)')
+    parser.add_argument('--fail_on_regression', action='store_true', help='Exit with status 1 when a stage got slower')
+    add_corpus_arguments(parser)
+
+    args = parser.parse_args()
+
+    runs = []
+    if os.path.exists(args.results):
+        with open(args.results, 'r', encoding='utf-8') as file:
+            runs = json.load(file).get('runs', [])
+
+    run = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'workers': args.workers,
+        'corpus_options': dict(corpus_options(args), compress=args.compress),
+        'scales': {},
+    }
+
+    slower = []
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        for users in args.scales:
+            work_folder = os.path.join(args.work_dir or temporary_folder, f'{users}_users')
+            corpus, stages = bench_scale(users, args, work_folder)
+            scale = run['scales'][str(users)] = {'corpus': corpus, 'stages': stages}
+            previous, previous_commit = previous_stages(runs, run, users)
+            slower += [f'{name} ({users} users)' for name in
+                       print_scale(users, scale, previous, previous_commit, args.regression_threshold)]
+            print("")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    write_run_metrics(args.results, run)
+    print(f"Results added to {args.results}")
+    if slower:
+        print(f"Slower than the last comparable run: {', '.join(slower)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.compression import open_output_binary
+from common.settings import resource_path
+
+# Generates a synthetic Arctic Shift dump (posts.jsonl and comments.jsonl, in
+# the raw dump format the cleaning stage reads) for benchmarking the pipeline
+# without real dumps or the API.
+# Every user writes about --posts_per_user posts and comments of filler text.
+# Some users state a diagnosis, built from the positive diagnosis patterns
+# and the condition synonyms, and some of those statements are negated with
+# the negative patterns instead, so the diagnosis stage has both to tell
+# apart. A share of the posts is in mental health subreddits, mentions a
+# mental health pattern, repeats an earlier text, or is invalid ([deleted],
+# links), for the cleaning and exclusion stages to drop.
+# Records are written in time order, users interleaved, in blocks of users.
+# Example runs:
+#     python3 generate_corpus.py /tmp/corpus --users 5000 --posts_per_user 60
+#     python3 generate_corpus.py /tmp/corpus --users 50000 --compress zst --duplicate_rate 0.1
+
+WORDS = [
+    'the', 'a', 'and', 'but', 'so', 'because', 'i', 'we', 'you', 'they', 'my', 'our', 'their', 'it', 'this', 'that',
+    'was', 'is', 'are', 'were', 'have', 'had', 'will', 'would', 'should', 'could', 'really', 'just', 'still', 'never',
+    'always', 'again', 'today', 'yesterday', 'tomorrow', 'last', 'next', 'week', 'month', 'year', 'night', 'morning',
+    'game', 'team', 'season', 'match', 'car', 'engine', 'highway', 'bike', 'trip', 'city', 'house', 'garden', 'kitchen',
+    'recipe', 'dinner', 'coffee', 'pizza', 'bread', 'movie', 'book', 'series', 'song', 'album', 'concert', 'phone',
+    'laptop', 'code', 'job', 'work', 'boss', 'school', 'class', 'exam', 'friend', 'family', 'dog', 'cat', 'weather',
+    'rain', 'sun', 'good', 'bad', 'great', 'terrible', 'new', 'old', 'big', 'small', 'cheap', 'expensive', 'fast',
+    'slow', 'broke', 'fixed', 'bought', 'sold', 'watched', 'played', 'read', 'cooked', 'tried', 'finished', 'started',
+    'went', 'came', 'think', 'know', 'want', 'need', 'love', 'hate', 'like', 'see', 'make', 'take', 'call', 'help',
+    'on', 'in', 'at', 'to', 'from', 'with', 'about', 'after', 'before', 'over', 'down', 'up', 'more', 'less', 'much',
+]
+SUBREDDITS = [
+    'AskReddit', 'cars', 'gaming', 'cooking', 'movies', 'books', 'fitness', 'soccer', 'nba', 'programming',
+    'gardening', 'music', 'travel', 'personalfinance', 'DIY', 'aww', 'science', 'history', 'Cooking', 'bicycling',
+]
+DUPLICATE_POOL_SIZE = 10000
+USERS_PER_BLOCK = 500
+FIRST_UTC = 1672531200  # 2023-01-01
+SPAN_SECONDS = 365 * 24 * 3600
+INVALID_TEXTS = ['[deleted]', '[removed]', 'look at this https://example.com/page', 'ok']
+
+
+def load_lines(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+# Function to load a resource file as phrases that read as plain words,
+# skipping placeholders (_condition, _ref) and other punctuation
+def load_phrases(file_path):
+    return [phrase for phrase in map(str.lower, load_lines(file_path)) if re.fullmatch(r"[a-z' ]+", phrase)]
+
+
+# Function to turn a diagnosis pattern (often a word stem) into words followed by a condition
+def diagnosis_statement(pattern, synonym):
+    if pattern.endswith('diagnos'):
+        pattern += 'ed'
+    if pattern.endswith(('with', 'of', 'for', 'as')):
+        return f"{pattern} {synonym}"
+    return f"{pattern} {'of' if pattern.endswith('diagnosis') else 'with'} {synonym}"
+
+
+class CorpusGenerator:
+    """Synthetic users and their posts and comments.
+
+    condition:            condition whose synonyms the diagnosis statements use
+    posts_per_user:       average records per user (posts and comments), each user gets 50% to 150% of it
+    diagnosis_rate:       share of users who state a diagnosis
+    negative_rate:        share of those statements that are negated (and must not diagnose)
+    mh_subreddit_rate:    share of records in a mental health subreddit
+    mh_mention_rate:      share of records mentioning a mental health pattern
+    duplicate_rate:       share of records repeating the text of an earlier one
+    invalid_rate:         share of records with text the cleaning stage drops
+    comment_share:        share of records that are comments
+    seed:                 random seed, the same arguments give the same corpus
+    """
+
+    def __init__(self, condition='bipolar', posts_per_user=60, diagnosis_rate=0.05, negative_rate=0.2,
+                 mh_subreddit_rate=0.05, mh_mention_rate=0.05, duplicate_rate=0.05, invalid_rate=0.05,
+                 comment_share=0.5, seed=1):
+        self.condition = condition
+        self.posts_per_user = posts_per_user
+        self.diagnosis_rate = diagnosis_rate
+        self.negative_rate = negative_rate
+        self.mh_subreddit_rate = mh_subreddit_rate
+        self.mh_mention_rate = mh_mention_rate
+        self.duplicate_rate = duplicate_rate
+        self.invalid_rate = invalid_rate
+        self.comment_share = comment_share
+        self.rng = random.Random(seed)
+
+        self.positive_patterns = load_phrases(resource_path('positive_diagnosis_patterns.txt'))
+        self.negative_patterns = load_phrases(resource_path('negative_diagnosis_patterns.txt'))
+        self.synonyms = load_phrases(resource_path('conditions', f'{condition}-syns.txt'))
+        self.mh_patterns = load_phrases(resource_path('mh_patterns.txt'))
+        self.mh_subreddits = load_lines(resource_path('mh_subreddits.txt'))
+
+        self._duplicate_pool = []
+        self._next_id = 0
+        self.stats = {'users': 0, 'posts': 0, 'comments': 0, 'diagnosis_statements': 0, 'negated_statements': 0,
+                      'mh_subreddit_records': 0, 'mh_mention_records': 0, 'duplicate_records': 0, 'invalid_records': 0}
+
+    def _sentence(self, low=5, high=30):
+        words = self.rng.choices(WORDS, k=self.rng.randint(low, high))
+        return ' '.join(words) + self.rng.choice('...!?')
+
+    # Function to get filler text of one to four sentences (5 to 120 words)
+    def _filler(self):
+        return ' '.join(self._sentence() for _ in range(self.rng.randint(1, 4)))
+
+    def _text(self):
+        rng = self.rng
+        if rng.random() < self.invalid_rate:
+            self.stats['invalid_records'] += 1
+            return rng.choice(INVALID_TEXTS)
+        if self._duplicate_pool and rng.random() < self.duplicate_rate:
+            self.stats['duplicate_records'] += 1
+            return rng.choice(self._duplicate_pool)
+        text = self._filler()
+        if self.mh_patterns and rng.random() < self.mh_mention_rate:
+            self.stats['mh_mention_records'] += 1
+            text = f"{text} {self._sentence(3, 6)[:-1]} {rng.choice(self.mh_patterns)} {self._sentence(3, 6)}"
+        if len(self._duplicate_pool) < DUPLICATE_POOL_SIZE:
+            self._duplicate_pool.append(text)
+        else:
+            self._duplicate_pool[rng.randrange(DUPLICATE_POOL_SIZE)] = text
+        return text
+
+    def _statement(self):
+        rng = self.rng
+        synonym = rng.choice(self.synonyms)
+        if rng.random() < self.negative_rate:
+            self.stats['negated_statements'] += 1
+            statement = diagnosis_statement(rng.choice(self.negative_patterns), synonym)
+        else:
+            self.stats['diagnosis_statements'] += 1
+            statement = diagnosis_statement(rng.choice(self.positive_patterns), synonym)
+        return f"{self._sentence()} {statement} {self._sentence(3, 8)} {self._sentence()}"
+
+    def _record(self, username, created_utc, text):
+        rng = self.rng
+        is_comment = rng.random() < self.comment_share
+        if rng.random() < self.mh_subreddit_rate:
+            self.stats['mh_subreddit_records'] += 1
+            subreddit = rng.choice(self.mh_subreddits)
+        else:
+            subreddit = rng.choice(SUBREDDITS)
+        record = {
+            'id': f'{self._next_id:x}',
+            'author': '[deleted]' if text == '[deleted]' else username,
+            'created_utc': created_utc,
+            'subreddit': subreddit,
+            'score': rng.randint(0, 500),
+        }
+        self._next_id += 1
+        if is_comment:
+            self.stats['comments'] += 1
+            record['body'] = text
+            return 'comments', record
+        self.stats['posts'] += 1
+        record['title'] = self._sentence(3, 8)
+        record['selftext'] = text
+        return 'posts', record
+
+    # Function to generate the records of one user as (kind, record) pairs
+    def user_records(self, username):
+        rng = self.rng
+        self.stats['users'] += 1
+        count = max(1, rng.randint(self.posts_per_user // 2, self.posts_per_user * 3 // 2))
+        statement_at = rng.randrange(count) if rng.random() < self.diagnosis_rate else None
+        records = []
+        for index in range(count):
+            text = self._statement() if index == statement_at else self._text()
+            records.append(self._record(username, FIRST_UTC + rng.randrange(SPAN_SECONDS), text))
+        return records
+
+    # Generator of (kind, record) pairs of users user0 .. user<users - 1>,
+    # in time order within every block of USERS_PER_BLOCK users
+    def iter_records(self, users):
+        for block_start in range(0, users, USERS_PER_BLOCK):
+            block = []
+            for index in range(block_start, min(block_start + USERS_PER_BLOCK, users)):
+                block.extend(self.user_records(f'user{index}'))
+            block.sort(key=lambda pair: pair[1]['created_utc'])
+            yield from block
+
+
+# Function to write a synthetic corpus as posts.jsonl and comments.jsonl
+# (with compress, .zst or .gz files), returns the generator statistics
+def generate_corpus(output_folder, users, compress=None, **options):
+    os.makedirs(output_folder, exist_ok=True)
+    suffix = f'.{compress}' if compress else ''
+    generator = CorpusGenerator(**options)
+    files = {kind: open_output_binary(os.path.join(output_folder, f'{kind}.jsonl{suffix}')) for kind in ('posts', 'comments')}
+    try:
+        for kind, record in generator.iter_records(users):
+            files[kind].write((json.dumps(record) + '\n').encode('utf-8'))
+    finally:
+        for file in files.values():
+            file.close()
+    return generator.stats
+
+
+def print_corpus_summary(stats):
+    print("-------------Summary-----------------")
+    print(f"Users: {stats['users']}, posts: {stats['posts']}, comments: {stats['comments']}")
+    print(f"Diagnosis statements: {stats['diagnosis_statements']}, negated: {stats['negated_statements']}")
+    print(f"Records in mental health subreddits: {stats['mh_subreddit_records']}")
+    print(f"Records mentioning mental health: {stats['mh_mention_records']}")
+    print(f"Duplicate records: {stats['duplicate_records']}, invalid records: {stats['invalid_records']}")
+
+
+# Function to add the corpus options to a parser (shared with bench_stages.py)
+def add_corpus_arguments(parser):
+    parser.add_argument('--condition', type=str, default='bipolar', help='Condition of the diagnosis statements')
+    parser.add_argument('--posts_per_user', type=int, default=60, help='Average posts and comments per user')
+    parser.add_argument('--diagnosis_rate', type=float, default=0.05, help='Share of users stating a diagnosis')
+    parser.add_argument('--negative_rate', type=float, default=0.2, help='Share of diagnosis statements that are negated')
+    parser.add_argument('--mh_subreddit_rate', type=float, default=0.05, help='Share of records in mental health subreddits')
+    parser.add_argument('--mh_mention_rate', type=float, default=0.05, help='Share of records mentioning mental health')
+    parser.add_argument('--duplicate_rate', type=float, default=0.05, help='Share of records repeating an earlier text')
+    parser.add_argument('--invalid_rate', type=float, default=0.05, help='Share of records with invalid text')
+    parser.add_argument('--comment_share', type=float, default=0.5, help='Share of records that are comments')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+
+
+# Function to get the CorpusGenerator options from add_corpus_arguments options
+def corpus_options(args):
+    return {name: getattr(args, name) for name in (
+        'condition', 'posts_per_user', 'diagnosis_rate', 'negative_rate', 'mh_subreddit_rate', 'mh_mention_rate',
+        'duplicate_rate', 'invalid_rate', 'comment_share', 'seed')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic Arctic Shift posts/comments dump.')
+    parser.add_argument('output_folder', type=str, help='Folder for posts.jsonl and comments.jsonl')
+    parser.add_argument('--users', type=int, default=1000, help='Number of users')
+    parser.add_argument('--compress', type=str, choices=['zst', 'gz'], default=None, help='Compress the files')
+    add_corpus_arguments(parser)
+
+    args = parser.parse_args()
+
+    stats = generate_corpus(args.output_folder, args.users, args.compress, **corpus_options(args))
+    print_corpus_summary(stats)
+
+
+if __name__ == '__main__':
+    main()
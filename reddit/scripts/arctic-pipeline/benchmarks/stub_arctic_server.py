@@ -0,0 +1,177 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the Arctic Shift search API, for testing and
+# benchmarking the fetch stages without network access.
+# Every author gets a deterministic synthetic history, paged with the same
+# before/after/limit parameters as the real API ('auto' returns up to
+# auto_limit records).
+# Example run:
+#     python3 stub_arctic_server.py --port 8765 --latency 0.2
+#     python3 ../diagnosed/fetch_all_user_submissions.py users.jsonl --api_base_url http://127.0.0.1:8765/api
+
+WORDS = [
+    'the', 'game', 'was', 'really', 'good', 'last', 'night', 'and', 'i', 'think', 'we',
+    'should', 'go', 'again', 'next', 'week', 'my', 'car', 'broke', 'down', 'on', 'highway',
+]
+SUBREDDITS = ['AskReddit', 'cars', 'gaming', 'cooking', 'movies', 'books', 'fitness']
+
+
+def synthetic_history(author, kind, count):
+    rng = random.Random(f'{author}/{kind}')
+    records = []
+    for index in range(count):
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(12, 40))) + '.'
+        record = {
+            'id': f'{kind[0]}{author}{index}',
+            'author': author,
+            'created_utc': 1700000000 - index * 3600,
+            'subreddit': rng.choice(SUBREDDITS),
+            'score': rng.randint(0, 50),
+        }
+        if kind == 'posts':
+            record['title'] = 'title'
+            record['selftext'] = text
+        else:
+            record['body'] = text
+        records.append(record)
+    return records
+
+
+def synthetic_listing(subreddit, count, authors):
+    rng = random.Random(subreddit)
+    return [{
+        'id': f'{subreddit}{index}',
+        'author': f'user{rng.randrange(authors)}',
+        'created_utc': 1700000000 - index * 60,
+        'subreddit': subreddit,
+        'title': 'title',
+        'selftext': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(12, 40))) + '.',
+    } for index in range(count)]
+
+
+# Function to apply the search cursor parameters (before, after, sort, limit)
+def select_page(records, params, default_limit):
+    before = int(params['before']) if 'before' in params else None
+    after = int(params['after']) if 'after' in params else None
+    records = [record for record in records
+               if (before is None or record['created_utc'] < before)
+               and (after is None or record['created_utc'] > after)]
+    records.sort(key=lambda record: record['created_utc'], reverse=params.get('sort', 'desc') != 'asc')
+    limit = params.get('limit', 'auto')
+    return records[:default_limit if limit == 'auto' else int(limit)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+    def do_GET(self):
+        server = self.server
+        server.count_request()
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if server.latency:
+            time.sleep(server.latency)
+        if server.rate_limit_every and server.request_count % server.rate_limit_every == 0:
+            self.send_json(429, {'error': 'Too Many Requests'}, {'Retry-After': '1'})
+            return
+
+        parts = url.path.rstrip('/').split('/')
+        aggregate = parts[-1] == 'aggregate'
+        if aggregate:
+            parts = parts[:-1]
+        kind = parts[-2] if parts[-1] == 'search' else ''
+        if kind not in ('posts', 'comments'):
+            self.send_json(404, {'error': 'not found'})
+            return
+
+        if aggregate:
+            if params.get('aggregate') != 'subreddit' or 'author' not in params:
+                self.send_json(400, {'error': 'unsupported aggregation'})
+                return
+            counts = {}
+            for record in synthetic_history(params['author'], kind, server.history_size):
+                counts[record['subreddit']] = counts.get(record['subreddit'], 0) + 1
+            buckets = sorted(counts.items(), key=lambda item: -item[1])[:int(params.get('limit', 100))]
+            self.send_json(200, {'data': [{'key': key, 'doc_count': count} for key, count in buckets]})
+            return
+
+        records = []
+        if 'author' in params:
+            history = synthetic_history(params['author'], kind, server.history_size)
+            records = select_page(history, params, server.auto_limit)
+        elif 'subreddit' in params:
+            limit = params.get('limit', '100')
+            count = 100 if limit == 'auto' else int(limit)
+            records = synthetic_listing(params['subreddit'], count, server.listing_authors)
+        self.send_json(200, {'data': records})
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubArcticServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, history_size=60, rate_limit_every=0, listing_authors=500, auto_limit=1000):
+        super().__init__(('127.0.0.1', port), StubHandler)
+        self.latency = latency
+        self.history_size = history_size
+        self.auto_limit = auto_limit
+        self.listing_authors = listing_authors
+        self.rate_limit_every = rate_limit_every
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+    # Clients close connections mid-response when they stop paging early
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count_request(self):
+        with self._lock:
+            self.request_count += 1
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/api'
+
+    # Function to serve from a background thread, returns the server
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local stub of the Arctic Shift search API.')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of delay added to every response')
+    parser.add_argument('--history_size', type=int, default=60, help='Posts and comments returned per author')
+    parser.add_argument('--rate_limit_every', type=int, default=0, help='Answer every Nth request with a 429')
+
+    args = parser.parse_args()
+
+    server = StubArcticServer(args.port, args.latency, args.history_size, args.rate_limit_every)
+    print(f"Stub Arctic Shift API listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
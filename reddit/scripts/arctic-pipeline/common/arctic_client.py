@@ -0,0 +1,413 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import aiohttp
+
+from common.rate_limiter import get_rate_limiter, parse_retry_after
+from common.response_cache import ResponseCache
+from common.settings import PROJECT_ROOT
+from common.telemetry import get_telemetry
+
+# Shared Arctic Shift API client.
+# One aiohttp session keeps connections alive and caps how many requests are
+# in flight, so many users can be fetched at once. ArcticShiftClient is the
+# asyncio interface; BlockingArcticClient runs it on a background event loop
+# for the (threaded, synchronous) pipeline scripts.
+# base_url can point at a local stub server for testing. With a cache, every
+# request but the subreddit listings reads through the on-disk ResponseCache
+# first. Every request that does reach the network is paced by the
+# process-wide AdaptiveRateLimiter.
+# Author histories are paged newest first with a created_utc cursor, so long
+# histories are retrieved in full, and streaming callers can stop after the
+# pages they need.
+
+DEFAULT_BASE_URL = 'https://arctic-shift.photon-reddit.com/api'
+DEFAULT_CACHE_PATH = os.path.join(PROJECT_ROOT, 'reddit', 'data', 'cache', 'arctic_shift.sqlite')
+POSTS_ENDPOINT = 'posts/search'
+COMMENTS_ENDPOINT = 'comments/search'
+DEFAULT_PAGE_SIZE = 100
+AGGREGATE_LIMIT = 1000
+RETRIED_STATUSES = (408,)  # Client errors retried besides 429, like every 5xx
+
+
+class ArcticShiftError(Exception):
+    pass
+
+
+class ArcticShiftClient:
+    """Async, connection-pooled client for the Arctic Shift search API.
+
+    concurrency: maximum number of requests in flight (pool size)
+    timeout:     seconds allowed for a single request
+    retries:     attempts per request on 429s, 408s, 5xx responses, timeouts and connection errors
+    backoff:     first retry delay in seconds after a connection error,
+                 doubled (with jitter) after every retry
+    cache:       optional ResponseCache read before every request
+    limiter:     rate limiter pacing requests, the process-wide one by default
+    page_size:   records requested per page of an author history, or 'auto'
+                 to let the server choose
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, concurrency=8, timeout=60, retries=5, backoff=1, cache=None,
+                 limiter=None, page_size=DEFAULT_PAGE_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+        self.limiter = limiter or get_rate_limiter()
+        self.page_size = page_size
+        self.telemetry = get_telemetry()
+        self.request_count = 0
+        self._session = None
+
+    async def open(self):
+        if self._session is None:
+            # ssl=False matches the verify=False the scripts always used
+            connector = aiohttp.TCPConnector(limit=self.concurrency, ssl=False)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    # Function to GET an endpoint and decode its JSON body, retrying transient
+    # failures; use_cache=False always asks the server and stores nothing
+    async def get_json(self, endpoint, params, use_cache=True):
+        url = f"{self.base_url}/{endpoint}"
+        loop = asyncio.get_running_loop()
+        cache = self.cache if use_cache else None
+        if cache is not None:
+            # SQLite reads and commits block, so they run off the event loop
+            cached = await loop.run_in_executor(None, cache.get, url, params)
+            self.telemetry.count('cache_misses' if cached is None else 'cache_hits')
+            if cached is not None:
+                return cached
+
+        payload = await self._request_json(endpoint, params)
+        if cache is not None:
+            await loop.run_in_executor(None, cache.put, url, params, payload)
+        return payload
+
+    async def _request_json(self, endpoint, params):
+        url = f"{self.base_url}/{endpoint}"
+        delay = self.backoff
+        last_error = None
+
+        for attempt in range(self.retries):
+            await self.limiter.acquire_async()
+            started = time.perf_counter()
+            try:
+                self.request_count += 1
+                self.telemetry.count('api_requests')
+                async with self._session.get(url, params=params) as response:
+                    if response.status == 429:  # Too Many Requests
+                        self.telemetry.count('api_429')
+                        # The limiter slows every caller down and honours Retry-After
+                        self.limiter.on_throttle(parse_retry_after(response.headers.get('Retry-After')))
+                        last_error = ArcticShiftError(f"rate limited on {url}")
+                        continue
+                    if response.status >= 500 or response.status in RETRIED_STATUSES:
+                        # Server errors and request timeouts are retried like connection errors
+                        self.telemetry.count('api_errors')
+                        last_error = ArcticShiftError(f"HTTP {response.status} for {url} {params}")
+                    elif response.status >= 400:
+                        self.telemetry.count('api_errors')
+                        raise ArcticShiftError(f"HTTP {response.status} for {url} {params}")
+                    else:
+                        payload = await response.json(content_type=None)
+                        self.telemetry.observe_latency(time.perf_counter() - started)
+                        self.limiter.on_success()
+                        return payload
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                self.telemetry.count('api_errors')
+                last_error = e
+
+            if attempt < self.retries - 1:
+                await asyncio.sleep(delay * random.uniform(1, 1.5))
+                delay *= 2  # Exponential backoff with jitter
+
+        raise ArcticShiftError(f"Giving up on {url} {params} after {self.retries} attempts: {last_error}")
+
+    # Function to fetch the latest posts of a subreddit. Not cached: the
+    # listing changes all the time and its authors are the candidate pool.
+    async def fetch_subreddit_posts(self, subreddit, limit):
+        payload = await self.get_json(POSTS_ENDPOINT, {'subreddit': subreddit, 'limit': limit}, use_cache=False)
+        return payload.get('data', [])
+
+    # Async generator paging through a search endpoint newest first, yielding
+    # one list of records per page. `before` and `after` bound created_utc.
+    async def iter_pages(self, endpoint, params, before=None, after=None):
+        params = dict(params, sort='desc', limit=self.page_size)
+        if after is not None:
+            params['after'] = int(after)
+        boundary_ids = set()
+
+        while True:
+            page_params = params if before is None else dict(params, before=int(before))
+            payload = await self.get_json(endpoint, page_params)
+            page = payload.get('data', [])
+            fresh = [record for record in page if record.get('id') not in boundary_ids]
+            if fresh:
+                yield fresh
+
+            timestamps = [int(record['created_utc']) for record in page if record.get('created_utc') is not None]
+            if not timestamps or (self.page_size != 'auto' and len(page) < self.page_size):
+                return
+            oldest = min(timestamps)
+
+            if not fresh:
+                # A whole page of records sharing one second; step past it
+                before = oldest
+                boundary_ids = set()
+                continue
+
+            # `before` is exclusive, so re-request the oldest second and drop
+            # the records already yielded from it
+            oldest_ids = {record.get('id') for record in page if record.get('created_utc') is not None
+                          and int(record['created_utc']) == oldest}
+            boundary_ids = boundary_ids | oldest_ids if before == oldest + 1 else oldest_ids
+            before = oldest + 1
+
+    async def iter_author_pages(self, username, endpoint, before=None, after=None):
+        async for page in self.iter_pages(endpoint, {'author': username}, before, after):
+            if endpoint == COMMENTS_ENDPOINT:
+                # Adjust comments to use 'selftext' instead of 'body'
+                for comment in page:
+                    comment['selftext'] = comment.pop('body', '')
+            yield page
+
+    async def _collect(self, pages):
+        records = []
+        async for page in pages:
+            records.extend(page)
+        return records
+
+    async def fetch_posts(self, username, before=None, after=None):
+        return await self._collect(self.iter_author_pages(username, POSTS_ENDPOINT, before, after))
+
+    async def fetch_comments(self, username, before=None, after=None):
+        return await self._collect(self.iter_author_pages(username, COMMENTS_ENDPOINT, before, after))
+
+    # Function to fetch the full history (posts, then comments) of one user,
+    # paging through both concurrently
+    async def fetch_user_submissions(self, username, before=None, after=None):
+        posts, comments = await asyncio.gather(self.fetch_posts(username, before, after),
+                                               self.fetch_comments(username, before, after))
+        return posts + comments
+
+    # Async generator yielding pages of a user's history, alternating between
+    # posts and comments. The next page of each stream is requested while the
+    # caller works on the current one; closing the generator early stops paging.
+    async def iter_user_history(self, username, before=None, after=None):
+        all_streams = [self.iter_author_pages(username, endpoint, before, after)
+                       for endpoint in (POSTS_ENDPOINT, COMMENTS_ENDPOINT)]
+        streams = deque(all_streams)
+        pending = {stream: asyncio.ensure_future(stream.__anext__()) for stream in streams}
+        try:
+            while streams:
+                stream = streams.popleft()
+                try:
+                    page = await pending.pop(stream)
+                except StopAsyncIteration:
+                    continue
+                pending[stream] = asyncio.ensure_future(stream.__anext__())
+                streams.append(stream)
+                yield page
+        finally:
+            for task in pending.values():
+                task.cancel()
+            await asyncio.gather(*pending.values(), return_exceptions=True)
+            for stream in all_streams:
+                await stream.aclose()
+
+    # Function to count a user's posts and comments per subreddit with the
+    # aggregate endpoints, two small responses instead of the full history.
+    # Returns (counts, complete); complete is False when a bucket limit was hit.
+    async def fetch_author_subreddit_counts(self, username):
+        params = {'author': username, 'aggregate': 'subreddit', 'limit': AGGREGATE_LIMIT}
+        payloads = await asyncio.gather(self.get_json(POSTS_ENDPOINT + '/aggregate', params),
+                                        self.get_json(COMMENTS_ENDPOINT + '/aggregate', params))
+        counts = {}
+        complete = True
+        for payload in payloads:
+            buckets = payload.get('data', [])
+            complete = complete and len(buckets) < AGGREGATE_LIMIT
+            for bucket in buckets:
+                subreddit = bucket.get('key') or ''
+                counts[subreddit] = counts.get(subreddit, 0) + bucket.get('doc_count', 0)
+        return counts, complete
+
+    async def _fetch_or_error(self, username):
+        try:
+            return await self.fetch_user_submissions(username), None
+        except Exception as e:
+            return [], e
+
+    # Async generator yielding (username, submissions, error) in input order,
+    # keeping at most `window` users in flight
+    async def iter_user_submissions(self, usernames, window=None):
+        window = window or 2 * self.concurrency
+        pending = deque()
+        try:
+            for username in usernames:
+                pending.append((username, asyncio.ensure_future(self._fetch_or_error(username))))
+                if len(pending) >= window:
+                    username, task = pending.popleft()
+                    submissions, error = await task
+                    yield username, submissions, error
+            while pending:
+                username, task = pending.popleft()
+                submissions, error = await task
+                yield username, submissions, error
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+
+class BlockingArcticClient:
+    """Synchronous facade over ArcticShiftClient, safe to share between threads.
+
+    Requests from every thread go through the same pooled session running on a
+    background event loop, so concurrency limits apply process-wide.
+    """
+
+    def __init__(self, **client_options):
+        self.client = ArcticShiftClient(**client_options)
+        self.cache = self.client.cache
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._call(self.client.open())
+
+    # Function to run a coroutine on the event loop. Its task copies the
+    # caller's context, so its requests are counted under the caller's stage
+    # even when another stage is running by the time they are made
+    def _call(self, coroutine):
+        telemetry = self.client.telemetry
+        with telemetry.attributed(telemetry.current_stage()):
+            return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def fetch_user_submissions(self, username, before=None, after=None):
+        return self._call(self.client.fetch_user_submissions(username, before, after))
+
+    def fetch_author_subreddit_counts(self, username):
+        return self._call(self.client.fetch_author_subreddit_counts(username))
+
+    # Generator yielding a user's posts and comments page by page; stop
+    # iterating once the caller has seen enough and no further pages are fetched
+    def iter_user_history(self, username, before=None, after=None):
+        iterator = self.client.iter_user_history(username, before, after)
+        try:
+            while True:
+                try:
+                    page = self._call(iterator.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield from page
+        finally:
+            self._call(iterator.aclose())
+
+    def get_json(self, endpoint, params):
+        return self._call(self.client.get_json(endpoint, params))
+
+    def fetch_subreddit_posts(self, subreddit, limit):
+        return self._call(self.client.fetch_subreddit_posts(subreddit, limit))
+
+    # Generator yielding (username, submissions, error) in input order
+    def iter_user_submissions(self, usernames, window=None):
+        iterator = self.client.iter_user_submissions(usernames, window)
+        try:
+            while True:
+                try:
+                    yield self._call(iterator.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._call(iterator.aclose())
+
+    @property
+    def request_count(self):
+        return self.client.request_count
+
+    # Function to describe network and cache usage for a stage summary
+    def summary(self):
+        summary = f"API requests sent: {self.request_count}\n{self.client.limiter.summary()}"
+        if self.cache is not None:
+            summary += f"\n{self.cache.summary()}"
+        return summary
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self._call(self.client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Function to add the API client options to a script's parser
+def add_client_arguments(parser):
+    parser.add_argument('--api_base_url', type=str, default=DEFAULT_BASE_URL,
+                        help='Arctic Shift API root, e.g. a local stub server for testing')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Maximum number of API requests in flight')
+    parser.add_argument('--request_timeout', type=float, default=60,
+                        help='Seconds allowed for a single API request')
+    parser.add_argument('--rate_limit', type=float, default=4.0,
+                        help='Starting requests per second, adapted to the server while running')
+    parser.add_argument('--max_rate_limit', type=float, default=40.0,
+                        help='Requests per second the adaptive rate limiter never exceeds')
+    parser.add_argument('--page_size', type=lambda value: value if value == 'auto' else int(value),
+                        default=DEFAULT_PAGE_SIZE,
+                        help="Records per page when paging through author histories, or 'auto'")
+    parser.add_argument('--cache_path', type=str, default=DEFAULT_CACHE_PATH,
+                        help='SQLite file caching API responses between runs')
+    parser.add_argument('--cache_ttl_hours', type=float, default=24 * 30,
+                        help='Ignore cached responses older than this many hours')
+    parser.add_argument('--cache_max_mb', type=float, default=4096,
+                        help='Evict least recently used responses past this size')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='Always query the API and do not store responses')
+    parser.add_argument('--offline', action='store_true',
+                        help='Answer author lookups from a local author store instead of the API')
+    parser.add_argument('--author_store', type=str, default=None,
+                        help='Author store built by utils/build_author_index.py, used with --offline')
+
+
+# Function to build a blocking client from add_client_arguments options
+def client_from_args(args):
+    if args.offline:
+        # Imported here, the author store module depends on this one
+        from common.author_store import DEFAULT_STORE_PATH, OfflineArcticClient
+        return OfflineArcticClient(args.author_store or DEFAULT_STORE_PATH)
+
+    get_rate_limiter().configure(rate=args.rate_limit, max_rate=args.max_rate_limit)
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_path, ttl=args.cache_ttl_hours * 3600,
+                              max_bytes=int(args.cache_max_mb * 1024 * 1024))
+    return BlockingArcticClient(base_url=args.api_base_url, concurrency=args.concurrency,
+                                timeout=args.request_timeout, cache=cache, page_size=args.page_size)
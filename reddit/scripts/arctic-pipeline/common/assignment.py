@@ -0,0 +1,276 @@
+import heapq
+from collections import deque
+
+# Optimal assignment of control candidates to diagnosed users.
+# The problem is a min-cost flow: source -> diagnosed user (capacity: controls
+# per diagnosed user) -> eligible candidate (capacity 1, cost: how far the
+# post counts are apart) -> sink (capacity 1, each control used once).
+# It is solved with the primal-dual method: Dijkstra over reduced costs
+# updates node potentials, then a Dinic blocking flow saturates every
+# shortest augmenting path at once. Costs are small integers, so the number
+# of phases stays bounded by the cost range. The flow is maximum first, so
+# as many controls as possible are assigned, and of those assignments the
+# closest in total.
+# A diagnosed user only counts as matched with all its controls though, so
+# assign_controls chooses which users to fill around that flow.
+
+INFINITY = float('inf')
+SEARCH_LIMIT = 200
+SEARCH_USERS = 20
+DROP_SHARE = 4
+
+
+class _FlowGraph:
+    def __init__(self, node_count):
+        self.adjacency = [[] for _ in range(node_count)]
+        self.to = []
+        self.capacity = []
+        self.cost = []
+
+    def add_edge(self, source, target, capacity, cost):
+        # Every edge is stored next to its reverse; edge ^ 1 is the other one
+        self.adjacency[source].append(len(self.to))
+        self.to.append(target)
+        self.capacity.append(capacity)
+        self.cost.append(cost)
+        self.adjacency[target].append(len(self.to))
+        self.to.append(source)
+        self.capacity.append(0)
+        self.cost.append(-cost)
+
+
+def _shortest_distances(graph, source, potential):
+    distance = [INFINITY] * len(graph.adjacency)
+    distance[source] = 0
+    heap = [(0, source)]
+    while heap:
+        node_distance, node = heapq.heappop(heap)
+        if node_distance > distance[node]:
+            continue
+        for edge in graph.adjacency[node]:
+            if graph.capacity[edge] <= 0:
+                continue
+            target = graph.to[edge]
+            candidate = node_distance + graph.cost[edge] + potential[node] - potential[target]
+            if candidate < distance[target]:
+                distance[target] = candidate
+                heapq.heappush(heap, (candidate, target))
+    return distance
+
+
+# Function to push as much flow as possible along zero reduced cost edges (Dinic)
+def _blocking_flow(graph, source, sink, potential):
+    to, capacity, cost = graph.to, graph.capacity, graph.cost
+    total = 0
+    while True:
+        level = [-1] * len(graph.adjacency)
+        level[source] = 0
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            node_potential = potential[node]
+            for edge in graph.adjacency[node]:
+                target = to[edge]
+                if level[target] < 0 and capacity[edge] > 0 and cost[edge] + node_potential == potential[target]:
+                    level[target] = level[node] + 1
+                    queue.append(target)
+        if level[sink] < 0:
+            return total
+
+        # Iterative depth-first search for augmenting paths along the levels
+        next_edge = [0] * len(graph.adjacency)
+        while True:
+            path = []
+            node = source
+            while node != sink:
+                adjacency = graph.adjacency[node]
+                while next_edge[node] < len(adjacency):
+                    edge = adjacency[next_edge[node]]
+                    target = to[edge]
+                    if (level[target] == level[node] + 1 and capacity[edge] > 0
+                            and cost[edge] + potential[node] == potential[target]):
+                        break
+                    next_edge[node] += 1
+                if next_edge[node] == len(adjacency):
+                    if not path:
+                        break
+                    # Dead end: retreat and skip the edge that led here
+                    level[node] = -1
+                    edge = path.pop()
+                    node = to[edge ^ 1]
+                    next_edge[node] += 1
+                    continue
+                path.append(edge)
+                node = to[edge]
+            if node != sink:
+                break
+            flow = min(capacity[edge] for edge in path)
+            for edge in path:
+                capacity[edge] -= flow
+                capacity[edge ^ 1] += flow
+            total += flow
+
+
+# Function to solve the min-cost max-flow for the given capacities and pairs,
+# returns the assigned candidates of every user, closest first
+def _min_cost_assignment(capacities, pairs):
+    candidates = list(dict.fromkeys(candidate for _, candidate, _ in pairs))
+    candidate_node = {candidate: 2 + len(capacities) + index for index, candidate in enumerate(candidates)}
+    source, sink = 0, 1
+    graph = _FlowGraph(2 + len(capacities) + len(candidates))
+
+    for user, capacity in enumerate(capacities):
+        graph.add_edge(source, 2 + user, capacity, 0)
+    pair_edges = []
+    for user, candidate, cost in pairs:
+        pair_edges.append((user, candidate, cost, len(graph.to)))
+        graph.add_edge(2 + user, candidate_node[candidate], 1, int(cost))
+    for candidate in candidates:
+        graph.add_edge(candidate_node[candidate], sink, 1, 0)
+
+    potential = [0] * len(graph.adjacency)
+    while True:
+        distance = _shortest_distances(graph, source, potential)
+        if distance[sink] == INFINITY:
+            break
+        for node, node_distance in enumerate(distance):
+            potential[node] += min(node_distance, distance[sink])
+        if _blocking_flow(graph, source, sink, potential) == 0:
+            break
+
+    assigned = [[] for _ in capacities]
+    for user, candidate, cost, edge in sorted(pair_edges, key=lambda pair: pair[2]):
+        if graph.capacity[edge] == 0:  # Saturated: the pair is in the assignment
+            assigned[user].append(candidate)
+    return assigned
+
+
+# Function to split the users into groups that share no candidates, which
+# can be assigned independently
+def _components(user_pairs):
+    parent = list(range(len(user_pairs)))
+
+    def find(user):
+        while parent[user] != user:
+            parent[user] = parent[parent[user]]
+            user = parent[user]
+        return user
+
+    owner = {}
+    for user, pairs in enumerate(user_pairs):
+        for _, candidate, _ in pairs:
+            if candidate in owner:
+                parent[find(user)] = find(owner[candidate])
+            else:
+                owner[candidate] = user
+    groups = {}
+    for user in range(len(user_pairs)):
+        groups.setdefault(find(user), []).append(user)
+    return list(groups.values())
+
+
+# Function to find the most users of a component that can all be full, and
+# their closest assignment. First the users the flow fills keep their
+# candidates, a quarter of the short ones (the furthest from full) are
+# dropped and the rest are solved again with what is left, until none is
+# short. In components of up to SEARCH_USERS users that set is improved by a
+# depth-first search: a branch drops or keeps a short user, and is cut once
+# the capacities of its users cannot fit into its maximum flow with as many
+# users as the best set. After search_limit branches the best set is used.
+def _full_users(users, capacities, user_pairs, search_limit):
+    def solve(kept):
+        capacity = [capacities[user] if user in kept else 0 for user in range(len(capacities))]
+        return _min_cost_assignment(capacity, [pair for user in kept for pair in user_pairs[user]])
+
+    def short_users(kept, assigned):
+        return [user for user in kept if len(assigned[user]) < capacities[user]]
+
+    def total_cost(kept, assigned):
+        return sum(costs[user, candidate] for user in kept for candidate in assigned[user])
+
+    def deficit(assigned):
+        return lambda user: (capacities[user] - len(assigned[user]), len(user_pairs[user]))
+
+    costs = {(user, candidate): cost for user in users for _, candidate, cost in user_pairs[user]}
+    # Users with too few eligible candidates can never be full
+    possible = frozenset(user for user in users if 0 < capacities[user] <= len(user_pairs[user]))
+    if not possible:
+        return possible, None
+    full, used = set(), set()
+    remaining = set(possible)
+    while remaining:
+        capacity = [capacities[user] if user in remaining else 0 for user in range(len(capacities))]
+        assigned = _min_cost_assignment(capacity, [pair for user in remaining for pair in user_pairs[user]
+                                                   if pair[1] not in used])
+        short = short_users(remaining, assigned)
+        for user in remaining.difference(short):
+            full.add(user)
+            used.update(assigned[user])
+        remaining = set(short)
+        short.sort(key=deficit(assigned), reverse=True)
+        remaining.difference_update(short[:(len(short) + DROP_SHARE - 1) // DROP_SHARE])
+    best = frozenset(full)
+    best_assigned = solve(best)
+    best_cost = total_cost(best, best_assigned)
+    if len(users) > SEARCH_USERS:
+        return best, best_assigned
+
+    branches = [(possible, frozenset())]
+    while branches and search_limit > 0:
+        kept, forced = branches.pop()
+        if len(kept) < len(best):
+            continue
+        search_limit -= 1
+        assigned = solve(kept)
+        short = short_users(kept, assigned)
+        if not short:
+            cost = total_cost(kept, assigned)
+            if len(kept) > len(best) or cost < best_cost:
+                best, best_assigned, best_cost = kept, assigned, cost
+            continue
+        flow = sum(len(assigned[user]) for user in kept)
+        fitting = 0
+        for capacity in sorted(capacities[user] for user in kept):
+            flow -= capacity
+            if flow < 0:
+                break
+            fitting += 1
+        if fitting < len(best) or (forced and short_users(forced, solve(forced))):
+            continue
+        user = max([user for user in short if user not in forced] or [user for user in kept if user not in forced],
+                   key=deficit(assigned))
+        branches.append((kept, forced | {user}))
+        branches.append((kept - {user}, forced))
+    return best, best_assigned
+
+
+# Function to assign candidates to diagnosed users.
+#   capacities:   controls wanted per diagnosed user, a list indexed by user
+#   pairs:        (user index, candidate, cost) for every eligible pair, with
+#                 non-negative integer costs
+#   search_limit: branches searched per group of users sharing candidates
+# Returns a list with the assigned candidates of every user, closest first.
+# A user only counts as matched with all its controls, so the most controls
+# in total is not the goal: two users sharing their only two candidates
+# should not get one each. The users to fill are chosen first: exactly in
+# groups of up to SEARCH_USERS users (unless the search limit is hit), by
+# the drop-a-quarter heuristic alone in larger groups, which real runs
+# usually are (candidates from AskReddit and the like link most users).
+# They get their closest full assignment and the other users what is left.
+def assign_controls(capacities, pairs, search_limit=SEARCH_LIMIT):
+    user_pairs = [[] for _ in capacities]
+    for pair in pairs:
+        user_pairs[pair[0]].append(pair)
+
+    assigned = [[] for _ in capacities]
+    full = set()
+    for users in _components(user_pairs):
+        component_full, component_assigned = _full_users(users, capacities, user_pairs, search_limit)
+        full |= component_full
+        for user in component_full:
+            assigned[user] = component_assigned[user]
+
+    used = {candidate for user in full for candidate in assigned[user]}
+    leftover = _min_cost_assignment([0 if user in full else capacity for user, capacity in enumerate(capacities)],
+                                    [pair for pair in pairs if pair[0] not in full and pair[1] not in used])
+    return [assigned[user] if user in full else leftover[user] for user in range(len(capacities))]
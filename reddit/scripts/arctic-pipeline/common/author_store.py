@@ -0,0 +1,281 @@
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import zlib
+
+from common.arctic_client import ArcticShiftError
+from common.compression import open_text
+from common.settings import PROJECT_ROOT
+
+# Offline store of author histories built from local Arctic Shift / Pushshift dumps.
+# Dump records (posts and comments, plain or compressed NDJSON) are spread
+# over partition files by a hash of their author. Each partition is then
+# grouped by author, and every author's history is written as one
+# zlib-compressed block. An SQLite index maps author -> (partition, offset,
+# length), so a lookup is one indexed query and one read.
+#
+# Layout of a store directory:
+#     index.sqlite         author -> block location and post/comment counts
+#     authors-000.bin ...  concatenated author blocks, one file per partition
+#     manifest.json        dump files the store was built from
+
+DEFAULT_STORE_PATH = os.path.join(PROJECT_ROOT, 'reddit', 'data', 'author_store')
+DUMP_PATTERNS = ('*.zst', '*.gz', '*.jsonl', '*.ndjson', '*.json')
+STORED_PROPERTIES = ['id', 'title', 'selftext', 'author', 'created_utc', 'subreddit', 'score']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS authors (
+    author TEXT PRIMARY KEY,
+    partition INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    posts INTEGER NOT NULL,
+    comments INTEGER NOT NULL
+)
+"""
+
+
+# Function to list the dump files under a folder (or a single dump file)
+def find_dump_files(path):
+    if os.path.isfile(path):
+        return [path]
+    files = set()
+    for pattern in DUMP_PATTERNS:
+        files.update(glob.glob(os.path.join(path, '**', pattern), recursive=True))
+    return sorted(files)
+
+
+# Function to reduce a dump record to the fields the pipeline uses, returns
+# (kind, record) or None for records without a usable author
+def simplify_dump_record(record):
+    author = record.get('author')
+    if not author or author == '[deleted]':
+        return None
+    if 'title' not in record and 'body' in record:
+        record = dict(record, selftext=record['body'])  # Comments keep their text in 'selftext'
+        kind = 'comments'
+    else:
+        kind = 'posts'
+    return kind, {prop: record[prop] for prop in STORED_PROPERTIES if prop in record}
+
+
+def _partition_of(author, partitions):
+    return zlib.crc32(author.encode('utf-8')) % partitions
+
+
+def _newest_first(records):
+    records.sort(key=lambda record: record.get('created_utc') or 0, reverse=True)
+    return records
+
+
+class AuthorStoreBuilder:
+    """Builds an author store from dump files in two passes.
+
+    partitions: number of partition files; each one is grouped in memory
+                on its own, so more partitions bound memory for larger dumps
+    """
+
+    def __init__(self, store_path, partitions=64):
+        self.store_path = store_path
+        self.partitions = partitions
+        self.records_read = 0
+        self.records_kept = 0
+        self.duplicates = 0
+        self.authors = 0
+
+    # Pass 1: append every usable record to the staging file of its partition
+    def _scatter(self, dump_files, staging_dir):
+        staging = [open(os.path.join(staging_dir, f'part-{index:03d}.jsonl'), 'w', encoding='utf-8')
+                   for index in range(self.partitions)]
+        try:
+            for dump_file in dump_files:
+                with open_text(dump_file) as file:
+                    for line in file:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        self.records_read += 1
+                        simplified = simplify_dump_record(json.loads(line))
+                        if simplified is None:
+                            continue
+                        kind, record = simplified
+                        staging[_partition_of(record['author'], self.partitions)].write(
+                            json.dumps([kind, record]) + '\n')
+                        self.records_kept += 1
+                print(f"Read {dump_file}")
+        finally:
+            for file in staging:
+                file.close()
+
+    # Pass 2: group one partition by author and write its blocks
+    def _gather(self, index, staging_dir, connection):
+        histories = {}
+        with open(os.path.join(staging_dir, f'part-{index:03d}.jsonl'), 'r', encoding='utf-8') as file:
+            for line in file:
+                kind, record = json.loads(line)
+                history = histories.setdefault(record['author'], {'posts': {}, 'comments': {}})
+                # The same record can appear in overlapping dumps
+                key = record.get('id') or json.dumps(record, sort_keys=True)
+                if key in history[kind]:
+                    self.duplicates += 1
+                history[kind][key] = record
+
+        rows = []
+        offset = 0
+        with open(os.path.join(self.store_path, f'authors-{index:03d}.bin'), 'wb') as data_file:
+            for author, history in histories.items():
+                block = zlib.compress(json.dumps({
+                    'posts': _newest_first(list(history['posts'].values())),
+                    'comments': _newest_first(list(history['comments'].values())),
+                }, separators=(',', ':')).encode('utf-8'))
+                data_file.write(block)
+                rows.append((author, index, offset, len(block), len(history['posts']), len(history['comments'])))
+                offset += len(block)
+        connection.executemany('INSERT INTO authors VALUES (?, ?, ?, ?, ?, ?)', rows)
+        self.authors += len(rows)
+
+    def build(self, dump_files):
+        if os.path.isdir(self.store_path) and os.listdir(self.store_path):
+            if not os.path.exists(os.path.join(self.store_path, 'index.sqlite')):
+                raise ValueError(f"{self.store_path} is not empty and is not an author store")
+            shutil.rmtree(self.store_path)  # Rebuild from scratch
+        staging_dir = os.path.join(self.store_path, 'staging')
+        os.makedirs(staging_dir)
+
+        self._scatter(dump_files, staging_dir)
+
+        connection = sqlite3.connect(os.path.join(self.store_path, 'index.sqlite'))
+        try:
+            connection.execute(_SCHEMA)
+            for index in range(self.partitions):
+                self._gather(index, staging_dir, connection)
+            connection.commit()
+        finally:
+            connection.close()
+        shutil.rmtree(staging_dir)
+
+        with open(os.path.join(self.store_path, 'manifest.json'), 'w', encoding='utf-8') as file:
+            json.dump({
+                'dump_files': [os.path.abspath(dump_file) for dump_file in dump_files],
+                'partitions': self.partitions,
+                'records': self.records_kept - self.duplicates,
+                'authors': self.authors,
+            }, file, indent=4)
+
+    def summary(self):
+        return (f"Records read: {self.records_read}, kept: {self.records_kept - self.duplicates} "
+                f"({self.duplicates} duplicates dropped), authors: {self.authors}")
+
+
+class AuthorStore:
+    """Read side of an author store, safe to share between threads."""
+
+    def __init__(self, store_path):
+        index_path = os.path.join(store_path, 'index.sqlite')
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"No author store at {store_path}, build one with build_author_index.py")
+        self.store_path = store_path
+        self.lookups = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(f'file:{index_path}?mode=ro', uri=True, check_same_thread=False)
+        self._data_files = {}
+
+    def _data_file(self, partition):
+        if partition not in self._data_files:
+            path = os.path.join(self.store_path, f'authors-{partition:03d}.bin')
+            self._data_files[partition] = os.open(path, os.O_RDONLY)
+        return self._data_files[partition]
+
+    # Function to return {'posts': [...], 'comments': [...]} newest first, or None
+    def get_history(self, username):
+        with self._lock:
+            self.lookups += 1
+            row = self._connection.execute(
+                'SELECT partition, offset, length FROM authors WHERE author = ?', (username,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            descriptor = self._data_file(row[0])
+        # pread keeps no file position, so readers in other threads do not interfere
+        return json.loads(zlib.decompress(os.pread(descriptor, row[2], row[1])))
+
+    def __contains__(self, username):
+        with self._lock:
+            return self._connection.execute(
+                'SELECT 1 FROM authors WHERE author = ?', (username,)).fetchone() is not None
+
+    def author_count(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM authors').fetchone()[0]
+
+    def summary(self):
+        return f"Author store lookups: {self.lookups}, authors not in store: {self.misses}"
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+            for descriptor in self._data_files.values():
+                os.close(descriptor)
+            self._data_files = {}
+
+
+def _in_window(records, before, after):
+    if before is None and after is None:
+        return records
+    return [record for record in records
+            if (before is None or (record.get('created_utc') or 0) < before)
+            and (after is None or (record.get('created_utc') or 0) > after)]
+
+
+class OfflineArcticClient:
+    """Stand-in for BlockingArcticClient that answers author lookups from an AuthorStore.
+
+    Authors missing from the store have an empty history, as users with no
+    submissions do on the API. Subreddit listings are not available offline.
+    """
+
+    def __init__(self, store_path=DEFAULT_STORE_PATH):
+        self.store = AuthorStore(store_path)
+        self.cache = None
+        self.request_count = 0
+
+    def fetch_user_submissions(self, username, before=None, after=None):
+        history = self.store.get_history(username) or {'posts': [], 'comments': []}
+        return _in_window(history['posts'], before, after) + _in_window(history['comments'], before, after)
+
+    def fetch_author_subreddit_counts(self, username):
+        counts = {}
+        for submission in self.fetch_user_submissions(username):
+            subreddit = submission.get('subreddit') or ''
+            counts[subreddit] = counts.get(subreddit, 0) + 1
+        return counts, True
+
+    def iter_user_history(self, username, before=None, after=None):
+        yield from self.fetch_user_submissions(username, before, after)
+
+    # Generator yielding (username, submissions, error) in input order
+    def iter_user_submissions(self, usernames, window=None):
+        for username in usernames:
+            try:
+                yield username, self.fetch_user_submissions(username), None
+            except Exception as e:
+                yield username, [], e
+
+    def fetch_subreddit_posts(self, subreddit, limit):
+        raise ArcticShiftError("Subreddit listings are not available from an offline author store")
+
+    def summary(self):
+        return f"Offline: answered from {self.store.store_path}\n{self.store.summary()}"
+
+    def close(self):
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
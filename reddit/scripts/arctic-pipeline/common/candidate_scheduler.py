@@ -0,0 +1,180 @@
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+
+from common.telemetry import get_telemetry
+
+# Shared scheduling of control candidate evaluations for match_controls.py.
+# Candidate lists of different diagnosed users overlap heavily, so every
+# candidate is fetched and filtered at most once for the whole run and the
+# result is shared by all diagnosed users that list it. Candidates already
+# claimed as someone's control are skipped before any request is made.
+# Evaluations run on a pool of fetch workers, and each diagnosed user keeps
+# a bounded number of its next candidates requested ahead of the one it is
+# deciding, so deciding rarely waits on the network.
+# An evaluation (a candidate's cleaned posts) is kept only while a diagnosed
+# user listing the candidate has yet to decide on it: users release every
+# candidate they are done with, and once all users given to expect() have,
+# the evaluation is dropped.
+# API use of the fetch workers is counted under the pipeline stage the
+# scheduler works for, whichever stage is running when they fetch.
+
+
+class CandidateScheduler:
+    """Deduplicating, prefetching evaluator of control candidates.
+
+    evaluate:      function(candidate) -> result, run on the fetch workers
+    fetch_workers: number of candidates evaluated at the same time
+    prefetch:      candidates each diagnosed user requests ahead
+    stage:         pipeline stage the evaluations are counted under, by
+                   default the one running when the scheduler is created
+    """
+
+    def __init__(self, evaluate, fetch_workers=16, prefetch=8, stage=None):
+        self.evaluate = evaluate
+        self.prefetch = prefetch
+        self.telemetry = get_telemetry()
+        self.stage = self.telemetry.current_stage() if stage is None else stage
+        self.evaluated = 0
+        self.shared = 0
+        self.skipped_claimed = 0
+        self.accepted = 0
+        self._claimed = set()
+        self._evaluations = {}
+        self._undecided = Counter()
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=fetch_workers)
+
+    # Function to preload state from an earlier run: claimed controls, and
+    # candidates whose evaluation is already known (e.g. rejections)
+    def restore(self, claimed=(), known=None):
+        with self._lock:
+            self._claimed.update(claimed)
+            for candidate, result in (known or {}).items():
+                future = Future()
+                future.set_result(result)
+                self._evaluations[candidate] = future
+
+    # Function to register the candidate lists of the diagnosed users, each
+    # of whose candidates will be released once by iter_evaluations or its caller
+    def expect(self, candidate_lists):
+        with self._lock:
+            for candidates in candidate_lists:
+                self._undecided.update(candidates)
+
+    # Function to note that one diagnosed user is done with a candidate; the
+    # evaluation is dropped when no user listing it is left to decide
+    def release(self, candidate):
+        with self._lock:
+            if candidate not in self._undecided:
+                return
+            self._undecided[candidate] -= 1
+            if self._undecided[candidate] <= 0:
+                del self._undecided[candidate]
+                self._evaluations.pop(candidate, None)
+
+    # Function to get the (possibly still running) evaluation of a candidate,
+    # starting it if nobody has asked for it yet
+    def request(self, candidate):
+        with self._lock:
+            future = self._evaluations.get(candidate)
+            if future is None:
+                future = self._executor.submit(self._evaluate, candidate)
+                self._evaluations[candidate] = future
+                self.evaluated += 1
+            else:
+                self.shared += 1
+            return future
+
+    # Function run on the fetch workers
+    def _evaluate(self, candidate):
+        with self.telemetry.attributed(self.stage):
+            return self.evaluate(candidate)
+
+    # Function to get the evaluation of a candidate that was already requested
+    def evaluation(self, candidate):
+        with self._lock:
+            return self._evaluations[candidate]
+
+    def is_claimed(self, candidate):
+        with self._lock:
+            return candidate in self._claimed
+
+    # Function to claim a candidate as a control, False if it is already taken
+    def claim(self, candidate):
+        with self._lock:
+            if candidate in self._claimed:
+                return False
+            self._claimed.add(candidate)
+            self.accepted += 1
+            # Nobody else can use it now, so its posts need not stay in memory
+            future = self._evaluations.get(candidate)
+            if future is not None and future.done():
+                self._evaluations[candidate] = _DROPPED
+            return True
+
+    # Generator of (candidate, future) in list order, skipping claimed candidates
+    # and keeping `prefetch` evaluations requested ahead of the caller. The
+    # caller releases the candidates it is given; the skipped ones, and those
+    # never reached when the generator is closed, are released here.
+    def iter_evaluations(self, candidates):
+        pending = deque()
+        candidates = iter(candidates)
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < self.prefetch:
+                    candidate = next(candidates, None)
+                    if candidate is None:
+                        exhausted = True
+                    elif self.is_claimed(candidate):
+                        with self._lock:
+                            self.skipped_claimed += 1
+                        self.release(candidate)
+                    else:
+                        pending.append((candidate, self.request(candidate)))
+                if not pending:
+                    return
+                candidate, future = pending.popleft()
+                if self.is_claimed(candidate):
+                    self.release(candidate)
+                    continue
+                yield candidate, future
+        finally:
+            for candidate, _ in pending:
+                self.release(candidate)
+            for candidate in candidates:
+                self.release(candidate)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'evaluated': self.evaluated,
+                'shared': self.shared,
+                'skipped_claimed': self.skipped_claimed,
+                'accepted': self.accepted,
+            }
+
+    def summary(self, request_count=None):
+        stats = self.stats()
+        summary = (f"Candidates evaluated: {stats['evaluated']}, evaluations shared between diagnosed users: "
+                   f"{stats['shared']}, skipped as already claimed: {stats['skipped_claimed']}")
+        if request_count is not None:
+            per_control = request_count / stats['accepted'] if stats['accepted'] else float(request_count)
+            summary += f"\nAPI calls per accepted control: {per_control:.2f} ({request_count} calls, {stats['accepted']} controls)"
+        return summary
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class _DroppedEvaluation:
+    # Stands in for the evaluation of a claimed candidate
+    def done(self):
+        return True
+
+    def result(self):
+        return None
+
+
+_DROPPED = _DroppedEvaluation()
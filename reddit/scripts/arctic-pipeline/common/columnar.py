@@ -0,0 +1,113 @@
+import os
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Columnar (Parquet) copies of the CYMO-format outputs.
+# The CSVs only hold TID,text, with user and post ids packed into the TID.
+# The Parquet dataset holds them as typed columns instead, partitioned by
+# label (hive layout, one folder per label):
+#     <dataset>/label=1/part-00000.parquet   diagnosed posts
+#     <dataset>/label=0/part-00000.parquet   control posts
+# so the diagnosed and control formatters can write into the same dataset.
+# Readers get column pruning and predicate pushdown, e.g.
+#     read_posts(dataset, columns=['username', 'text'], filters=[('label', '=', 0)])
+
+DIAGNOSED_LABEL = 1
+CONTROL_LABEL = 0
+
+# Columns stored in the files; label comes from the partition folder
+POST_SCHEMA = pa.schema([
+    ('username', pa.string()),
+    ('diagnosed_user', pa.string()),  # diagnosed user a control was matched to, null for diagnosed posts
+    ('subreddit', pa.string()),
+    ('post_id', pa.string()),
+    ('created_utc', pa.timestamp('ms', tz='UTC')),  # Parquet has no second unit
+    ('text', pa.string()),
+])
+PARTITIONING = ds.partitioning(pa.schema([('label', pa.int8())]), flavor='hive')
+
+ROW_GROUP_SIZE = 100_000
+ROWS_PER_FILE = 1_000_000
+
+
+class ParquetPostWriter:
+    """Writes the posts of one label into a Parquet dataset, replacing that label's partition.
+
+    dataset_dir:    folder of the dataset, shared by both labels
+    label:          DIAGNOSED_LABEL or CONTROL_LABEL
+    row_group_size: rows buffered before a row group is written
+    rows_per_file:  rows per part file
+
+    Use as a context manager:
+        with ParquetPostWriter('bipolar.parquet', DIAGNOSED_LABEL) as writer:
+            writer.write('user', 'abc123', 'sports', 1717200000, 'some text')
+    """
+
+    def __init__(self, dataset_dir, label, row_group_size=ROW_GROUP_SIZE, rows_per_file=ROWS_PER_FILE):
+        self.partition_dir = os.path.join(dataset_dir, f'label={label}')
+        self.row_group_size = row_group_size
+        self.rows_per_file = rows_per_file
+        self.rows = 0
+        self._columns = {name: [] for name in POST_SCHEMA.names}
+        self._writer = None
+        self._file_rows = 0
+        self._file_count = 0
+
+    def __enter__(self):
+        # Rows of an earlier run would otherwise be read along with the new ones
+        os.makedirs(self.partition_dir, exist_ok=True)
+        for file_name in os.listdir(self.partition_dir):
+            if file_name.endswith('.parquet'):
+                os.remove(os.path.join(self.partition_dir, file_name))
+        return self
+
+    def write(self, username, post_id, subreddit, created_utc, text, diagnosed_user=None):
+        self._columns['username'].append(username)
+        self._columns['diagnosed_user'].append(diagnosed_user)
+        self._columns['subreddit'].append(subreddit)
+        self._columns['post_id'].append(post_id)
+        self._columns['created_utc'].append(_timestamp(created_utc))
+        self._columns['text'].append(text)
+        self.rows += 1
+        if len(self._columns['text']) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._columns['text']:
+            return
+        if self._writer is None:
+            file_path = os.path.join(self.partition_dir, f'part-{self._file_count:05d}.parquet')
+            self._writer = pq.ParquetWriter(file_path, POST_SCHEMA, compression='zstd')
+            self._file_count += 1
+        table = pa.Table.from_pydict(self._columns, schema=POST_SCHEMA)
+        self._writer.write_table(table)
+        self._file_rows += table.num_rows
+        self._columns = {name: [] for name in POST_SCHEMA.names}
+        if self._file_rows >= self.rows_per_file:
+            self._close_file()
+
+    def _close_file(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._file_rows = 0
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._flush()
+        self._close_file()
+        return False
+
+
+# Function to convert created_utc (seconds, as int, float or string) to a UTC datetime
+def _timestamp(created_utc):
+    if created_utc is None or created_utc == '':
+        return None
+    return datetime.fromtimestamp(int(float(created_utc)), tz=timezone.utc)
+
+
+# Function to read a post dataset (or only some columns / rows of it) as an Arrow table
+def read_posts(dataset_dir, columns=None, filters=None):
+    return pq.read_table(dataset_dir, columns=columns, filters=filters, partitioning=PARTITIONING)
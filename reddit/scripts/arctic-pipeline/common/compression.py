@@ -0,0 +1,65 @@
+import gzip
+import io
+import os
+
+import zstandard
+
+# Transparent reading and writing of compressed dump files.
+# Arctic Shift and Pushshift dumps are zstd-compressed NDJSON written with a
+# long window (up to 2 GiB), so the decompressor has to be allowed that much.
+# Files are picked by extension: .zst, .gz, anything else is read as is.
+# Compressed input is decompressed in large chunks behind a buffered reader,
+# so no decompressed copy ever has to be written to disk.
+
+ZSTD_MAX_WINDOW = 2 ** 31
+COMPRESSED_SUFFIXES = ('.zst', '.gz')
+READ_CHUNK_SIZE = 4 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+
+
+def is_compressed(file_path):
+    return file_path.endswith(COMPRESSED_SUFFIXES)
+
+
+# Function to find file_path or a compressed copy of it (file_path + .zst/.gz),
+# returns None when neither exists
+def find_input_file(file_path):
+    for candidate in (file_path,) + tuple(file_path + suffix for suffix in COMPRESSED_SUFFIXES):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+# Function to strip a compression suffix from a file name
+def base_name(file_path):
+    for suffix in COMPRESSED_SUFFIXES:
+        if file_path.endswith(suffix):
+            return file_path[:-len(suffix)]
+    return file_path
+
+
+# Function to open a possibly compressed file for streaming, in binary mode
+def open_binary(file_path):
+    if file_path.endswith('.zst'):
+        decompressor = zstandard.ZstdDecompressor(max_window_size=ZSTD_MAX_WINDOW)
+        reader = decompressor.stream_reader(open(file_path, 'rb'), read_size=READ_CHUNK_SIZE, closefd=True)
+        return io.BufferedReader(reader, buffer_size=BUFFER_SIZE)
+    if file_path.endswith('.gz'):
+        return io.BufferedReader(gzip.open(file_path, 'rb'), buffer_size=BUFFER_SIZE)
+    return open(file_path, 'rb', buffering=BUFFER_SIZE)
+
+
+# Function to open a possibly compressed file for streaming, as text
+def open_text(file_path, encoding='utf-8'):
+    return io.TextIOWrapper(open_binary(file_path), encoding=encoding)
+
+
+# Function to open a file for writing, compressed according to its extension.
+# level is the zstd or gzip compression level, None for the library default.
+def open_output_binary(file_path, level=None):
+    if file_path.endswith('.zst'):
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level, threads=-1)
+        return compressor.stream_writer(open(file_path, 'wb'), closefd=True)
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'wb', compresslevel=6 if level is None else level)
+    return open(file_path, 'wb', buffering=BUFFER_SIZE)
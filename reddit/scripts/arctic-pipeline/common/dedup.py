@@ -0,0 +1,221 @@
+import hashlib
+import heapq
+import mmap
+import os
+import shutil
+import tempfile
+from array import array
+from bisect import bisect_left
+from itertools import repeat
+
+# Compact set of text digests for deduplication.
+# Instead of whole texts, only a 64 or 128-bit blake2b digest of each text is
+# kept, in an open-addressing hash table backed by array('Q') (8 or 16 bytes
+# per slot instead of the text plus ~100 bytes of Python objects). Past the
+# memory budget the table is written to disk as a sorted run and emptied;
+# later lookups binary search the runs through mmap, and the runs are merged
+# into one (streaming, without loading them) once there are MAX_RUNS of them.
+# With 64 bits, two
+# different texts share a digest with probability ~n^2 / 2^65 (about 3% for
+# a billion texts), so 128 bits is the default for large inputs.
+
+MAX_LOAD = 0.5
+MIN_CAPACITY = 1024
+MAX_RUNS = 8
+MERGE_BLOCK = 1024 * 1024
+
+
+class DigestSet:
+    """Set of texts stored as fixed-width digests, spilling to disk past a memory budget.
+
+    bits:          digest width, 64 or 128
+    memory_mb:     memory the in-memory table may use before it is spilled, None for no limit
+    spill_dir:     folder for the spilled runs (a temporary folder under it is used), default the system one
+    capacity:      initial number of slots
+
+    Use as a context manager (or call close()) so spilled runs are deleted:
+        with DigestSet(128, memory_mb=512) as seen:
+            if seen.add(text): ...
+    """
+
+    def __init__(self, bits=128, memory_mb=None, spill_dir=None, capacity=MIN_CAPACITY):
+        if bits not in (64, 128):
+            raise ValueError(f"bits must be 64 or 128, got {bits}")
+        self.bits = bits
+        self.memory_bytes_limit = None if memory_mb is None else memory_mb * 1024 * 1024
+        self.spill_dir = spill_dir
+        self.spilled = 0
+        self._digest_size = bits // 8
+        self._count = 0
+        self._runs = []
+        self._maps = []
+        self._run_dir = None
+        self._run_number = 0
+        self._allocate(max(MIN_CAPACITY, 1 << (capacity - 1).bit_length()))
+
+    def _allocate(self, capacity):
+        self._capacity = capacity
+        self._mask = capacity - 1
+        self._table_count = 0
+        self._high = array('Q', bytes(8 * capacity))
+        self._low = array('Q', bytes(8 * capacity)) if self.bits == 128 else None
+
+    # Function to get the digest of a text as (high, low) 64-bit halves; (0, 0) marks empty slots
+    def _digest(self, text):
+        digest = hashlib.blake2b(text.encode('utf-8'), digest_size=self._digest_size).digest()
+        high = int.from_bytes(digest[:8], 'little')
+        low = int.from_bytes(digest[8:], 'little') if self.bits == 128 else 0
+        if high == 0 and low == 0:
+            high = 1  # Moved off the empty marker, at the cost of one more possible collision
+        return high, low
+
+    # Function to find the slot of a digest, or the empty slot where it belongs
+    def _slot(self, high, low):
+        table_high, table_low = self._high, self._low
+        slot = high & self._mask
+        while True:
+            slot_high = table_high[slot]
+            if slot_high == 0 and (table_low is None or table_low[slot] == 0):
+                return slot, False
+            if slot_high == high and (table_low is None or table_low[slot] == low):
+                return slot, True
+            slot = (slot + 1) & self._mask
+
+    def _in_runs(self, high, low):
+        for run_high, run_low in self._runs:
+            index = bisect_left(run_high, high)
+            while index < len(run_high) and run_high[index] == high:
+                if run_low is None or run_low[index] == low:
+                    return True
+                index += 1
+        return False
+
+    def __contains__(self, text):
+        high, low = self._digest(text)
+        return self._slot(high, low)[1] or self._in_runs(high, low)
+
+    # Function to add a text, returns False if it was already in the set
+    def add(self, text):
+        high, low = self._digest(text)
+        slot, found = self._slot(high, low)
+        if found or (self._runs and self._in_runs(high, low)):
+            return False
+        self._high[slot] = high
+        if self._low is not None:
+            self._low[slot] = low
+        self._table_count += 1
+        self._count += 1
+        if self._table_count > MAX_LOAD * self._capacity:
+            if self.memory_bytes_limit is not None and 2 * self.memory_bytes >= self.memory_bytes_limit:
+                self._spill()
+            else:
+                self._grow()
+        return True
+
+    def _entries(self):
+        for slot in range(self._capacity):
+            high = self._high[slot]
+            low = self._low[slot] if self._low is not None else 0
+            if high or low:
+                yield high, low
+
+    def _grow(self):
+        old_high, old_low = self._high, self._low
+        self._allocate(2 * self._capacity)
+        for slot in range(len(old_high)):
+            high = old_high[slot]
+            low = old_low[slot] if old_low is not None else 0
+            if high or low:
+                new_slot, _ = self._slot(high, low)
+                self._high[new_slot] = high
+                if self._low is not None:
+                    self._low[new_slot] = low
+                self._table_count += 1
+
+    # Function to write the table as a sorted run and empty it
+    def _spill(self):
+        if self._run_dir is None:
+            self._run_dir = tempfile.mkdtemp(prefix='dedup-', dir=self.spill_dir)
+        entries = sorted(self._entries())
+        self._runs.append(self._write_run(entries))
+        self.spilled += len(entries)
+        self._allocate(self._capacity)
+        if len(self._runs) >= MAX_RUNS:
+            self._merge_runs()
+
+    # Function to merge the sorted runs into one
+    def _merge_runs(self):
+        runs, maps = self._runs, self._maps
+        self._maps = []
+        entries = heapq.merge(*(zip(run_high, run_low if run_low is not None else repeat(0, len(run_high)))
+                                for run_high, run_low in runs))
+        self._runs = [self._write_run(entries)]
+        for mapped, view, path in maps:
+            view.release()
+            mapped.close()
+            os.remove(path)
+
+    def __len__(self):
+        return self._count
+
+    # Bytes held in memory by the table
+    @property
+    def memory_bytes(self):
+        return self._capacity * 8 * (2 if self.bits == 128 else 1)
+
+    @property
+    def disk_bytes(self):
+        return self.spilled * 8 * (2 if self.bits == 128 else 1)
+
+    def summary(self):
+        line = (f"Dedup: {self._count} unique texts as {self.bits}-bit digests, "
+                f"{self.memory_bytes / 1024 / 1024:.2f} MB in memory")
+        if self._runs:
+            line += f", {self.spilled} spilled to {len(self._runs)} runs ({self.disk_bytes / 1024 / 1024:.2f} MB on disk)"
+        return line
+
+    # Function to write sorted (high, low) digests as a run, returns its (high, low) sequences
+    def _write_run(self, entries):
+        run_path = os.path.join(self._run_dir, f'run-{self._run_number:04d}')
+        self._run_number += 1
+        high_path, low_path = run_path + '.high', run_path + '.low'
+        with open(high_path, 'wb') as high_file, open(low_path if self.bits == 128 else os.devnull, 'wb') as low_file:
+            high_block, low_block = array('Q'), array('Q')
+            for high, low in entries:
+                high_block.append(high)
+                low_block.append(low)
+                if len(high_block) >= MERGE_BLOCK:
+                    high_block.tofile(high_file)
+                    low_block.tofile(low_file)
+                    high_block, low_block = array('Q'), array('Q')
+            high_block.tofile(high_file)
+            low_block.tofile(low_file)
+        return self._map(high_path), self._map(low_path) if self.bits == 128 else None
+
+    # Function to map a run file as a read-only sequence of 64-bit integers
+    def _map(self, file_path):
+        if os.path.getsize(file_path) == 0:
+            return array('Q')
+        with open(file_path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped).cast('Q')
+        self._maps.append((mapped, view, file_path))
+        return view
+
+    def close(self):
+        self._runs = []
+        for mapped, view, _ in self._maps:
+            view.release()
+            mapped.close()
+        self._maps = []
+        if self._run_dir is not None:
+            shutil.rmtree(self._run_dir, ignore_errors=True)
+            self._run_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
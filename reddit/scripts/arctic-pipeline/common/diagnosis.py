@@ -0,0 +1,238 @@
+import os
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+
+from common.patterns import PatternMatcher
+
+# Self-diagnosis engine used by separate_diagnosed_users.py.
+# A post diagnoses its author when it contains a positive diagnosis pattern,
+# no negative diagnosis pattern, and a condition synonym within
+# `max_distance` characters of one of the positive patterns. The multi
+# condition engine does this for several conditions in one pass.
+
+
+class DiagnosisEngine:
+    """Precompiled positive/negative/synonym lexicons for one condition.
+
+    first_occurrence_only: only compare the first occurrence of every pattern
+                           and synonym, which is what the original per-pattern
+                           loop did. Set to False to consider every occurrence.
+    """
+
+    def __init__(self, positive_patterns, negative_patterns, condition_synonyms,
+                 max_distance=40, first_occurrence_only=True):
+        self.positive_patterns = list(positive_patterns)
+        self.negative_patterns = list(negative_patterns)
+        self.condition_synonyms = list(condition_synonyms)
+        self.max_distance = max_distance
+        self.first_occurrence_only = first_occurrence_only
+
+        self.positive = PatternMatcher(self.positive_patterns, ignore_case=True)
+        self.negative = PatternMatcher(self.negative_patterns, ignore_case=True)
+        self.synonyms = PatternMatcher(self.condition_synonyms, ignore_case=True, word_boundary=True)
+
+    # Pickles as its lexicons, matchers are rebuilt on the other side
+    def __reduce__(self):
+        return (DiagnosisEngine, (self.positive_patterns, self.negative_patterns, self.condition_synonyms,
+                                  self.max_distance, self.first_occurrence_only))
+
+    # Function to collect (start, end) spans for a matcher
+    def _spans(self, matcher, text):
+        if self.first_occurrence_only:
+            return list(matcher.first_occurrences(text).values())
+        return [(start, end) for start, end, _ in matcher.find_all(text)]
+
+    # Function to check if a synonym lies close enough to a positive pattern
+    def _within_distance(self, positive_spans, synonym_spans):
+        synonym_ends = sorted(end for _, end in synonym_spans)
+        synonym_starts = sorted(start for start, _ in synonym_spans)
+        limit = self.max_distance
+
+        for start_pos, end_pos in positive_spans:
+            # |start_pos - synonym_end| <= limit
+            index = bisect_left(synonym_ends, start_pos - limit)
+            if index < len(synonym_ends) and synonym_ends[index] <= start_pos + limit:
+                return True
+            # |end_pos - synonym_start| <= limit
+            index = bisect_left(synonym_starts, end_pos - limit)
+            if index < len(synonym_starts) and synonym_starts[index] <= end_pos + limit:
+                return True
+        return False
+
+    # Function to check if a single text is a self-diagnosis statement
+    def is_diagnosis(self, text):
+        if self.negative.contains(text):
+            return False
+
+        positive_spans = self._spans(self.positive, text)
+        if not positive_spans:
+            return False
+
+        synonym_spans = self._spans(self.synonyms, text)
+        if not synonym_spans:
+            return False
+
+        return self._within_distance(positive_spans, synonym_spans)
+
+    # Function to find the first diagnosis post of every author, in input order
+    def diagnose(self, posts, decided_authors=None):
+        decided_authors = set() if decided_authors is None else decided_authors
+        diagnosed_posts = []
+
+        for post in posts:
+            author = post['author']
+            if author in decided_authors:
+                continue  # Skip before running any regex
+            if self.is_diagnosis(post['selftext']):
+                diagnosed_posts.append(post)
+                decided_authors.add(author)
+
+        return diagnosed_posts
+
+
+class MultiConditionDiagnosisEngine(DiagnosisEngine):
+    """Diagnoses every condition in the same pass over a post.
+
+    condition_synonyms: dict of condition name -> synonyms
+    All synonyms share one matcher and the positive and negative patterns are
+    matched once per post; every condition gets the same result its own
+    DiagnosisEngine would give.
+    """
+
+    def __init__(self, positive_patterns, negative_patterns, condition_synonyms,
+                 max_distance=40, first_occurrence_only=True):
+        self.condition_lexicons = {condition: list(synonyms) for condition, synonyms in condition_synonyms.items()}
+        self.conditions = list(self.condition_lexicons)
+        all_synonyms = [synonym for synonyms in self.condition_lexicons.values() for synonym in synonyms]
+        super().__init__(positive_patterns, negative_patterns, all_synonyms, max_distance, first_occurrence_only)
+
+        # Conditions listing each synonym (a synonym may belong to several)
+        self._conditions_of = {}
+        for condition, synonyms in self.condition_lexicons.items():
+            for synonym in synonyms:
+                if synonym:
+                    listed = self._conditions_of.setdefault(synonym.lower(), [])
+                    if condition not in listed:
+                        listed.append(condition)
+
+    def __reduce__(self):
+        return (MultiConditionDiagnosisEngine, (self.positive_patterns, self.negative_patterns, self.condition_lexicons,
+                                                self.max_distance, self.first_occurrence_only))
+
+    # Function to get the conditions (among `conditions`) a text is a self-diagnosis statement of
+    def diagnosed_conditions(self, text, conditions=None):
+        if self.negative.contains(text):
+            return []
+
+        positive_spans = self._spans(self.positive, text)
+        if not positive_spans:
+            return []
+
+        if self.first_occurrence_only:
+            synonym_hits = [(pattern, span) for pattern, span in self.synonyms.first_occurrences(text).items()]
+        else:
+            synonym_hits = [(pattern, (start, end)) for start, end, pattern in self.synonyms.find_all(text)]
+        synonym_spans = {}
+        for pattern, span in synonym_hits:
+            for condition in self._conditions_of[pattern.lower()]:
+                synonym_spans.setdefault(condition, []).append(span)
+
+        return [condition for condition in (conditions or self.conditions)
+                if condition in synonym_spans and self._within_distance(positive_spans, synonym_spans[condition])]
+
+    # Function to find the first diagnosis post of every author for every
+    # condition, in input order; returns a dict of condition -> posts
+    def diagnose(self, posts, decided_authors=None):
+        decided_authors = {condition: set() for condition in self.conditions} if decided_authors is None else decided_authors
+        diagnosed_posts = {condition: [] for condition in self.conditions}
+
+        for post in posts:
+            author = post['author']
+            pending = [condition for condition in self.conditions if author not in decided_authors[condition]]
+            if not pending:
+                continue  # Skip before running any regex
+            for condition in self.diagnosed_conditions(post['selftext'], pending):
+                diagnosed_posts[condition].append(post)
+                decided_authors[condition].add(author)
+
+        return diagnosed_posts
+
+
+_worker_engine = None
+
+
+def _init_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+
+
+def _diagnose_chunk(posts):
+    return _worker_engine.diagnose(posts)
+
+
+# Function to split a stream of posts into chunks for the process pool
+def _chunks(posts, chunk_size):
+    posts = iter(posts)
+    while True:
+        chunk = list(islice(posts, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Generator of the engine's result for every chunk of posts, in input order.
+# A single chunk (or workers == 1) is diagnosed in this process.
+def _chunk_results(engine, posts, workers, chunk_size):
+    if workers == 1:
+        yield engine.diagnose(posts)
+        return
+
+    chunks = _chunks(posts, chunk_size)
+    first_chunk = next(chunks, [])
+    if len(first_chunk) < chunk_size:
+        # Everything fits in one chunk, a pool would only add overhead
+        yield engine.diagnose(first_chunk)
+        return
+
+    max_pending = 2 * (workers or os.cpu_count() or 1)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(engine,)) as executor:
+        for chunk in chain([first_chunk], chunks):
+            pending.append(executor.submit(_diagnose_chunk, chunk))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# Function to add the posts of a later chunk, keeping each author's first diagnosis post
+def _merge(diagnosed_posts, decided_authors, chunk_posts):
+    for post in chunk_posts:
+        if post['author'] not in decided_authors:
+            decided_authors.add(post['author'])
+            diagnosed_posts.append(post)
+
+
+# Function to diagnose posts across a process pool, keeping sequential results.
+# Posts can be any iterable; at most a few chunks per worker are held in memory.
+def diagnose_parallel(engine, posts, workers=None, chunk_size=20000):
+    diagnosed_posts = []
+    decided_authors = set()
+    # Results are merged in submission order, so the first diagnosis
+    # post of every author is the same as in a sequential run
+    for chunk_posts in _chunk_results(engine, posts, workers, chunk_size):
+        _merge(diagnosed_posts, decided_authors, chunk_posts)
+    return diagnosed_posts
+
+
+# Function to diagnose every condition of a MultiConditionDiagnosisEngine
+# across a process pool; returns a dict of condition -> posts
+def diagnose_conditions_parallel(engine, posts, workers=None, chunk_size=20000):
+    diagnosed_posts = {condition: [] for condition in engine.conditions}
+    decided_authors = {condition: set() for condition in engine.conditions}
+    for chunk_result in _chunk_results(engine, posts, workers, chunk_size):
+        for condition, chunk_posts in chunk_result.items():
+            _merge(diagnosed_posts[condition], decided_authors[condition], chunk_posts)
+    return diagnosed_posts
@@ -0,0 +1,71 @@
+import json
+import os
+import threading
+
+# Append-only progress journals for long-running stages.
+# Every entry is one JSON object per line, flushed as it is written, and
+# fsynced when it marks finished work, so after a crash the journal holds
+# everything up to the last completed step. A line cut short by the crash
+# is ignored when the journal is read back.
+
+
+class Journal:
+    """Appends entries to a JSONL journal; starts a new one unless resume is set.
+
+    Use as a context manager:
+        with Journal('progress.journal.jsonl', resume=True) as journal:
+            journal.append({'type': 'done', 'item': 'x'}, sync=True)
+    """
+
+    def __init__(self, file_path, resume=False):
+        self.file_path = file_path
+        self.resume = resume
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if self.resume and os.path.exists(self.file_path):
+            # Drop a torn final line so new entries start on a line of their own
+            with open(self.file_path, 'r+b') as file:
+                file.truncate(_complete_length(file))
+        self._file = open(self.file_path, 'a' if self.resume else 'w', encoding='utf-8')
+        return self
+
+    def append(self, entry, sync=False):
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.close()
+        return False
+
+
+# Function to find how many leading bytes of a journal hold complete entries
+def _complete_length(file):
+    length = 0
+    for line in file:
+        try:
+            json.loads(line)
+        except ValueError:
+            break
+        if not line.endswith(b'\n'):
+            break
+        length += len(line)
+    return length
+
+
+# Generator of the entries of a journal; yields nothing if it does not exist
+def read_journal(file_path):
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Torn final line of an interrupted write
+                return
@@ -0,0 +1,291 @@
+import json
+from collections import Counter
+
+import numpy as np
+
+# Near-duplicate detection (bot posts, templated replies, copypasta) with
+# MinHash and locality-sensitive hashing.
+# Each text is shingled into overlapping 5-byte windows. Its MinHash
+# signature is computed with one permutation hashing: every shingle is hashed
+# once, the hash picks one of `num_perm` bins and the signature keeps the
+# smallest hash per bin (empty bins borrow from the next bin, "densified"),
+# so two signatures agree in a share of positions close to the Jaccard
+# similarity of the texts. Signatures are cut into bands of rows; a text
+# sharing a band with an earlier one is a candidate, and is dropped when the
+# signatures confirm the similarity reaches `threshold`. Shingling, hashing
+# and banding run on whole batches of texts in NumPy.
+#
+# Per text kept, only `bands` band keys (12 bytes each, sorted uint64 runs)
+# and the low byte of each signature value (to confirm candidates) are kept,
+# about 160 bytes with 64 hashes, so tens of millions of texts fit in a few
+# GB. The first text of a cluster is kept and later ones are dropped.
+
+SHINGLE_SIZE = 5
+BATCH_SIZE = 4096
+MERGE_FACTOR = 4
+SAMPLE_LENGTH = 200
+EMPTY_BIN = np.uint64(2 ** 64 - 1)
+
+
+# Function to pick (bands, rows) with bands * rows = num_perm whose S-curve
+# (texts share a band with probability 1 - (1 - s^rows)^bands) rises closest to threshold
+def lsh_bands(threshold, num_perm):
+    layouts = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(layouts, key=lambda layout: abs((1.0 / layout[0]) ** (1.0 / layout[1]) - threshold))
+
+
+# Function to mix 64-bit integers into uniformly distributed hashes (splitmix64 finalizer)
+def _mix(values):
+    values = values ^ (values >> np.uint64(30))
+    values *= np.uint64(0xbf58476d1ce4e5b9)
+    values ^= values >> np.uint64(27)
+    values *= np.uint64(0x94d049bb133111eb)
+    values ^= values >> np.uint64(31)
+    return values
+
+
+class MinHasher:
+    """MinHash signatures of texts (one permutation hashing), computed a batch at a time.
+
+    num_perm: bins of a signature
+    seed:     seed of the hash function (equal seeds give comparable signatures)
+    """
+
+    def __init__(self, num_perm=64, seed=1):
+        self.num_perm = num_perm
+        self._seed = _mix(np.array([seed], dtype=np.uint64))[0]
+        self._weights = np.uint64(256) ** np.arange(SHINGLE_SIZE, dtype=np.uint64)
+
+    # Function to get the shingles of a batch of texts as one uint64 array and
+    # the number of shingles of each text
+    def _shingles(self, texts):
+        encoded = [text.encode('utf-8').ljust(SHINGLE_SIZE, b'\0') for text in texts]
+        lengths = np.fromiter((len(data) for data in encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+        windows = np.lib.stride_tricks.sliding_window_view(data, SHINGLE_SIZE) @ self._weights
+        # Windows starting in the last SHINGLE_SIZE - 1 bytes of a text cross into the next one
+        counts = lengths - SHINGLE_SIZE + 1
+        text_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        shingles = windows[np.arange(counts.sum()) + np.repeat(text_starts - offsets, counts)]
+        return shingles, counts
+
+    # Function to compute the signatures of a batch of texts, a (len(texts), num_perm) uint64 array
+    def signatures(self, texts):
+        shingles, counts = self._shingles(texts)
+        hashed = _mix(shingles ^ self._seed)
+        # The high half of the hash picks the bin, the low half is the value
+        bins = ((hashed >> np.uint64(32)) * np.uint64(self.num_perm)) >> np.uint64(32)
+        cells = np.repeat(np.arange(len(texts), dtype=np.uint64) * np.uint64(self.num_perm), counts) + bins
+        signatures = np.full(len(texts) * self.num_perm, EMPTY_BIN, dtype=np.uint64)
+        np.minimum.at(signatures, cells.astype(np.intp), hashed & np.uint64(0xffffffff))
+        return self._densify(signatures.reshape(len(texts), self.num_perm))
+
+    # Function to fill empty bins from the next non-empty bin (circularly),
+    # offset by the distance so borrowed values differ from the originals
+    def _densify(self, signatures):
+        empty = signatures == EMPTY_BIN
+        if not empty.any():
+            return signatures
+        columns = np.arange(2 * self.num_perm)
+        filled = np.where(np.concatenate((~empty, ~empty), axis=1), columns, 2 * self.num_perm)
+        source = np.minimum.accumulate(filled[:, ::-1], axis=1)[:, ::-1][:, :self.num_perm]
+        distance = (source - columns[:self.num_perm]).astype(np.uint64)
+        rows = np.arange(len(signatures))[:, None]
+        return signatures[rows, source % self.num_perm] + (distance << np.uint64(32))
+
+
+# Function to merge two sorted runs of distinct keys (with their clusters) in linear time
+def _merge_runs(keys, clusters, other_keys, other_clusters):
+    # Where the other run's keys go: their position among the keys, plus those before them
+    positions = np.searchsorted(keys, other_keys) + np.arange(len(other_keys))
+    taken = np.zeros(len(keys) + len(other_keys), dtype=bool)
+    taken[positions] = True
+    merged_keys = np.empty(len(taken), dtype=keys.dtype)
+    merged_clusters = np.empty(len(taken), dtype=clusters.dtype)
+    merged_keys[positions] = other_keys
+    merged_clusters[positions] = other_clusters
+    merged_keys[~taken] = keys
+    merged_clusters[~taken] = clusters
+    return merged_keys, merged_clusters
+
+
+class _BandIndex:
+    """Sorted runs of band keys, each mapped to the output index of its cluster's kept text.
+
+    Runs are merged by size tier: a new run is merged with the run before it
+    while that one is less than MERGE_FACTOR times larger, so run sizes
+    shrink geometrically, there are O(log n) runs and every key is merged
+    O(log n) times.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self._runs = []
+
+    # Function to look keys up, returns (found mask, cluster of the keys found)
+    def lookup(self, keys):
+        found = np.zeros(len(keys), dtype=bool)
+        clusters = np.zeros(len(keys), dtype=np.uint32)
+        for run_keys, run_clusters in self._runs:
+            positions = np.minimum(np.searchsorted(run_keys, keys), len(run_keys) - 1)
+            hit = (run_keys[positions] == keys) & ~found
+            clusters[hit] = run_clusters[positions[hit]]
+            found |= hit
+        return found, clusters
+
+    # Function to add new keys, sorted and not in the index yet
+    def add(self, keys, clusters):
+        if not len(keys):
+            return
+        clusters = clusters.astype(np.uint32)
+        self.size += len(keys)
+        while self._runs and len(self._runs[-1][0]) < MERGE_FACTOR * len(keys):
+            keys, clusters = _merge_runs(*self._runs.pop(), keys, clusters)
+        self._runs.append((keys, clusters))
+
+    @property
+    def memory_bytes(self):
+        return self.size * 12
+
+
+class NearDuplicateFilter:
+    """Drops texts similar to an earlier one, keeping the first of each cluster.
+
+    threshold:  Jaccard similarity (of 5-byte shingles) from which texts are near-duplicates
+    num_perm:   signature size; larger separates the threshold more sharply
+    post_of:    function(record) -> post dict with 'selftext' and 'id', by default the record itself
+    batch_size: records hashed at a time
+
+    filter(records) yields the records kept; the clusters dropped are
+    reported by write_report() and summary().
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, post_of=None, batch_size=BATCH_SIZE, seed=1):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+        self.threshold = threshold
+        self.post_of = post_of or (lambda record: record)
+        self.batch_size = batch_size
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        self.hasher = MinHasher(self.bands * self.rows, seed)
+        rng = np.random.default_rng(seed)
+        self._row_weights = rng.integers(0, 2 ** 63, self.rows, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._band_salts = rng.integers(0, 2 ** 63, self.bands, dtype=np.uint64)
+        self._index = _BandIndex()
+        # Low byte of every signature value of the texts kept, row = output index
+        self._sketches = np.empty((1024, self.hasher.num_perm), dtype=np.uint8)
+        self.kept = 0
+        self.dropped = 0
+        self.cluster_sizes = Counter()
+        self._samples = {}
+        self._dropped_ids = {}
+
+    # Function to get the band keys of a batch of signatures, a (texts, bands) uint64 array
+    def band_keys(self, signatures):
+        bands = signatures.reshape(len(signatures), self.bands, self.rows)
+        return (bands * self._row_weights).sum(axis=2) ^ self._band_salts
+
+    # Function to estimate the similarity of two texts from the low bytes of their
+    # signatures; unrelated bytes still match 1 time in 256
+    def _similar(self, sketch, other):
+        matches = np.count_nonzero(sketch == other) / len(sketch)
+        return (matches - 1 / 256) / (1 - 1 / 256) >= self.threshold
+
+    # Generator of the records that are not near-duplicates of an earlier one, in order
+    def filter(self, records):
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                yield from self._filter_batch(batch)
+                batch = []
+        if batch:
+            yield from self._filter_batch(batch)
+
+    def _filter_batch(self, batch):
+        count = len(batch)
+        posts = [self.post_of(record) for record in batch]
+        signatures = self.hasher.signatures([post['selftext'] for post in posts])
+        sketches = signatures.astype(np.uint8)
+        keys = self.band_keys(signatures)
+        flat_keys = keys.ravel()
+        found, known_clusters = self._index.lookup(flat_keys)
+        found = found.reshape(count, self.bands)
+        known_clusters = known_clusters.reshape(count, self.bands)
+
+        # Keys shared with an earlier text of the same batch
+        unique_keys, first_positions, inverse = np.unique(flat_keys, return_index=True, return_inverse=True)
+        first_text = first_positions // self.bands
+        earlier_text = first_text[inverse].reshape(count, self.bands)
+        earlier = (earlier_text < np.arange(count)[:, None]) & ~found
+
+        # Candidates are checked in batch order against the kept texts of their
+        # bands. owner is the output index of an earlier kept text, or
+        # -(position + 1) for a text kept in this batch.
+        duplicate = np.zeros(count, dtype=bool)
+        owner = np.zeros(count, dtype=np.int64)
+        for position in np.flatnonzero(found.any(axis=1) | earlier.any(axis=1)):
+            options = [int(cluster) for cluster in dict.fromkeys(known_clusters[position][found[position]])]
+            for text in dict.fromkeys(earlier_text[position][earlier[position]]):
+                options.append(int(owner[text]) if duplicate[text] else -(int(text) + 1))
+            for option in options:
+                other = self._sketches[option] if option >= 0 else sketches[-option - 1]
+                if self._similar(sketches[position], other):
+                    duplicate[position] = True
+                    owner[position] = option
+                    break
+
+        kept = ~duplicate
+        clusters = np.zeros(count, dtype=np.int64)
+        clusters[kept] = self.kept + np.cumsum(kept)[kept] - 1
+        clusters[duplicate] = owner[duplicate]
+        in_batch = duplicate & (owner < 0)
+        clusters[in_batch] = clusters[-owner[in_batch] - 1]
+        self._store_sketches(sketches[kept])
+
+        new_keys = ~found.ravel()[first_positions]
+        self._index.add(unique_keys[new_keys], clusters[first_text[new_keys]])
+
+        for position, record in enumerate(batch):
+            if kept[position]:
+                yield record
+                continue
+            self.dropped += 1
+            cluster = int(clusters[position])
+            self.cluster_sizes[cluster] += 1
+            if cluster not in self._samples:
+                self._samples[cluster] = posts[position]['selftext'][:SAMPLE_LENGTH]
+                self._dropped_ids[cluster] = []
+            if len(self._dropped_ids[cluster]) < 10:
+                self._dropped_ids[cluster].append(posts[position].get('id'))
+
+    def _store_sketches(self, sketches):
+        needed = self.kept + len(sketches)
+        if needed > len(self._sketches):
+            grown = np.empty((max(needed, 2 * len(self._sketches)), self.hasher.num_perm), dtype=np.uint8)
+            grown[:self.kept] = self._sketches[:self.kept]
+            self._sketches = grown
+        self._sketches[self.kept:needed] = sketches
+        self.kept = needed
+
+    # Function to write the dropped clusters, largest first, one JSON object per line.
+    # kept_record is the position of the kept text among the records yielded.
+    def write_report(self, file_path):
+        with open(file_path, 'w', encoding='utf-8') as file:
+            for cluster, dropped in self.cluster_sizes.most_common():
+                file.write(json.dumps({
+                    'kept_record': cluster,
+                    'dropped': dropped,
+                    'dropped_ids': self._dropped_ids[cluster],
+                    'sample': self._samples[cluster],
+                }) + '\n')
+
+    @property
+    def memory_bytes(self):
+        return self._index.memory_bytes + self.kept * self.hasher.num_perm
+
+    def summary(self):
+        return (f"Near-duplicates (similarity >= {self.threshold}, {self.bands} bands of {self.rows} rows): "
+                f"{self.dropped} dropped in {len(self.cluster_sizes)} clusters, "
+                f"{self.memory_bytes / 1024 / 1024:.1f} MB in memory")
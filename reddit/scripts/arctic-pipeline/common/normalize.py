@@ -0,0 +1,93 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# Text normalization shared by initial_cleaning.py and the CYMO formatters.
+# Produces exactly the same output as the original 12-step regex chain:
+#
+#   lowercase, drop hyperlinks, HTML tags and user mentions, turn HTML
+#   entities into spaces, unwrap hashtags, replace every character outside
+#   [a-z0-9 whitespace . ' ! ? , ; -] with a space, add a space after
+#   . , ! ? when missing, collapse whitespace, deduplicate repeated
+#   punctuation, strip, and end the text with a full stop.
+#
+# Patterns are compiled once, passes whose trigger character is absent are
+# skipped, and the character filter is a translate table instead of a regex.
+
+_HYPERLINK = re.compile(r'https?://\S+')
+_HTML_TAG = re.compile(r'<.*?>')
+_USER_MENTION = re.compile(r'@\w+')
+_HTML_ENTITY = re.compile(r'&\w+;')
+_HASHTAG = re.compile(r'#(\w+)')
+_MISSING_SPACE = re.compile(r'(?<=[.,!?])(?=[^\s])')
+_WHITESPACE = re.compile(r'\s+')
+# After _MISSING_SPACE every . , ! ? is followed by whitespace, so of the
+# original (\.|\!|\?|\,|\;)\1+ and \.{3,} passes only runs of ; can remain
+_REPEATED_SEMICOLON = re.compile(r';{2,}')
+_SEMICOLON_SPACE = re.compile(r'(?<=\w);(?=\S)')
+
+_ALLOWED_PUNCTUATION = set(".'!?,;-")
+
+
+class _AllowedCharacters(dict):
+    """Translate table for the allowed-character filter, filled in lazily.
+
+    Keeps ASCII letters, digits, the allowed punctuation and anything the
+    regex engine treats as whitespace (\\s); maps everything else to a space.
+    """
+
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        if (char.isascii() and char.isalnum()) or char in _ALLOWED_PUNCTUATION or char.isspace():
+            value = codepoint
+        else:
+            value = ord(' ')
+        self[codepoint] = value
+        return value
+
+
+_ALLOWED_TABLE = _AllowedCharacters()
+
+
+# Function to normalize a single post or comment
+def normalize_text(text):
+    # Lowercasing Text
+    text = text.lower()
+
+    # Removing Hyperlinks, HTML Tags, User Mentions and HTML Entities,
+    # Processing Hashtags (each pass only runs if it can match)
+    if 'http' in text:
+        text = _HYPERLINK.sub('', text)
+    if '<' in text:
+        text = _HTML_TAG.sub('', text)
+    if '@' in text:
+        text = _USER_MENTION.sub('', text)
+    if '&' in text:
+        text = _HTML_ENTITY.sub(' ', text)
+    if '#' in text:
+        text = _HASHTAG.sub(r'\1', text)
+
+    # Preserving Certain Characters and Whitespace
+    text = text.translate(_ALLOWED_TABLE)
+
+    # Normalizing Spaces and Punctuation
+    text = _MISSING_SPACE.sub(' ', text)
+    text = _WHITESPACE.sub(' ', text)
+    if ';;' in text:
+        text = _REPEATED_SEMICOLON.sub(';', text)
+    text = text.strip()
+    if ';' in text:
+        text = _SEMICOLON_SPACE.sub('; ', text)
+
+    # Ensure post ends with a full stop if it doesn't end with a sentence-ending symbol
+    if not text.endswith(('.', '!', '?')):
+        text += '.'
+
+    return text
+
+
+# Function to normalize a list of texts, optionally across a process pool
+def normalize_texts(texts, workers=1, chunksize=1000):
+    if workers == 1:
+        return [normalize_text(text) for text in texts]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(normalize_text, texts, chunksize=chunksize))
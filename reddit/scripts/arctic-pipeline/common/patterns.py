@@ -0,0 +1,142 @@
+import re
+
+# Compiled multi-pattern matcher shared by the exclusion and diagnosis stages.
+# All literal patterns are folded into a single trie shaped regex, so each text
+# is scanned once by the regex engine instead of once per pattern.
+
+
+# Function to build a trie out of a list of literal patterns
+def _build_trie(patterns):
+    trie = {}
+    for pattern in patterns:
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[''] = True
+    return trie
+
+
+# Function to turn a trie node into an equivalent regex (longest match first)
+def _trie_to_regex(node):
+    optional = '' in node
+    branches = []
+    single_chars = []
+
+    for char in sorted(key for key in node if key):
+        child = _trie_to_regex(node[char])
+        if child is None:
+            single_chars.append(re.escape(char))
+        else:
+            branches.append(re.escape(char) + child)
+
+    if not branches and not single_chars:
+        return None
+
+    if single_chars:
+        if len(single_chars) == 1:
+            branches.append(single_chars[0])
+        else:
+            branches.append('[' + ''.join(single_chars) + ']')
+
+    if len(branches) == 1 and not optional:
+        return branches[0]
+
+    regex = '(?:' + '|'.join(branches) + ')'
+    if optional:
+        regex += '?'
+    return regex
+
+
+class PatternMatcher:
+    """Matches a whole lexicon of literal patterns against a text in one pass.
+
+    patterns:      list of literal strings (blank entries are ignored)
+    ignore_case:   match case-insensitively, like re.IGNORECASE
+    word_boundary: only accept matches surrounded by word boundaries (\\b...\\b)
+    """
+
+    def __init__(self, patterns, ignore_case=False, word_boundary=False):
+        self.ignore_case = ignore_case
+        self.word_boundary = word_boundary
+        self.flags = re.IGNORECASE if ignore_case else 0
+
+        # Keep the first spelling of every pattern, in file order
+        self.patterns = []
+        self._lookup = {}
+        for pattern in patterns:
+            if not pattern:
+                continue
+            key = pattern.lower() if ignore_case else pattern
+            if key not in self._lookup:
+                self._lookup[key] = pattern
+                self.patterns.append(pattern)
+
+        trie_regex = _trie_to_regex(_build_trie(self._lookup)) if self._lookup else None
+        if trie_regex is None:
+            # Empty lexicon never matches anything
+            trie_regex = r'(?!)'
+        if word_boundary:
+            trie_regex = r'\b' + trie_regex + r'\b'
+
+        self._regex = re.compile(trie_regex, self.flags)
+        # Zero-width lookahead so overlapping matches are reported as well
+        self._starts = re.compile('(?=' + trie_regex + ')', self.flags)
+
+        # Individual patterns, indexed by first character, used to resolve
+        # every pattern that matches at a position found by the combined scan
+        self._singles = {}
+        for key, pattern in self._lookup.items():
+            single = re.escape(pattern)
+            if word_boundary:
+                single = r'\b' + single + r'\b'
+            self._singles.setdefault(key[0], []).append((pattern, re.compile(single, self.flags)))
+
+    def __len__(self):
+        return len(self.patterns)
+
+    # Returns True if any pattern occurs in the text
+    def contains(self, text):
+        return self._regex.search(text) is not None
+
+    # Returns the leftmost (then longest) matching pattern, or None
+    def search(self, text):
+        match = self._regex.search(text)
+        if match is None:
+            return None
+        found = match.group(0)
+        return self._lookup.get(found.lower() if self.ignore_case else found, found)
+
+    # Returns (start, end, pattern) for every occurrence of every pattern,
+    # including overlapping ones, sorted by start position
+    def find_all(self, text):
+        matches = []
+        for hit in self._starts.finditer(text):
+            pos = hit.start()
+            first = text[pos].lower() if self.ignore_case else text[pos]
+            candidates = self._singles.get(first)
+            if candidates is None:
+                # Exotic case folding, fall back to checking every pattern
+                candidates = [single for group in self._singles.values() for single in group]
+            for pattern, single in candidates:
+                match = single.match(text, pos)
+                if match:
+                    matches.append((pos, match.end(), pattern))
+        return matches
+
+    # Returns the first occurrence of every pattern found in the text, keyed
+    # by pattern, matching what re.search would return for each of them
+    def first_occurrences(self, text):
+        first = {}
+        for start, end, pattern in self.find_all(text):
+            if pattern not in first:
+                first[pattern] = (start, end)
+        return first
+
+
+# Function to load a lexicon file straight into a matcher
+def load_matcher(file_path, lower=True, ignore_case=False, word_boundary=False):
+    with open(file_path, 'r') as file:
+        patterns = [line.strip() for line in file.readlines()]
+    if lower:
+        patterns = [pattern.lower() for pattern in patterns]
+    return PatternMatcher(patterns, ignore_case=ignore_case, word_boundary=word_boundary)
@@ -0,0 +1,122 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Process-wide adaptive rate limiter for Arctic Shift traffic.
+# A token bucket paces requests from every thread and coroutine. Its rate
+# follows AIMD: it creeps up additively while requests succeed and is cut
+# multiplicatively on a 429, so throughput settles just under the server's
+# limit. Retry-After pauses all callers, and jitter keeps them from
+# waking up in lockstep.
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate adapts with additive increase / multiplicative decrease.
+
+    rate:     starting requests per second
+    min_rate: floor for the rate after repeated 429s
+    max_rate: ceiling for the rate while requests succeed
+    increase: requests per second added for every second of successful traffic
+    decrease: factor applied to the rate on a 429
+    burst:    bucket size, how many requests may go out back to back
+    jitter:   random extra delay, as a fraction of one request interval
+    """
+
+    def __init__(self, rate=4.0, min_rate=0.25, max_rate=40.0, increase=0.5, decrease=0.5, burst=4, jitter=0.2):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.jitter = jitter
+
+        self.requests = 0
+        self.throttled = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    # Function to take a token, returns how long the caller must wait first
+    def _reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            self.requests += 1
+
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            wait = max(wait, self._blocked_until - now)
+            return wait + random.uniform(0, self.jitter / self.rate)
+
+    def acquire(self):
+        time.sleep(self._reserve())
+
+    async def acquire_async(self):
+        await asyncio.sleep(self._reserve())
+
+    # Additive increase after a successful request
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    # Multiplicative decrease after a 429, at most once per request interval
+    # so a burst of rejections counts as one signal
+    def on_throttle(self, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if now - self._last_decrease >= 1.0 / self.rate:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def configure(self, **options):
+        with self._lock:
+            for key, value in options.items():
+                if not hasattr(self, key):
+                    raise ValueError(f"Unknown rate limiter option '{key}'")
+                setattr(self, key, value)
+            self.rate = min(max(self.rate, self.min_rate), self.max_rate)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'throttle_rate': self.throttled / self.requests if self.requests else 0.0,
+            'rate': self.rate,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (f"Rate limiter: {stats['throttled']} throttled of {stats['requests']} requests "
+                f"({stats['throttle_rate'] * 100:.1f}%), settled at {stats['rate']:.2f} req/s")
+
+
+# Function to parse a Retry-After header (seconds or HTTP date) into seconds
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_shared_limiter = AdaptiveRateLimiter()
+
+
+# Function to get the limiter shared by every Arctic Shift call in the process
+def get_rate_limiter():
+    return _shared_limiter
@@ -0,0 +1,78 @@
+import json
+
+# Reading and writing of the pipeline's intermediate files.
+# Every stage writes one JSON record (a post, a user or a username) per line,
+# so files can be streamed without loading them whole. The older
+# pretty-printed JSON arrays are still read transparently and can still be
+# written with legacy_json=True.
+
+
+# Function to find the first non-whitespace character of a text file
+def _first_char(file):
+    while True:
+        chunk = file.read(4096)
+        if not chunk:
+            return ''
+        stripped = chunk.lstrip()
+        if stripped:
+            return stripped[0]
+
+
+# Function to stream records from a JSONL file or a legacy JSON array file
+def read_records(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        is_legacy = _first_char(file) == '['
+        file.seek(0)
+
+        if is_legacy:
+            yield from json.load(file)
+            return
+
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+class RecordWriter:
+    """Writes records one per line, or as an indented JSON array when legacy_json is set.
+
+    Use as a context manager:
+        with RecordWriter('out.jsonl') as writer:
+            writer.write({'username': 'someone'})
+    """
+
+    def __init__(self, file_path, legacy_json=False):
+        self.file_path = file_path
+        self.legacy_json = legacy_json
+        self.count = 0
+        self._file = None
+        self._buffer = []
+
+    def __enter__(self):
+        self._file = open(self.file_path, 'w', encoding='utf-8')
+        return self
+
+    def write(self, record):
+        if self.legacy_json:
+            self._buffer.append(record)
+        else:
+            self._file.write(json.dumps(record) + '\n')
+        self.count += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if self.legacy_json and exc_type is None:
+                json.dump(self._buffer, self._file, indent=4)
+        finally:
+            self._file.close()
+            self._buffer = []
+        return False
+
+
+# Function to write an iterable of records, returns how many were written
+def write_records(records, file_path, legacy_json=False):
+    with RecordWriter(file_path, legacy_json) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
@@ -0,0 +1,145 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Persistent on-disk cache of Arctic Shift API responses.
+# Responses are keyed by request URL (API root and endpoint) and query
+# parameters, so responses of different servers (e.g. a local stub server)
+# never answer for each other, and stored as zlib-compressed JSON in a
+# single SQLite file, so author histories fetched by one run (or one
+# condition) are reused by the next. Entries older than `ttl` seconds are
+# ignored, and the least recently used entries are evicted once the stored
+# payloads exceed `max_bytes`. Hits only read: the access time of an entry
+# is rewritten when it is more than ACCESS_RESOLUTION seconds old, and those
+# updates are committed with the next write (or every TOUCH_BATCH of them).
+
+ACCESS_RESOLUTION = 3600
+TOUCH_BATCH = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL, size-based eviction and hit counters."""
+
+    def __init__(self, path, ttl=None, max_bytes=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._touched = {}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(_SCHEMA)
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self._connection.commit()
+        self._total_bytes = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def make_key(url, params):
+        return url + '?' + json.dumps(params, sort_keys=True, separators=(',', ':'))
+
+    # Function to return a cached payload, or None on a miss or expired entry
+    def get(self, url, params):
+        key = self.make_key(url, params)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT payload, created, accessed FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            if now - row[2] > ACCESS_RESOLUTION:
+                self._touched[key] = now
+                if len(self._touched) >= TOUCH_BATCH:
+                    self._write_touched()
+                    self._connection.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    # Function to store a payload, evicting old entries past the size budget
+    def put(self, url, params, payload):
+        key = self.make_key(url, params)
+        blob = zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            previous = self._connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses (key, payload, size, created, accessed) VALUES (?, ?, ?, ?, ?)',
+                (key, blob, len(blob), now, now))
+            self._total_bytes += len(blob) - (previous[0] if previous else 0)
+            self._write_touched()
+            self._evict()
+            self._connection.commit()
+
+    # Function to write the access times noted by get (committed by the caller)
+    def _write_touched(self):
+        if self._touched:
+            self._connection.executemany('UPDATE responses SET accessed = ? WHERE key = ?',
+                                         [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        while self._total_bytes > self.max_bytes:
+            rows = self._connection.execute(
+                'SELECT key, size FROM responses ORDER BY accessed LIMIT 100').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+
+    # Function to drop entries older than the TTL
+    def purge_expired(self):
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            cutoff = time.time() - self.ttl
+            removed = self._connection.execute('DELETE FROM responses WHERE created < ?', (cutoff,)).rowcount
+            self._connection.commit()
+            self._total_bytes = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        return removed
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'stored_bytes': self._total_bytes,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (f"Cache hits: {stats['hits']}, misses: {stats['misses']} "
+                f"({stats['hit_rate'] * 100:.1f}% hit rate), "
+                f"stored: {stats['stored_bytes'] / (1024 * 1024):.1f} MB")
+
+    def close(self):
+        with self._lock:
+            self._write_touched()
+            self._connection.commit()
+            self._connection.close()
@@ -0,0 +1,113 @@
+import json
+import os
+from dataclasses import dataclass, fields, replace
+
+# Load-once access to config/global.json.
+# Paths are resolved from this file rather than the current directory, values
+# are validated and typed, and any key can be overridden from the environment
+# (UROP_<KEY>, e.g. UROP_CONTROL_BATCH_SIZE=20) or the command line
+# (--setting control_batch_size=20). UROP_CONFIG points at another config file.
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', '..'))
+CONFIG_FILE = os.path.join(PROJECT_ROOT, 'config', 'global.json')
+RESOURCES_DIR = os.path.join(PROJECT_ROOT, 'reddit', 'resources')
+
+ENV_PREFIX = 'UROP_'
+
+
+@dataclass(frozen=True)
+class Settings:
+    minimum_posts_per_diagnosed_user: int = 50
+    non_mh_posts_per_diagnosed_user: int = 30
+    min_diagnosed_post_word_count: int = 15
+    min_control_post_word_count: int = 20
+    control_batch_size: int = 10
+    controls_per_diagnosed: int = 9
+
+    def as_dict(self):
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+
+_cache = {}
+
+
+# Function to get the path of a file under reddit/resources
+def resource_path(*parts):
+    return os.path.join(RESOURCES_DIR, *parts)
+
+
+# Function to convert and validate raw values against the Settings fields
+def _validated(values, source):
+    known = {field.name: field for field in fields(Settings)}
+    typed = {}
+    for key, value in values.items():
+        if key not in known:
+            raise ValueError(f"Unknown setting '{key}' in {source}")
+        try:
+            # JSON booleans and fractional numbers are not integers, though int() takes them
+            if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+                raise ValueError
+            value = int(value)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"Setting '{key}' in {source} must be an integer, got {value!r}")
+        if value < 0:
+            raise ValueError(f"Setting '{key}' in {source} must not be negative, got {value}")
+        typed[key] = value
+    if typed.get('control_batch_size') == 0:
+        raise ValueError(f"Setting 'control_batch_size' in {source} must be at least 1")
+    return typed
+
+
+# Function to read the overrides given as UROP_<KEY> environment variables
+def _environment_overrides():
+    overrides = {}
+    for field in fields(Settings):
+        value = os.environ.get(ENV_PREFIX + field.name.upper())
+        if value is not None:
+            overrides[field.name] = value
+    return overrides
+
+
+# Function to load the settings once per config file, with overrides applied
+def load_settings(settings_file=None, overrides=None):
+    settings_file = settings_file or os.environ.get(ENV_PREFIX + 'CONFIG') or CONFIG_FILE
+
+    if settings_file not in _cache:
+        with open(settings_file, 'r', encoding='utf-8') as file:
+            _cache[settings_file] = Settings(**_validated(json.load(file), settings_file))
+    settings = _cache[settings_file]
+
+    environment = _environment_overrides()
+    if environment:
+        settings = replace(settings, **_validated(environment, 'environment'))
+    if overrides:
+        settings = replace(settings, **_validated(overrides, 'command line'))
+    return settings
+
+
+# Function to add --config and --setting options to a script's parser
+def add_settings_arguments(parser):
+    parser.add_argument('--config', type=str, default=None,
+                        help='Path to the settings file (default: config/global.json)')
+    parser.add_argument('--setting', type=str, action='append', default=[], metavar='KEY=VALUE',
+                        help='Override a single setting, can be repeated')
+
+
+# Function to load the settings selected by add_settings_arguments options
+def settings_from_args(args):
+    overrides = {}
+    for item in args.setting:
+        key, separator, value = item.partition('=')
+        if not separator:
+            raise ValueError(f"Setting override '{item}' must look like KEY=VALUE")
+        overrides[key.strip()] = value.strip()
+    return load_settings(args.config, overrides)
+
+
+# Function to print the settings a stage runs with
+def print_settings(settings):
+    print("")
+    print("Settings: ")
+    for key, value in settings.as_dict().items():
+        print(f"    {key}: {value}")
+    print("")
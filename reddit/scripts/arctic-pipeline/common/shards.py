@@ -0,0 +1,39 @@
+import os
+
+# Splitting of large JSONL files into byte ranges that start and end on line
+# boundaries, so each range can be parsed independently by a worker process.
+
+
+# Function to compute (start, end) byte ranges of roughly shard_size bytes
+def line_aligned_shards(file_path, shard_size):
+    file_size = os.path.getsize(file_path)
+    shards = []
+    start = 0
+
+    with open(file_path, 'rb') as file:
+        while start < file_size:
+            end = start + shard_size
+            if end >= file_size:
+                end = file_size
+            else:
+                # Move the boundary to just after the next newline
+                file.seek(end)
+                file.readline()
+                end = file.tell()
+            shards.append((start, end))
+            start = end
+
+    return shards
+
+
+# Function to iterate over the lines of one byte range, as bytes
+def iter_shard_lines(file_path, start, end):
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        position = start
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line
@@ -0,0 +1,177 @@
+import contextvars
+import json
+import os
+import resource
+import sys
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# Process-wide performance counters, attributed to pipeline stages.
+# The runner marks which stage is running (see pipeline/runner.py); API
+# requests, 429s, response cache lookups and request latencies are counted
+# under that stage as they happen. Work done in the background for a stage
+# (fetch workers, requests on the API client's event loop) is counted under
+# the stage it was started for, which is set with attributed(): streamed
+# stages interleave, so the running stage may be another one by then.
+# Outside a run everything is counted under None. Peak memory is read from
+# VmHWM on Linux, which reset_peak_rss can restart from the current size.
+# write_run_metrics appends a run to a metrics.json.
+
+# Upper bounds of the request latency buckets, in milliseconds
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+MAX_RUNS_KEPT = 100
+
+# Stage set by Telemetry.attributed in the current thread or asyncio task
+_attributed_stage = contextvars.ContextVar('attributed_stage')
+
+
+class LatencyHistogram:
+    """Counts of latencies per bucket of LATENCY_BUCKETS_MS (the last bucket is unbounded)."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+
+    def observe(self, seconds):
+        milliseconds = seconds * 1000
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, milliseconds)] += 1
+        self.total_ms += milliseconds
+
+    # Function to estimate a percentile as the upper bound of the bucket it falls in
+    def percentile(self, fraction):
+        count = sum(self.counts)
+        if not count:
+            return None
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= fraction * count:
+                return LATENCY_BUCKETS_MS[bucket] if bucket < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def to_dict(self):
+        count = sum(self.counts)
+        labels = [f'<={bound}ms' for bound in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}ms']
+        return {
+            'count': count,
+            'mean_ms': self.total_ms / count if count else None,
+            'p50_ms': self.percentile(0.5),
+            'p90_ms': self.percentile(0.9),
+            'p99_ms': self.percentile(0.99),
+            'buckets': {label: bucket_count for label, bucket_count in zip(labels, self.counts) if bucket_count},
+        }
+
+
+class Telemetry:
+    """Counters and latency histograms per stage, safe to update from any thread."""
+
+    def __init__(self):
+        self.stage = None
+        self._counters = defaultdict(Counter)
+        self._latencies = defaultdict(LatencyHistogram)
+        self._lock = threading.Lock()
+
+    # Function to get the stage counted under: the one attributed in this
+    # thread or task, else the one running
+    def current_stage(self):
+        return _attributed_stage.get(self.stage)
+
+    # Context manager counting what this thread does, and the asyncio tasks
+    # it starts meanwhile, under `stage`
+    @contextmanager
+    def attributed(self, stage):
+        token = _attributed_stage.set(stage)
+        try:
+            yield
+        finally:
+            _attributed_stage.reset(token)
+
+    def count(self, name, amount=1):
+        stage = self.current_stage()
+        with self._lock:
+            self._counters[stage][name] += amount
+
+    def observe_latency(self, seconds):
+        stage = self.current_stage()
+        with self._lock:
+            self._latencies[stage].observe(seconds)
+
+    # Function to get the API and cache metrics of a stage
+    def stage_metrics(self, stage):
+        with self._lock:
+            counters = Counter(self._counters.get(stage, {}))
+            latency = self._latencies[stage].to_dict() if stage in self._latencies else None
+        requests = counters['api_requests']
+        lookups = counters['cache_hits'] + counters['cache_misses']
+        return {
+            'api_requests': requests,
+            'api_429': counters['api_429'],
+            'api_429_rate': counters['api_429'] / requests if requests else None,
+            'api_errors': counters['api_errors'],
+            'api_latency': latency,
+            'cache_hits': counters['cache_hits'],
+            'cache_misses': counters['cache_misses'],
+            'cache_hit_rate': counters['cache_hits'] / lookups if lookups else None,
+        }
+
+
+_shared_telemetry = Telemetry()
+
+
+# Function to get the telemetry shared by everything in the process
+def get_telemetry():
+    return _shared_telemetry
+
+
+# Function to get the peak resident set size of this process in MB, since
+# the last reset_peak_rss (since it started where that is not supported)
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status', 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return _max_rss_mb(resource.RUSAGE_SELF)
+
+
+# Function to restart the peak resident set size from the current one,
+# returns False where that is not supported (only Linux supports it)
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='utf-8') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+# Function to get the peak resident set size of the largest finished child
+# process (e.g. of a worker pool), in MB
+def peak_child_rss_mb():
+    return _max_rss_mb(resource.RUSAGE_CHILDREN)
+
+
+def _max_rss_mb(who):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(who).ru_maxrss * unit / 1024 / 1024
+
+
+# Function to add a run to a metrics file (a JSON object with a list of runs,
+# oldest first), keeping the last MAX_RUNS_KEPT runs
+def write_run_metrics(file_path, run):
+    runs = []
+    if os.path.exists(file_path):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                runs = json.load(file).get('runs', [])
+        except ValueError:
+            print(f"Warning: could not read {file_path}, starting a new one")
+    runs = (runs + [run])[-MAX_RUNS_KEPT:]
+    with open(file_path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump({'runs': runs}, file, indent=4)
+    os.replace(file_path + '.tmp', file_path)
@@ -2,54 +2,33 @@
 
 # Takes conditiou_output/ folder of the generate_diagnosed.sh script
 # and runs control generation and matching to each diagnosed user
+# The stages run in one process through the pipeline runner (python3 -m pipeline --help);
+# extra arguments are passed on to it, e.g. --assignment optimal
 
 if [ "$#" -lt 1 ]; then
-    echo "Usage: $0 <INPUT_FOLDER> <threshold>"
+    echo "Usage: $0 <INPUT_FOLDER> [--resume] [<pipeline options>]"
     exit 1
 fi
 
 # Input file path provided by the user
 INPUT_FOLDER=$1
-# Output file path provided by the user
-CONDITION_FOLDER="${INPUT_FOLDER}/control"
+shift
 LOG="${INPUT_FOLDER}/control.log.txt"
 
+PIPELINE_DIR="$(cd "$(dirname "$0")/.." && pwd)"
 
-# Hardcoded paths to the Python scripts
-FIND_CANDIDATES="get_control_candidates.py"
-MATCH_CONTROLS="match_controls.py"
-CONTROL_FORMATTER="../preprocessing/format_clean_control.py"  # Replace with the actual name of your third script
-
-# Intermediate file
-TEMP_OUTPUT="${INPUT_FOLDER}/control/candidate-controls.temp.json"
-
-{
-# first find candidate controls from non mh subreddits
-echo ""
-echo "Finding control candidates..."
-python3 "$FIND_CANDIDATES" "${INPUT_FOLDER}/diagnosed/non_mh_subreddits_summary.json" "$TEMP_OUTPUT" 
-echo ""
-
-# Check if the first script executed successfully
-if [ $? -eq 0 ]; then
-    # Execute the second Python script
-    echo "Matching found controls..."
-    python3 "$MATCH_CONTROLS" "$TEMP_OUTPUT" "$CONDITION_FOLDER"
-    echo ""
+# --resume continues an interrupted run: candidates already found are reused
+# and match_controls.py picks up from its progress journal
+FIRST_STAGE="candidates"
+if [ "$1" == "--resume" ] && [ -f "${INPUT_FOLDER}/control/candidate-controls.jsonl" ]; then
+    FIRST_STAGE="match"
+fi
 
-    # Check if the second script executed successfully
-    if [ $? -eq 0 ]; then
-        # Execute the third Python script
-        echo "Generating csv..."
-        python3 "$CONTROL_FORMATTER" "${CONDITION_FOLDER}" "${CONDITION_FOLDER}/control-data.cymo.csv" # Modify the arguments as needed
-        echo "Done gemerating csv and cleaning the file."
-        echo ""
-    else
-        echo "Error: The second Python script did not execute successfully."
-        exit 1
-    fi
-else
-    echo "Error: The first Python script did not execute successfully."
-    exit 1
+echo "Generating control data, log at $LOG"
+PYTHONPATH="$PIPELINE_DIR" python3 -m pipeline --output_folder "$INPUT_FOLDER" --from "$FIRST_STAGE" "$@" &> "$LOG"
+STATUS=$?
+if [ $STATUS -ne 0 ]; then
+    echo "Error: the control pipeline failed (exit code $STATUS), see $LOG"
+    exit $STATUS
 fi
-} &> "$LOG"
\ No newline at end of file
+echo "Done generating control data."
@@ -1,57 +1,30 @@
 import json
-import requests
 import argparse
-import urllib3
 import os
+import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 
-def globalSettings(settings_file='../../../../config/global.json'):
-    with open(settings_file, 'r', encoding='utf-8') as file:
-        settings = json.load(file)
-    return settings
-
-formatted_json = json.dumps(globalSettings(), indent=4)
-formatted_json = formatted_json.replace('{', '').replace('}', '').replace('"', '').strip()
-print("")
-print("Settings: ")
-print(formatted_json)
-print("")
-
-# Suppress only the single InsecureRequestWarning from urllib3 needed to remove warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.arctic_client import add_client_arguments, client_from_args
+from common.records import read_records
+from common.settings import add_settings_arguments, print_settings, settings_from_args
 
 def load_json(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
-
-def fetch_posts(subreddit, limit):
-    url = f'https://arctic-shift.photon-reddit.com/api/posts/search?subreddit={subreddit}&limit={limit}'
-    retries = 5
-    delay = 1
-
-    for attempt in range(retries):
-        try:
-            response = requests.get(url, verify=False)
-            if response.status_code == 429:  # Too Many Requests
-                print(f"Rate limit exceeded for subreddit {subreddit}. Retrying in {delay} seconds...")
-                time.sleep(delay)
-                delay *= 2  # Exponential backoff
-                continue
-
-            response.raise_for_status()
-            return response.json().get('data', [])
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch posts for subreddit {subreddit}. Error: {e}")
-            time.sleep(delay)
-            delay *= 2  # Exponential backoff
-
-    print(f"Failed to fetch posts for subreddit {subreddit} after {retries} attempts.")
-    return []
-
-def fetch_posts_for_subreddits(subreddits, limit):
+    # Accepts the JSONL summary as well as the legacy JSON array
+    return list(read_records(file_path))
+
+def fetch_posts(subreddit, limit, client):
+    # Retries, backoff and rate limiting are handled by the shared client
+    try:
+        return client.fetch_subreddit_posts(subreddit, limit)
+    except Exception as e:
+        print(f"Failed to fetch posts for subreddit {subreddit}. Error: {e}")
+        return []
+
+def fetch_posts_for_subreddits(subreddits, limit, client):
     with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {executor.submit(fetch_posts, subreddit, limit): subreddit for subreddit in subreddits}
+        futures = {executor.submit(fetch_posts, subreddit, limit, client): subreddit for subreddit in subreddits}
         results = {}
         for future in as_completed(futures):
             subreddit = futures[future]
@@ -62,26 +35,40 @@ def fetch_posts_for_subreddits(subreddits, limit):
                 results[subreddit] = []
         return results
 
-def expand_users_with_candidates(diagnosed_users):
+# Function to collect the distinct non mental health subreddits of all users, in first-seen order
+def collect_subreddits(diagnosed_users):
+    return list(dict.fromkeys(subreddit for user in diagnosed_users for subreddit in user['non_mental_health_subreddits']))
+
+# Function to fetch every subreddit once and map it to its authors (in listing order)
+def build_subreddit_author_index(subreddits, limit, client):
+    subreddit_posts = fetch_posts_for_subreddits(subreddits, limit, client)
+    return {
+        subreddit: tuple(dict.fromkeys(post['author'] for post in subreddit_posts[subreddit] if 'author' in post))
+        for subreddit in subreddits
+    }
+
+def expand_users_with_candidates(diagnosed_users, client):
     expanded_users = []
     total_candidates = 0  # To keep track of the total number of candidate usernames
 
+    # Subreddits shared by many users (AskReddit, ...) are downloaded once for the whole run
+    subreddits = collect_subreddits(diagnosed_users)
+    subreddit_authors = build_subreddit_author_index(subreddits, 100, client)
+    print(f"Fetched {len(subreddits)} distinct subreddits for {len(diagnosed_users)} diagnosed users")
+
     for user in diagnosed_users:
         username = user['username']
         non_mh_subreddits = user['non_mental_health_subreddits']
-        candidate_usernames = set()
-
-        subreddit_posts = fetch_posts_for_subreddits(non_mh_subreddits, 100)
 
-        for subreddit, posts in subreddit_posts.items():
-            authors = {post['author'] for post in posts if 'author' in post}
-            candidate_usernames.update(authors)
+        # Union of the authors of the user's subreddits, in a stable order
+        candidate_usernames = list(dict.fromkeys(
+            author for subreddit in non_mh_subreddits for author in subreddit_authors[subreddit]))
 
         expanded_user_data = {
             'username': username,
             'post_count': user['post_count'],
             'non_mental_health_subreddits': non_mh_subreddits,
-            'candidate_usernames': list(candidate_usernames)
+            'candidate_usernames': candidate_usernames
         }
 
         expanded_users.append(expanded_user_data)
@@ -99,14 +86,19 @@ def main():
     parser = argparse.ArgumentParser(description='Expand diagnosed users with candidate control usernames.')
     parser.add_argument('input_file', type=str, help='Path to the input JSON file containing diagnosed users')
     parser.add_argument('output_file', type=str, help='Path to save the expanded JSON file')
+    add_client_arguments(parser)
+    add_settings_arguments(parser)
 
     args = parser.parse_args()
+    print_settings(settings_from_args(args))
 
     start_time = time.time()  # Start timing
 
     diagnosed_users = load_json(args.input_file)
 
-    expanded_users = expand_users_with_candidates(diagnosed_users)
+    with client_from_args(args) as client:
+        expanded_users = expand_users_with_candidates(diagnosed_users, client)
+        print(client.summary())
 
     output_dir = os.path.dirname(args.output_file)
     os.makedirs(output_dir, exist_ok=True)
@@ -1,65 +1,39 @@
 import json
-import requests
 import argparse
-import urllib3
 import re
+import os
+import sys
 import time
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
 from threading import Lock
 
-def globalSettings(settings_file='../../../../config/global.json'):
-    with open(settings_file, 'r', encoding='utf-8') as file:
-        settings = json.load(file)
-    return settings
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.arctic_client import add_client_arguments, client_from_args
+from common.assignment import assign_controls
+from common.candidate_scheduler import CandidateScheduler
+from common.dedup import DigestSet
+from common.journal import Journal, read_journal
+from common.patterns import PatternMatcher
+from common.records import read_records
+from common.settings import add_settings_arguments, resource_path, settings_from_args
 
-# Suppress only the single InsecureRequestWarning from urllib3 needed to remove warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# Fewest valid posts a control candidate needs
+MIN_CONTROL_POSTS = 50
 
 def load_json(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
         return json.load(file)
 
+# Function to load the expanded diagnosed users, JSONL or a legacy JSON array
+def load_diagnosed_users(file_path):
+    return list(read_records(file_path))
+
 def load_patterns(file_path):
     with open(file_path, 'r') as file:
         return [line.strip().lower() for line in file.readlines()]
 
-def fetch_user_submissions(username):
-    posts_url = f'https://arctic-shift.photon-reddit.com/api/posts/search?author={username}&limit=auto'
-    comments_url = f'https://arctic-shift.photon-reddit.com/api/comments/search?author={username}&limit=auto'
-    posts, comments = [], []
-
-    for url in [posts_url, comments_url]:
-        retries = 5
-        backoff_time = 1
-
-        while retries > 0:
-            try:
-                response = requests.get(url, verify=False)
-                response.raise_for_status()
-
-                if 'posts' in url:
-                    posts = response.json().get('data', [])
-                else:
-                    comments = response.json().get('data', [])
-                    for comment in comments:
-                        comment['selftext'] = comment.pop('body', '')
-
-                break
-            except requests.exceptions.RequestException as e:
-                if response.status_code == 429:
-                    print(f"Rate limit exceeded for user {username}. Retrying in {backoff_time} seconds...")
-                    time.sleep(backoff_time)
-                    backoff_time *= 2
-                    retries -= 1
-                else:
-                    print(f"Failed to fetch submissions for user {username}. Error: {e}")
-                    break
-        else:
-            print(f"Exceeded retry limit for user {username}. Skipping.")
-            return []
-
-    return posts + comments
-
 def is_valid_selftext(selftext):
     invalid_patterns = [
         r'^\[deleted\]$',        # Exactly "[deleted]"
@@ -88,15 +62,17 @@ def is_valid_selftext(selftext):
 
     return False
 
-def contains_mental_health_patterns(text, patterns):
-    text = text.lower()
-    return any(re.search(re.escape(pattern), text) for pattern in patterns)
+def contains_mental_health_patterns(text, matcher):
+    return matcher.contains(text.lower())
 
-def filter_and_simplify_posts(posts, mental_health_patterns, mental_health_subreddits):
+# Consumes `posts` lazily: paging stops at the first mental health post, or
+# once max_posts valid posts are kept (the candidate is too active to match)
+def filter_and_simplify_posts(posts, mental_health_patterns, mental_health_subreddits, max_posts=None):
     # Define relevant properties to keep
     relevant_properties = ['id', 'title', 'selftext', 'author', 'created_utc', 'subreddit', 'score']
     simplified_posts = []
-    seen_selftexts = set()
+    # Only one history at a time, so 64-bit digests are plenty
+    seen_selftexts = DigestSet(bits=64)
 
     for post in posts:
         selftext = post.get('selftext', '')
@@ -105,19 +81,84 @@ def filter_and_simplify_posts(posts, mental_health_patterns, mental_health_subre
         if subreddit in mental_health_subreddits or contains_mental_health_patterns(selftext, mental_health_patterns):
             return []
 
-        if is_valid_selftext(selftext) and selftext not in seen_selftexts:
+        if is_valid_selftext(selftext) and seen_selftexts.add(selftext):
             simplified_post = {prop: post[prop] for prop in relevant_properties if prop in post}
             simplified_posts.append(simplified_post)
-            seen_selftexts.add(selftext)
+            if max_posts is not None and len(simplified_posts) >= max_posts:
+                break
 
     return simplified_posts
 
-def fetch_and_filter(candidate, mental_health_patterns, mental_health_subreddits):
-    submissions = fetch_user_submissions(candidate)
-    cleaned_posts = filter_and_simplify_posts(submissions, mental_health_patterns, mental_health_subreddits)
+def fetch_and_filter(candidate, client, mental_health_patterns, mental_health_subreddits, max_posts=None):
+    # The history is streamed page by page, so only the pages needed to
+    # accept or reject the candidate are fetched
+    try:
+        with closing(client.iter_user_history(candidate)) as submissions:
+            cleaned_posts = filter_and_simplify_posts(submissions, mental_health_patterns, mental_health_subreddits, max_posts)
+    except Exception as e:
+        print(f"Failed to fetch submissions for user {candidate}. Error: {e}")
+        return candidate, None
     return candidate, cleaned_posts
 
-def process_diagnosed_user(diagnosed_user, mental_health_subreddits, mental_health_patterns, min_controls, used_controls, lock):
+# Function to reject a candidate from per-subreddit activity counts alone,
+# returns the reason or None if the full history has to be looked at.
+# Counts bound the number of valid posts from above, so rejections are exact.
+def prescreen_candidate(candidate, client, mental_health_subreddits, min_posts_needed):
+    try:
+        subreddit_counts, complete = client.fetch_author_subreddit_counts(candidate)
+    except Exception as e:
+        print(f"Failed to pre-screen user {candidate}, fetching the full history. Error: {e}")
+        return None
+
+    if any(subreddit.lower() in mental_health_subreddits for subreddit in subreddit_counts):
+        return 'mental health subreddit'
+    if complete and sum(subreddit_counts.values()) < min_posts_needed:
+        return 'too few posts'
+    return None
+
+# Function to build the evaluation shared by all diagnosed users listing a candidate.
+# Histories are streamed up to the largest post window among those users, and
+# candidates no diagnosed user could accept are reduced to an empty list.
+# With prescreen_counts, candidates are first pre-screened and only survivors
+# are fetched in full; rejections are counted by reason. With a journal,
+# rejections are recorded so a resumed run does not evaluate them again.
+def make_candidate_evaluator(diagnosed_users, client, mental_health_subreddits, mental_health_patterns, prescreen_counts=None, journal=None):
+    max_posts_for = {}
+    min_posts_for = {}
+    for diagnosed_user in diagnosed_users:
+        min_posts = max(1, diagnosed_user['post_count'] // 2)
+        for candidate in diagnosed_user['candidate_usernames']:
+            max_posts_for[candidate] = max(max_posts_for.get(candidate, 0), diagnosed_user['post_count'] * 2)
+            min_posts_for[candidate] = min(min_posts_for.get(candidate, min_posts), min_posts)
+    mental_health_subreddit_set = set(mental_health_subreddits)
+    counts_lock = Lock()
+
+    def evaluate(candidate):
+        max_posts = max_posts_for.get(candidate)
+        if prescreen_counts is not None:
+            # Accepting needs at least MIN_CONTROL_POSTS and more than the smallest min_posts
+            min_posts_needed = max(MIN_CONTROL_POSTS, min_posts_for.get(candidate, 0) + 1)
+            reason = prescreen_candidate(candidate, client, mental_health_subreddit_set, min_posts_needed)
+            with counts_lock:
+                prescreen_counts[reason or 'passed'] += 1
+            if reason is not None:
+                return reject(candidate)
+
+        candidate, cleaned_posts = fetch_and_filter(candidate, client, mental_health_patterns, mental_health_subreddits, max_posts)
+        if cleaned_posts is None:
+            return []  # Failed to fetch, may succeed on a later run
+        if len(cleaned_posts) < MIN_CONTROL_POSTS or (max_posts is not None and len(cleaned_posts) >= max_posts):
+            return reject(candidate)
+        return cleaned_posts
+
+    def reject(candidate):
+        if journal is not None:
+            journal.append({'type': 'rejected', 'candidate': candidate})
+        return []
+
+    return evaluate
+
+def process_diagnosed_user(diagnosed_user, scheduler, min_controls):
     diagnosed_username = diagnosed_user['username']
     diagnosed_post_count = diagnosed_user['post_count']
     candidate_usernames = diagnosed_user['candidate_usernames']
@@ -125,33 +166,36 @@ def process_diagnosed_user(diagnosed_user, mental_health_subreddits, mental_heal
     max_posts = diagnosed_post_count * 2
 
     selected_controls = []
-    for candidate in candidate_usernames:
-        try:
-            candidate, cleaned_posts = fetch_and_filter(candidate, mental_health_patterns, mental_health_subreddits)
-            with lock:
-                if candidate in used_controls:
-                    continue
+    # Claimed candidates are skipped before any request; the next few are
+    # fetched and filtered in the background while this one is decided
+    evaluations = scheduler.iter_evaluations(candidate_usernames)
+    try:
+        for candidate, evaluation in evaluations:
+            try:
+                cleaned_posts = evaluation.result()
 
-            if len(cleaned_posts) == 0:
-                continue
+                if not cleaned_posts:
+                    continue
 
-            if len(cleaned_posts) < 50:
-                continue
+                if len(cleaned_posts) < MIN_CONTROL_POSTS:
+                    continue
 
-            if min_posts < len(cleaned_posts) < max_posts:
-                selected_controls.append({
-                    'username': candidate,
-                    'post_count': len(cleaned_posts),
-                    'posts': cleaned_posts
-                })
-                with lock:
-                    used_controls.add(candidate)
+                if min_posts < len(cleaned_posts) < max_posts and scheduler.claim(candidate):
+                    selected_controls.append({
+                        'username': candidate,
+                        'post_count': len(cleaned_posts),
+                        'posts': cleaned_posts
+                    })
 
-            if len(selected_controls) >= min_controls:
-                break
+                if len(selected_controls) >= min_controls:
+                    break
 
-        except Exception as e:
-            print(f"Error processing candidate {candidate}: {e}")
+            except Exception as e:
+                print(f"Error processing candidate {candidate}: {e}")
+            finally:
+                scheduler.release(candidate)
+    finally:
+        evaluations.close()
 
     return {
         'diagnosed_user': diagnosed_username,
@@ -159,46 +203,220 @@ def process_diagnosed_user(diagnosed_user, mental_health_subreddits, mental_heal
         'controls': selected_controls[:min_controls]
     }
 
-def filter_control_users(diagnosed_users, mental_health_subreddits, mental_health_patterns, output_directory, min_controls=9, output_prefix='matched_controls'):
+# Generator of diagnosed user results in completion order, each user
+# claiming the first suitable candidates it finds (first come, first served)
+def iter_greedy_results(diagnosed_users, scheduler, min_controls):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(process_diagnosed_user, diagnosed_user, scheduler, min_controls) for diagnosed_user in diagnosed_users]
+        for future in as_completed(futures):
+            yield future.result()
+
+# Function to collect up to `count` more eligible candidates of one diagnosed
+# user from its evaluations, returns ((candidate, cost) pairs, exhausted).
+# The cost is the post count difference in percent. Candidates that are not
+# eligible are released; eligible ones stay held until the assignment is done.
+def collect_eligible_candidates(diagnosed_user, evaluations, count, scheduler):
+    diagnosed_post_count = diagnosed_user['post_count']
+    min_posts = max(1, diagnosed_post_count // 2)
+    max_posts = diagnosed_post_count * 2
+
+    eligible = []
+    for candidate, evaluation in evaluations:
+        try:
+            cleaned_posts = evaluation.result()
+        except Exception as e:
+            print(f"Error processing candidate {candidate}: {e}")
+            cleaned_posts = None
+        if cleaned_posts and len(cleaned_posts) >= MIN_CONTROL_POSTS and min_posts < len(cleaned_posts) < max_posts:
+            eligible.append((candidate, abs(len(cleaned_posts) - diagnosed_post_count) * 100 // diagnosed_post_count))
+            if len(eligible) >= count:
+                return eligible, False
+        else:
+            scheduler.release(candidate)
+    return eligible, True
+
+# Function to match all diagnosed users at once: eligible pairs are collected
+# first, then assigned by min-cost flow so as many controls as possible are
+# matched, with post counts as close as possible. Users left short after an
+# assignment collect more of their candidates and the assignment is solved
+# again, until nobody short has candidates left. Results are in input order.
+def optimal_results(diagnosed_users, scheduler, min_controls, pool_size):
+    evaluations = [scheduler.iter_evaluations(diagnosed_user['candidate_usernames']) for diagnosed_user in diagnosed_users]
+    eligible = [[] for _ in diagnosed_users]
+    wanted = [pool_size] * len(diagnosed_users)
+    assigned = [[] for _ in diagnosed_users]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        while True:
+            active = [index for index, count in enumerate(wanted) if count > 0 and evaluations[index] is not None]
+            if not active:
+                break
+            collected = executor.map(lambda index: collect_eligible_candidates(diagnosed_users[index], evaluations[index], wanted[index], scheduler), active)
+            for index, (pairs, exhausted) in zip(active, collected):
+                eligible[index].extend(pairs)
+                if exhausted:
+                    evaluations[index] = None
+
+            pairs = [(index, candidate, cost) for index, user_pairs in enumerate(eligible) for candidate, cost in user_pairs]
+            assigned = assign_controls([min_controls] * len(diagnosed_users), pairs)
+            wanted = [min_controls - len(candidates) for candidates in assigned]
+            print(f"Assigned {sum(map(len, assigned))} controls from {len(pairs)} eligible pairs, "
+                  f"{sum(1 for count in wanted if count > 0)} diagnosed users short")
+    for user_evaluations in evaluations:
+        if user_evaluations is not None:
+            user_evaluations.close()
+
+    results = []
+    for diagnosed_user, candidates, user_pairs in zip(diagnosed_users, assigned, eligible):
+        controls = []
+        for candidate in candidates:
+            cleaned_posts = scheduler.evaluation(candidate).result()
+            scheduler.claim(candidate)
+            controls.append({
+                'username': candidate,
+                'post_count': len(cleaned_posts),
+                'posts': cleaned_posts
+            })
+        for candidate, _ in user_pairs:
+            scheduler.release(candidate)
+        results.append({
+            'diagnosed_user': diagnosed_user['username'],
+            'diagnosed_post_count': diagnosed_user['post_count'],
+            'controls': controls
+        })
+    return results
+
+# Function to replay a progress journal: finished diagnosed users (with the
+# usernames of their controls), users already saved in batch files, the last
+# batch index and rejected candidates
+def load_progress(journal_path):
+    progress = {'results': {}, 'saved': set(), 'batch_index': 0, 'rejected': set()}
+    for entry in read_journal(journal_path):
+        if entry['type'] == 'result':
+            progress['results'][entry['diagnosed_user']] = entry
+        elif entry['type'] == 'batch':
+            progress['saved'].update(entry['diagnosed_users'])
+            progress['batch_index'] = max(progress['batch_index'], entry['index'])
+        elif entry['type'] == 'rejected':
+            progress['rejected'].add(entry['candidate'])
+    return progress
+
+# Function to rebuild the result of a diagnosed user finished before a restart
+# but not yet saved, re-evaluating its controls (answered by the response cache)
+def rebuild_result(entry, scheduler):
+    controls = []
+    for candidate in entry['controls']:
+        cleaned_posts = scheduler.request(candidate).result()
+        if not cleaned_posts:
+            print(f"Could not restore control {candidate} of {entry['diagnosed_user']}, dropping it")
+            continue
+        controls.append({
+            'username': candidate,
+            'post_count': len(cleaned_posts),
+            'posts': cleaned_posts
+        })
+    return {
+        'diagnosed_user': entry['diagnosed_user'],
+        'diagnosed_post_count': entry['diagnosed_post_count'],
+        'controls': controls
+    }
+
+# Generator of the result of every diagnosed user, as it is journaled; results
+# are also saved in batch files of batch_size users. A resumed run first
+# yields the results saved before the restart.
+def iter_control_matches(diagnosed_users, client, mental_health_subreddits, mental_health_patterns, output_directory, min_controls=9, output_prefix='matched_controls', batch_size=10, fetch_workers=16, prefetch=8, prescreen=True, assignment='greedy', candidate_pool=2, resume=False):
     matched_controls = []
     matched_diagnosed_count = 0
-    used_controls = set()
-    lock = Lock()
     batch_index = 0
 
     def save_batch(batch_index, matched_controls):
         output_file = f"{output_directory}/{output_prefix}_batch_{batch_index}.json"
-        with open(output_file, 'w', encoding='utf-8') as file:
+        # Written under a temporary name first, so a crash never leaves half a batch
+        with open(output_file + '.tmp', 'w', encoding='utf-8') as file:
             json.dump(matched_controls, file, indent=4)
+        os.replace(output_file + '.tmp', output_file)
+        journal.append({'type': 'batch', 'index': batch_index,
+                        'diagnosed_users': [result['diagnosed_user'] for result in matched_controls]}, sync=True)
         print(f"Batch {batch_index} saved with {len(matched_controls)} matched controls")
 
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        future_to_diagnosed = {executor.submit(process_diagnosed_user, diagnosed_user, mental_health_subreddits, mental_health_patterns, min_controls, used_controls, lock): diagnosed_user for diagnosed_user in diagnosed_users}
+    # Finished users, batches and rejected candidates are journaled as they
+    # happen, so --resume loses at most the diagnosed users in flight. With
+    # optimal assignment results only exist once every eligible pair is
+    # collected, so a resumed run keeps the rejections but collects again.
+    journal_path = f"{output_directory}/{output_prefix}.journal.jsonl"
+    progress = load_progress(journal_path if resume else os.devnull)
+    journal = Journal(journal_path, resume=resume)
+
+    # One scheduler evaluates every candidate at most once for all diagnosed users
+    prescreen_counts = Counter() if prescreen else None
+    evaluate = make_candidate_evaluator(diagnosed_users, client, mental_health_subreddits, mental_health_patterns, prescreen_counts, journal)
+    scheduler = CandidateScheduler(evaluate, fetch_workers, prefetch)
+
+    finished = progress['results']
+    remaining_users = [diagnosed_user for diagnosed_user in diagnosed_users if diagnosed_user['username'] not in finished]
+    scheduler.expect(diagnosed_user['candidate_usernames'] for diagnosed_user in remaining_users)
+    # Rejections are kept for the candidates of the users still to match
+    pending = {candidate for diagnosed_user in remaining_users for candidate in diagnosed_user['candidate_usernames']}
+    scheduler.restore(claimed=[candidate for entry in finished.values() for candidate in entry['controls']],
+                      known={candidate: [] for candidate in progress['rejected'] & pending})
+    if finished:
+        batch_index = progress['batch_index']
+        matched_diagnosed_count = sum(1 for entry in finished.values() if len(entry['controls']) >= min_controls)
+        print(f"Resuming: {len(finished)} diagnosed users already matched")
+    if progress['rejected']:
+        print(f"Resuming: {len(progress['rejected'])} candidates already rejected")
+
+    with journal, closing(scheduler):
+        for saved_index in range(1, batch_index + 1):
+            saved_file = f"{output_directory}/{output_prefix}_batch_{saved_index}.json"
+            if os.path.exists(saved_file):
+                yield from load_json(saved_file)
+
+        # Users finished before the restart but not saved go into the next batch
+        for entry in finished.values():
+            if entry['diagnosed_user'] not in progress['saved']:
+                matched_controls.append(rebuild_result(entry, scheduler))
+                yield matched_controls[-1]
+
+        if assignment == 'optimal':
+            results = optimal_results(remaining_users, scheduler, min_controls, candidate_pool * min_controls)
+        else:
+            results = iter_greedy_results(remaining_users, scheduler, min_controls)
 
-        for future in as_completed(future_to_diagnosed):
-            diagnosed_user_result = future.result()
+        for diagnosed_user_result in results:
+            journal.append({'type': 'result', 'diagnosed_user': diagnosed_user_result['diagnosed_user'],
+                            'diagnosed_post_count': diagnosed_user_result['diagnosed_post_count'],
+                            'controls': [control['username'] for control in diagnosed_user_result['controls']]}, sync=True)
             matched_controls.append(diagnosed_user_result)
+            yield diagnosed_user_result
 
             if len(diagnosed_user_result['controls']) >= min_controls:
                 matched_diagnosed_count += 1
 
-            if len(matched_controls) >= globalSettings()["control_batch_size"]:
+            if len(matched_controls) >= batch_size:
                 batch_index += 1
                 save_batch(batch_index, matched_controls)
                 matched_controls = []
                 print("")
                 print(f"Batch {batch_index} completed and saved. Processed {len(matched_controls)} diagnosed users.")
 
-    if matched_controls:
-        batch_index += 1
-        save_batch(batch_index, matched_controls)
-        print("")
-        print(f"Batch {batch_index} completed and saved. Processed all diagnosed users.")
+        if matched_controls:
+            batch_index += 1
+            save_batch(batch_index, matched_controls)
+            print("")
+            print(f"Batch {batch_index} completed and saved. Processed all diagnosed users.")
 
+    print(scheduler.summary(client.request_count))
+    if prescreen_counts is not None:
+        print(f"Pre-screen: {prescreen_counts['passed']} passed, rejected {prescreen_counts['mental health subreddit']} "
+              f"for mental health subreddits and {prescreen_counts['too few posts']} for too few posts")
     total_diagnosed_count = len(diagnosed_users)
     print(f"Total diagnosed users matched: {matched_diagnosed_count} out of {total_diagnosed_count}")
-    thr = globalSettings()["controls_per_diagnosed"]
-    print(f"Controls per diagnosed:{thr}")
+    print(f"Controls per diagnosed:{min_controls}")
+
+def filter_control_users(diagnosed_users, client, mental_health_subreddits, mental_health_patterns, output_directory, min_controls=9, output_prefix='matched_controls', batch_size=10, fetch_workers=16, prefetch=8, prescreen=True, assignment='greedy', candidate_pool=2, resume=False):
+    for _ in iter_control_matches(diagnosed_users, client, mental_health_subreddits, mental_health_patterns, output_directory, min_controls, output_prefix, batch_size, fetch_workers, prefetch, prescreen, assignment, candidate_pool, resume):
+        pass
 
 def main():
     parser = argparse.ArgumentParser(description='Match diagnosed users with control users.')
@@ -206,15 +424,30 @@ def main():
     parser.add_argument('output_directory', type=str, help='Directory to save the output JSON files')
     parser.add_argument('--output_prefix', type=str, default='matched_control', help='Prefix for the output JSON files')
     parser.add_argument('--min_controls', type=int, default=9, help='Minimum number of control users to match for each diagnosed user')
+    parser.add_argument('--fetch_workers', type=int, default=16, help='Candidates fetched and filtered at the same time')
+    parser.add_argument('--assignment', type=str, choices=['greedy', 'optimal'], default='greedy',
+                        help="'greedy' lets each diagnosed user claim the first suitable candidates; 'optimal' collects eligible pairs for everyone first, then assigns them globally")
+    parser.add_argument('--candidate_pool', type=int, default=2,
+                        help="With --assignment optimal, eligible candidates collected per diagnosed user, as a multiple of the controls needed")
+    parser.add_argument('--no_prescreen', action='store_true', help='Fetch every candidate history in full without pre-screening subreddit activity counts')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run from the progress journal in the output directory '
+                             '(with --assignment optimal only rejected candidates are kept, the pairs are collected again)')
+    parser.add_argument('--prefetch', type=int, default=8, help='Candidates each diagnosed user requests ahead of the one being decided')
+    add_client_arguments(parser)
+    add_settings_arguments(parser)
 
     args = parser.parse_args()
+    settings = settings_from_args(args)
 
     start_time = time.time()
 
-    diagnosed_users = load_json(args.input_file)
-    mental_health_subreddits = load_patterns('../../../resources/mh_subreddits.txt')
-    mental_health_patterns = load_patterns('../../../resources/mh_patterns.txt')
-    filter_control_users(diagnosed_users, mental_health_subreddits, mental_health_patterns, args.output_directory, globalSettings()["controls_per_diagnosed"], args.output_prefix)
+    diagnosed_users = load_diagnosed_users(args.input_file)
+    mental_health_subreddits = load_patterns(resource_path('mh_subreddits.txt'))
+    mental_health_patterns = PatternMatcher(load_patterns(resource_path('mh_patterns.txt')))
+    # All worker threads share one pooled API client
+    with client_from_args(args) as client:
+        filter_control_users(diagnosed_users, client, mental_health_subreddits, mental_health_patterns, args.output_directory, settings.controls_per_diagnosed, args.output_prefix, settings.control_batch_size, args.fetch_workers, args.prefetch, not args.no_prescreen, args.assignment, args.candidate_pool, args.resume)
+        print(client.summary())
 
     end_time = time.time()
     elapsed_time = (end_time - start_time)/60
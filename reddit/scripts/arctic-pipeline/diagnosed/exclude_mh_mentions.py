@@ -1,103 +1,121 @@
-import json
-import re
 import argparse
+import os
+import sys
+from collections import Counter
 
-def globalSettings(settings_file='../../../../config/global.json'):
-    with open(settings_file, 'r', encoding='utf-8') as file:
-        settings = json.load(file)
-    return settings
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.patterns import PatternMatcher
+from common.records import RecordWriter, read_records
+from common.settings import add_settings_arguments, resource_path, settings_from_args
 
 # Function to load patterns from a text file
 def load_patterns(file_path):
     with open(file_path, 'r') as file:
         return [line.strip().lower() for line in file.readlines()]
 
+# Function to find the mental health pattern a post contains, if any
+def find_mental_health_pattern(text, matcher):
+    return matcher.search(text.lower())
+
 # Function to check if a post contains any mental health patterns
-def contains_mental_health_patterns(text, patterns):
-    text = text.lower()
-    return any(re.search(re.escape(pattern), text) for pattern in patterns)
+def contains_mental_health_patterns(text, matcher):
+    return matcher.contains(text.lower())
 
 # Function to remove posts with mental health patterns and ensure selftext is valid
-def remove_mental_health_posts(posts, mental_health_patterns):
-    return [
-        post for post in posts
-        if not contains_mental_health_patterns(post.get('selftext', ''), mental_health_patterns)
-        and post.get('selftext') not in ['', '[removed]']
-    ]
-
-# Main function to process all unique users
-def main():
-    parser = argparse.ArgumentParser(
-        description='Filter and remove mental health-related Reddit posts.')
-    parser.add_argument('input_file', type=str,
-                        help='Path to the input JSON file containing user submissions')
-    parser.add_argument('output_file', type=str,
-                        help='Path to save the filtered JSON file')
-    parser.add_argument('summary_file', type=str,
-                        help='Path to save the summary JSON file')
-
-
-    args = parser.parse_args()
-
-    # Hardcoded path to the mental health patterns text file
-    mental_health_patterns_file = '../../../resources/mh_patterns.txt'
-    mental_health_patterns = load_patterns(mental_health_patterns_file)
-
-    user_submissions = []
-    with open(args.input_file, 'r', encoding='utf-8') as file:
-        user_submissions = json.load(file)
-
-    all_user_submissions = []
-    user_post_counts = []
-    total_posts = 0
-    qualified_users_count = 0
-    non_qualified_users_count = 0
-    non_mh_threshold = globalSettings()["non_mh_posts_per_diagnosed_user"]
-
-    for submission in user_submissions:
-        posts = submission['posts']
-        filtered_posts = remove_mental_health_posts(posts, mental_health_patterns)
-        if filtered_posts and len(filtered_posts) >= non_mh_threshold:
-            all_user_submissions.append({
+def remove_mental_health_posts(posts, matcher, pattern_hits=None):
+    filtered_posts = []
+    for post in posts:
+        matched_pattern = find_mental_health_pattern(post.get('selftext', ''), matcher)
+        if matched_pattern is not None:
+            if pattern_hits is not None:
+                pattern_hits[matched_pattern] += 1
+            continue
+        if post.get('selftext') not in ['', '[removed]']:
+            filtered_posts.append(post)
+    return filtered_posts
+
+# Generator of users left with at least `threshold` posts once posts with
+# mental health patterns are removed; counts go into stats
+def iter_qualified_users(users, matcher, threshold, stats):
+    for submission in users:
+        filtered_posts = remove_mental_health_posts(submission['posts'], matcher, stats['pattern_hits'])
+        if filtered_posts and len(filtered_posts) >= threshold:
+            stats['total_posts'] += len(filtered_posts)
+            stats['qualified_users_count'] += 1
+            yield {
                 'username': submission['username'],
                 'posts': filtered_posts
-            })
-            total_posts += len(filtered_posts)
-            qualified_users_count += 1
-            user_post_counts.append({
-                'username': submission['username'],
-                'post_count': len(filtered_posts),
-                'non_mental_health_subreddits': list({post['subreddit'] for post in filtered_posts if post.get('subreddit')})
-            })
+            }
         else:
-            non_qualified_users_count += 1
-
+            stats['non_qualified_users_count'] += 1
 
         print(f"Processed user {submission['username']} with              {len(filtered_posts)} posts")
 
-    # Save all user submissions to a single JSON file
-    with open(args.output_file, 'w', encoding='utf-8') as file:
-        json.dump(all_user_submissions, file, indent=4)
+# Function to summarize a qualified user for control matching
+def summarize_user(user):
+    return {
+        'username': user['username'],
+        'post_count': len(user['posts']),
+        'non_mental_health_subreddits': list({post['subreddit'] for post in user['posts'] if post.get('subreddit')})
+    }
 
-    # Save user post counts to the summary file
-    with open(args.summary_file, 'w', encoding='utf-8') as file:
-        json.dump(user_post_counts, file, indent=4)
+def new_exclusion_stats():
+    return {'total_posts': 0, 'qualified_users_count': 0, 'non_qualified_users_count': 0, 'pattern_hits': Counter()}
 
+def print_exclusion_summary(stats, threshold, output_file, summary_file):
     # Calculate average number of posts per user
-    if qualified_users_count > 0:
-        average_posts = total_posts / qualified_users_count
+    if stats['qualified_users_count'] > 0:
+        average_posts = stats['total_posts'] / stats['qualified_users_count']
     else:
         average_posts = 0
 
+    pattern_hits = stats['pattern_hits']
     print("")
     print("-------------Summary-----------------")
-    print(f"Users saved: {qualified_users_count} at {args.output_file}")
-    print(f"Summary for control: {args.summary_file}")
+    print(f"Users saved: {stats['qualified_users_count']} at {output_file}")
+    print(f"Summary for control: {summary_file}")
     print(f"Average # of posts per qualified user: {average_posts:.2f}")
-    print(f"Users with less than {non_mh_threshold} posts: {non_qualified_users_count}")
+    print(f"Users with less than {threshold} posts: {stats['non_qualified_users_count']}")
+    print(f"Posts removed for MH terms: {sum(pattern_hits.values())}")
+    for pattern, count in pattern_hits.most_common(10):
+        print(f"    {pattern}: {count}")
     print("------------------------------")
     print('')
 
+# Main function to process all unique users
+def main():
+    parser = argparse.ArgumentParser(
+        description='Filter and remove mental health-related Reddit posts.')
+    parser.add_argument('input_file', type=str,
+                        help='Path to the input JSONL file containing user submissions')
+    parser.add_argument('output_file', type=str,
+                        help='Path to save the filtered JSONL file')
+    parser.add_argument('summary_file', type=str,
+                        help='Path to save the summary JSONL file')
+    parser.add_argument('--legacy_json', action='store_true',
+                        help='Write pretty-printed JSON arrays instead of one user per line')
+    add_settings_arguments(parser)
+
+    args = parser.parse_args()
+    settings = settings_from_args(args)
+
+    # Mental health patterns text file under reddit/resources
+    mental_health_patterns_file = resource_path('mh_patterns.txt')
+    mental_health_matcher = PatternMatcher(load_patterns(mental_health_patterns_file))
+
+    non_mh_threshold = settings.non_mh_posts_per_diagnosed_user
+    stats = new_exclusion_stats()
+
+    # Users are streamed in and written out one at a time, together with
+    # their post counts for the summary file
+    with RecordWriter(args.output_file, args.legacy_json) as output_writer, \
+            RecordWriter(args.summary_file, args.legacy_json) as summary_writer:
+        for user in iter_qualified_users(read_records(args.input_file), mental_health_matcher, non_mh_threshold, stats):
+            output_writer.write(user)
+            summary_writer.write(summarize_user(user))
+
+    print_exclusion_summary(stats, non_mh_threshold, args.output_file, args.summary_file)
+
 
 
 if __name__ == '__main__':
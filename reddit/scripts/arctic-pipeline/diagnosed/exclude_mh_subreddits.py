@@ -1,5 +1,10 @@
-import json
 import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.records import read_records, write_records
+from common.settings import resource_path
 
 # applies the first exclusion criteria: removing submissions that have been made in a mental health related subreddit.
 # outputs two files: non mental health submissions (), summary of data filtered
@@ -10,33 +15,24 @@ def load_subreddits(file_path):
         return [line.strip().lower() for line in file.readlines()]
 
 
-def load_json(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
-
-
-def filter_non_mental_health_submissions(input_file, output_file, subreddits_file):
-    subreddits = load_subreddits(subreddits_file)
-    user_submissions = load_json(input_file)
-    non_mental_health_users = []
-
-    for user in user_submissions:
+# Generator of users with only their posts made outside mental health subreddits
+def iter_non_mental_health_users(users, subreddits):
+    for user in users:
         non_mental_health_posts = [
             post for post in user['posts'] if post.get('subreddit') and post['subreddit'].lower() not in subreddits
         ]
-        non_mental_health_subreddits = {
-            post['subreddit'] for post in non_mental_health_posts if post.get('subreddit')}
 
         if non_mental_health_posts:
-            non_mental_health_users.append(
-                {'username': user['username'], 'posts': non_mental_health_posts, 'post_count': len(non_mental_health_posts)})
+            yield {'username': user['username'], 'posts': non_mental_health_posts, 'post_count': len(non_mental_health_posts)}
+
 
-    # Save non-mental health posts to the output file
-    with open(output_file, 'w', encoding='utf-8') as file:
-        json.dump(non_mental_health_users, file, indent=4)
+def filter_non_mental_health_submissions(input_file, output_file, subreddits_file, legacy_json=False):
+    subreddits = load_subreddits(subreddits_file)
 
+    # Users are streamed from the input file and written one per line
+    count = write_records(iter_non_mental_health_users(read_records(input_file), subreddits), output_file, legacy_json)
 
-    print(f"Saved {len(non_mental_health_users)} users with non-mental health posts to {output_file}")
+    print(f"Saved {count} users with non-mental health posts to {output_file}")
 
 
 def main():
@@ -45,15 +41,17 @@ def main():
     parser.add_argument('input_file', type=str,
                         help='Path to the input JSON file containing user submissions')
     parser.add_argument('output_file', type=str,
-                        help='Path to save the non-mental health posts JSON file')
-  
+                        help='Path to save the non-mental health posts JSONL file')
+    parser.add_argument('--legacy_json', action='store_true',
+                        help='Write a pretty-printed JSON array instead of one user per line')
+
     args = parser.parse_args()
 
-    # Hardcoded path to the subreddits text file
-    subreddits_file = '../../../resources/mh_subreddits.txt'
+    # Subreddits text file under reddit/resources
+    subreddits_file = resource_path('mh_subreddits.txt')
 
     filter_non_mental_health_submissions(
-        args.input_file, args.output_file, subreddits_file)
+        args.input_file, args.output_file, subreddits_file, args.legacy_json)
 
 
 if __name__ == '__main__':
@@ -1,15 +1,15 @@
-import json
 import re
 import argparse
+import os
+import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.records import read_records, write_records
+from common.settings import add_settings_arguments, settings_from_args
 
-def globalSettings(settings_file='../../../../config/global.json'):
-    with open(settings_file, 'r', encoding='utf-8') as file:
-        settings = json.load(file)
-    return settings
 
 # Function to check if selftext is valid
-def is_valid_selftext(selftext):
+def is_valid_selftext(selftext, min_word_count):
     invalid_patterns = [
         r'^\[deleted\]$',        # Exactly "[deleted]"
         r'^\[removed\]$',        # Exactly "[removed]"
@@ -30,48 +30,45 @@ def is_valid_selftext(selftext):
     sentences = re.split(r'[.!?]', selftext)
     for sentence in sentences:
         words = sentence.strip().split()
-        if len(words) > globalSettings()["min_diagnosed_post_word_count"]:
+        if len(words) > min_word_count:
             return True
 
     return False
 
-# Function to filter and simplify posts
-def filter_and_simplify_posts(input_file, output_file):
+# Generator yielding each user with only their valid, simplified posts
+def simplify_users(all_user_submissions, stats, min_word_count):
     # Define relevant properties to keep
     relevant_properties = ['id', 'title', 'selftext', 'author', 'created_utc', 'subreddit', 'score']
 
-    simplified_user_submissions = []
-    total_simplified_posts = 0
-    total_length = 0
-
-    # Load the JSON file
-    with open(input_file, 'r', encoding='utf-8') as file:
-        all_user_submissions = json.load(file)
-
-    # Filter and simplify the posts
     for user_data in all_user_submissions:
         simplified_posts = []
         for post in user_data['posts']:
             selftext = post.get('selftext', '')
-            if is_valid_selftext(selftext):
+            if is_valid_selftext(selftext, min_word_count):
                 simplified_post = {prop: post[prop] for prop in relevant_properties if prop in post}
                 simplified_posts.append(simplified_post)
-                total_length += len(selftext)
-                total_simplified_posts += 1
+                stats['total_length'] += len(selftext)
+                stats['total_simplified_posts'] += 1
 
         if simplified_posts:
-            simplified_user_data = {
+            yield {
                 'username': user_data['username'],
                 'posts': simplified_posts
             }
-            simplified_user_submissions.append(simplified_user_data)
 
-    # Save the simplified posts to a new JSON file
-    with open(output_file, 'w', encoding='utf-8') as file:
-        json.dump(simplified_user_submissions, file, indent=4)
+# Function to filter and simplify posts
+def filter_and_simplify_posts(input_file, output_file, min_word_count, legacy_json=False):
+    stats = {'total_simplified_posts': 0, 'total_length': 0}
+
+    # Stream users from the input file to the output file one at a time
+    write_records(simplify_users(read_records(input_file), stats, min_word_count), output_file, legacy_json)
+
+    print_final_cleaning_summary(stats)
 
+def print_final_cleaning_summary(stats):
+    total_simplified_posts = stats['total_simplified_posts']
     if total_simplified_posts:
-        average_length = total_length / total_simplified_posts
+        average_length = stats['total_length'] / total_simplified_posts
     else:
         average_length = 0
 
@@ -85,11 +82,15 @@ def main():
     parser.add_argument('input_file', type=str,
                         help='Path to the input JSON file containing all user submissions')
     parser.add_argument('output_file', type=str,
-                        help='Path to save the simplified JSON file')
+                        help='Path to save the simplified JSONL file')
+    parser.add_argument('--legacy_json', action='store_true',
+                        help='Write a pretty-printed JSON array instead of one user per line')
+    add_settings_arguments(parser)
 
     args = parser.parse_args()
+    settings = settings_from_args(args)
 
-    filter_and_simplify_posts(args.input_file, args.output_file)
+    filter_and_simplify_posts(args.input_file, args.output_file, settings.min_diagnosed_post_word_count, args.legacy_json)
 
 if __name__ == '__main__':
     main()
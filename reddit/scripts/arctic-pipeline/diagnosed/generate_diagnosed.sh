@@ -5,10 +5,16 @@
 # Example ruN
 #      bash run_condition_diagnosis.sh ~/Downloads/r_ADHD_posts.jsonl ADHD 20
 #      runs diagnosis on the given jsonl file with minimum 20 posts with the condition named ADHD
+# The stages run in one process through the pipeline runner (python3 -m pipeline --help);
+# the minimum posts is optional and sets minimum_posts_per_diagnosed_user, other
+# arguments are passed on to the runner, e.g. --persist all. All submissions are
+# written to all_user_submissions.jsonl in the condition folder (the name of that
+# file is no longer an argument). diagnosed-users-all-submissions.jsonl is kept for
+# run_diagnosed_execlusion.sh, which removes it.
 
 # Check if the user provided the required arguments
 if [ "$#" -lt 2 ]; then
-    echo "Usage: $0 <path_to_input_file>  <condition_name> <minimum posts for user> [<all_user_submissions_output_file>]"
+    echo "Usage: $0 <path_to_input_file>  <condition_name> [<minimum posts for user>] [<pipeline options>]"
     exit 1
 fi
 
@@ -18,71 +24,25 @@ INPUT_FILE="$1"
 # Condition name provided by the user
 CONDITION_NAME="$2"
 
-# Optional parameters
+# Options passed on to the pipeline
+shift 2
+if [ "$#" -gt 0 ] && [[ "$1" != --* ]]; then
+    set -- --setting "minimum_posts_per_diagnosed_user=$1" "${@:2}"
+fi
 
-# Hardcoded paths to the Python scripts
-CLEANING_SCRIPT="initial_cleaning.py"
-DIAGNOSIS_SCRIPT="separate_diagnosed_users.py"
-FETCH_SUBMISSIONS_SCRIPT="fetch_all_user_submissions.py"
-FINAL_CLEANING_SCRIPT="final_cleaning.py"
+PIPELINE_DIR="$(cd "$(dirname "$0")/.." && pwd)"
 
 # Create the condition folder
 CONDITION_FOLDER="../../../data/${CONDITION_NAME}_output"
-mkdir -p "$CONDITION_FOLDER"
 mkdir -p "${CONDITION_FOLDER}/diagnosed"
 LOG="${CONDITION_FOLDER}/diagnosed.log.txt"
-# Intermediate files
-CLEANED_OUTPUT_FILE="${CONDITION_FOLDER}/diagnosed/cleaned-pre-diagnosis-data.json"
-DIAGNOSED_AUTHORS_FILE="${CONDITION_FOLDER}/diagnosed/diagnosed-usernames.json"
-FINAL_CLEANED_SUBMISSIONS_FILE="${CONDITION_FOLDER}/diagnosed/diagnosed-users-all-submissions.json"
-ALL_USER_SUBMISSIONS_OUTPUT_FILE="${CONDITION_FOLDER}/${5:-all_user_submissions.json}"
-{
-# Execute the first Python script with the input and output file paths
-echo "Generating diagnosed data..."
-echo ""
-python3 "$CLEANING_SCRIPT" "$INPUT_FILE" "$CLEANED_OUTPUT_FILE"
-echo ""
-
-# Check if the first script executed successfully
-if [ $? -eq 0 ]; then
-    # Execute the second Python script with the cleaned output file and threshold
-    echo "Diagnosing ${CONDITION_NAME} users....."
-    python3 "$DIAGNOSIS_SCRIPT" "$CLEANED_OUTPUT_FILE" "$DIAGNOSED_AUTHORS_FILE" "$CONDITION_NAME"
-    echo "Done diagnosing users....."
-    echo ""
 
-    # Check if the second script executed successfully
-    if [ $? -eq 0 ]; then
-        # Execute the third Python script to fetch all user submissions
-        echo "Fetching all user submissions for diagnosed users....."
-        echo ""
-        python3 "$FETCH_SUBMISSIONS_SCRIPT" "$DIAGNOSED_AUTHORS_FILE" --output_file "$ALL_USER_SUBMISSIONS_OUTPUT_FILE" 
-        echo ""
-
-        # Check if the third script executed successfully
-        if [ $? -eq 0 ]; then
-            # Execute the final cleaning script on the fetched submissions
-            echo "Cleaning downloaded data...."
-            python3 "$FINAL_CLEANING_SCRIPT" "$ALL_USER_SUBMISSIONS_OUTPUT_FILE" "$FINAL_CLEANED_SUBMISSIONS_FILE"
-            # rm $CLEANED_OUTPUT_FILE
-            echo "Done fetching submissions..... YAI!!!!!" 
-            echo "--------------------------------"
-            echo ""
-            echo ""
-            echo "Applying execlusion patterns..."
-            echo ""
-            bash "run_diagnosed_execlusion.sh" $CONDITION_FOLDER
-            echo ""
-        else
-            echo "Error: The fetch submissions script did not execute successfully."
-            exit 1
-        fi
-    else
-        echo "Error: The diagnosis script did not execute successfully."
-        exit 1
-    fi
-else
-    echo "Error: The cleaning script did not execute successfully."
-    exit 1
+echo "Generating diagnosed data, log at $LOG"
+PYTHONPATH="$PIPELINE_DIR" python3 -m pipeline --condition "$CONDITION_NAME" --input_folder "$INPUT_FILE" \
+    --output_folder "$CONDITION_FOLDER" --until format_diagnosed --persist final_clean "$@" &> "$LOG"
+STATUS=$?
+if [ $STATUS -ne 0 ]; then
+    echo "Error: the diagnosed pipeline failed (exit code $STATUS), see $LOG"
+    exit $STATUS
 fi
-} &> "$LOG"
+echo "Done generating diagnosed data."
@@ -2,18 +2,19 @@ import json
 import re
 import argparse
 import os
-
-def globalSettings(settings_file='../../../../config/global.json'):
-    with open(settings_file, 'r', encoding='utf-8') as file:
-        settings = json.load(file)
-    return settings
-
-formatted_json = json.dumps(globalSettings(), indent=4)
-formatted_json = formatted_json.replace('{', '').replace('}', '').replace('"', '').strip()
-print("")
-print("Settings: ")
-print(formatted_json)
-print("")
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.compression import find_input_file, is_compressed, open_binary, open_text
+from common.dedup import DigestSet
+from common.near_duplicates import NearDuplicateFilter
+from common.normalize import normalize_text as preprocess_text
+from common.records import write_records
+from common.settings import add_settings_arguments, print_settings, settings_from_args
+from common.shards import iter_shard_lines, line_aligned_shards
 
 # Function to check if text is valid
 def is_valid_text(text):
@@ -44,112 +45,203 @@ def is_valid_text(text):
 
     return False
 
-# Function to filter and simplify posts and comments
-def filter_and_simplify(input_folder, output_file):
-    # Define relevant properties to keep
-    relevant_properties = ['id', 'title', 'selftext', 'author', 'created_utc', 'subreddit', 'score']
-    comment_properties = ['id', 'selftext', 'author', 'created_utc', 'subreddit', 'score']
-
-    simplified_submissions = []
-    unique_texts = set()
-    total_simplified_posts = 0
-    total_length = 0
+# Define relevant properties to keep
+POST_PROPERTIES = ['id', 'title', 'selftext', 'author', 'created_utc', 'subreddit', 'score']
+COMMENT_PROPERTIES = ['id', 'selftext', 'author', 'created_utc', 'subreddit', 'score']
+
+# Posts keep their title, comments get their body renamed to selftext.
+# Each source may also be zstd or gzip compressed (posts.jsonl.zst, ...).
+SOURCES = [
+    ('posts.jsonl', 'selftext', POST_PROPERTIES),
+    ('comments.jsonl', 'body', COMMENT_PROPERTIES),
+]
+
+# Function to validate and simplify one raw post or comment, None if invalid
+def clean_submission(submission, text_field, properties):
+    text = submission.get(text_field, '')
+    author = submission.get('author', '')
+    if not (is_valid_text(text) and author != '[deleted]'):
+        return None
+    simplified = {prop: submission[prop] for prop in properties if prop in submission}
+    simplified['selftext'] = preprocess_text(text)  # Replace with cleaned text
+    return simplified, len(text)
+
+# Function to clean a batch of JSONL lines (runs in a worker process).
+# Duplicates inside the batch are dropped here, duplicates across batches are
+# dropped when the batches are merged.
+def clean_lines(lines, text_field, properties):
+    cleaned = []
+    shard_texts = DigestSet()
     duplicate_count = 0
-
-    # Process posts
-    posts_file = os.path.join(input_folder, 'posts.jsonl')
-    if os.path.exists(posts_file):
-        with open(posts_file, 'r', encoding='utf-8') as file:
-            for line in file:
-                post = json.loads(line.strip())
-                selftext = post.get('selftext', '')
-                author = post.get('author', '')
-                if is_valid_text(selftext) and author != '[deleted]':
-                    cleaned_text = preprocess_text(selftext)
-                    if cleaned_text in unique_texts:
-                        duplicate_count += 1
-                        continue
-                    unique_texts.add(cleaned_text)
-                    simplified_post = {prop: post[prop] for prop in relevant_properties if prop in post}
-                    simplified_post['selftext'] = cleaned_text  # Replace with cleaned text
-                    simplified_submissions.append(simplified_post)
-                    total_length += len(selftext)
-                    total_simplified_posts += 1
-
-    # Process comments
-    comments_file = os.path.join(input_folder, 'comments.jsonl')
-    if os.path.exists(comments_file):
-        with open(comments_file, 'r', encoding='utf-8') as file:
+    for line in lines:
+        result = clean_submission(json.loads(line.strip()), text_field, properties)
+        if result is None:
+            continue
+        if not shard_texts.add(result[0]['selftext']):
+            duplicate_count += 1
+            continue
+        cleaned.append(result)
+    return cleaned, duplicate_count
+
+# Function to clean one byte range of an uncompressed JSONL file
+def clean_shard(source_file, start, end, text_field, properties):
+    return clean_lines(iter_shard_lines(source_file, start, end), text_field, properties)
+
+# Generator of (source_file, text_field, properties) for the sources present.
+# input_folder may also be a list of folders (e.g. overlapping dumps of
+# several conditions), cleaned and deduplicated as one input.
+def iter_sources(input_folder):
+    input_folders = [input_folder] if isinstance(input_folder, str) else input_folder
+    for folder in input_folders:
+        for file_name, text_field, properties in SOURCES:
+            source_file = find_input_file(os.path.join(folder, file_name))
+            if source_file is not None:
+                yield source_file, text_field, properties
+
+# Generator of cleaned results for every source file, one line at a time
+def iter_cleaned_sequential(input_folder):
+    for source_file, text_field, properties in iter_sources(input_folder):
+        with open_text(source_file) as file:
             for line in file:
-                comment = json.loads(line.strip())
-                body = comment.get('body', '')
-                author = comment.get('author', '')
-                if is_valid_text(body) and author != '[deleted]':
-                    cleaned_text = preprocess_text(body)
-                    if cleaned_text in unique_texts:
-                        duplicate_count += 1
-                        continue
-                    unique_texts.add(cleaned_text)
-                    simplified_comment = {prop: comment[prop] for prop in comment_properties if prop in comment}
-                    simplified_comment['selftext'] = cleaned_text  # Rename body to selftext and replace with cleaned text
-                    simplified_submissions.append(simplified_comment)
-                    total_length += len(body)
-                    total_simplified_posts += 1
-
-    # Save the simplified posts and comments to a new JSON file
-    with open(output_file, 'w', encoding='utf-8') as file:
-        json.dump(simplified_submissions, file, indent=4)
-
-    print(f"Valid posts and comments read: {total_simplified_posts}")
-    print(f"Duplicated posts and comments: {duplicate_count}")
-
-def preprocess_text(text):
-    # Lowercasing Text
-    text = text.lower()
-    
-    # Removing Hyperlinks
-    text = re.sub(r'https?://\S+', '', text)
-    
-    # Removing HTML Tags
-    text = re.sub(r'<.*?>', '', text)
-    
-    # Removing User Mentions
-    text = re.sub(r'@\w+', '', text)
-    
-    # Removing HTML Entities
-    text = re.sub(r'&\w+;', ' ', text)
-    
-    # Processing Hashtags
-    text = re.sub(r'#(\w+)', r'\1', text)
-    
-    # Preserving Certain Characters and Whitespace
-    text = re.sub(r'[^a-zA-Z0-9\s\.\'\!\?\,\;\-]', ' ', text)
-    
-    # Normalizing Spaces and Punctuation
-    text = re.sub(r'(?<=[.,!?])(?=[^\s])', r' ', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'(\.|\!|\?|\,|\;)\1+', r'\1', text)  # Deduplicate sentence-ending symbols
-    text = re.sub(r'\.{3,}', '.', text)  # Replace consecutive ellipsis with a single full stop
-    text = text.strip()
-    text = re.sub(r'(?<=\w)([.,;])(?=\S)', r'\1 ', text)
-    
-    # Ensure post ends with a full stop if it doesn't end with a sentence-ending symbol
-    if not re.search(r'[.!?]$', text):
-        text += '.'
-    
-    return text
+                result = clean_submission(json.loads(line.strip()), text_field, properties)
+                if result is not None:
+                    yield [result], 0
+
+# Generator of lists of lines totalling about batch_size bytes, read while
+# decompressing (compressed files cannot be split into byte ranges)
+def iter_line_batches(source_file, batch_size):
+    with open_binary(source_file) as file:
+        batch = []
+        batch_bytes = 0
+        for line in file:
+            batch.append(line)
+            batch_bytes += len(line)
+            if batch_bytes >= batch_size:
+                yield batch
+                batch = []
+                batch_bytes = 0
+        if batch:
+            yield batch
+
+# Generator of (function, arguments) cleaning tasks, in file and shard order
+def iter_cleaning_tasks(input_folder, shard_size):
+    for source_file, text_field, properties in iter_sources(input_folder):
+        if is_compressed(source_file):
+            for lines in iter_line_batches(source_file, shard_size):
+                yield clean_lines, (lines, text_field, properties)
+        else:
+            for start, end in line_aligned_shards(source_file, shard_size):
+                yield clean_shard, (source_file, start, end, text_field, properties)
+
+# Generator of cleaned shards from a process pool, in file and shard order
+def iter_cleaned_sharded(input_folder, workers, shard_size):
+    max_pending = 2 * (workers or os.cpu_count() or 1)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for function, arguments in iter_cleaning_tasks(input_folder, shard_size):
+            pending.append(executor.submit(function, *arguments))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# Generator of (simplified, raw text length) for every post and comment
+# whose text was not seen before, in the original order. The texts seen are
+# kept as digests, spilled to disk past dedup_memory_mb.
+def iter_unique_submissions(input_folder, stats, workers, shard_size, dedup_memory_mb):
+    if workers == 1:
+        cleaned_batches = iter_cleaned_sequential(input_folder)
+    else:
+        cleaned_batches = iter_cleaned_sharded(input_folder, workers, shard_size)
+
+    with DigestSet(memory_mb=dedup_memory_mb) as unique_texts:
+        for cleaned, batch_duplicates in cleaned_batches:
+            stats['duplicate_count'] += batch_duplicates
+            for simplified, text_length in cleaned:
+                if not unique_texts.add(simplified['selftext']):
+                    stats['duplicate_count'] += 1
+                    continue
+                yield simplified, text_length
+        stats['dedup'] = unique_texts.summary()
+
+# Generator of simplified posts and comments, deduplicated across the whole
+# input in the original order; counts go into stats. With a
+# NearDuplicateFilter, near-duplicates of earlier texts are dropped as well.
+def iter_cleaned_submissions(input_folder, stats, workers=1, shard_size=64 * 1024 * 1024, dedup_memory_mb=1024,
+                             near_duplicates=None):
+    submissions = iter_unique_submissions(input_folder, stats, workers, shard_size, dedup_memory_mb)
+    if near_duplicates is not None:
+        submissions = near_duplicates.filter(submissions)
+
+    for simplified, text_length in submissions:
+        stats['total_length'] += text_length
+        stats['total_simplified_posts'] += 1
+        yield simplified
+
+    if near_duplicates is not None:
+        stats['near_duplicate_count'] = near_duplicates.dropped
+        stats['near_duplicates'] = near_duplicates.summary()
+
+# Function to create the near-duplicate filter of the cleaning pass, None without a threshold
+def new_near_duplicate_filter(threshold, num_perm=64):
+    if threshold is None:
+        return None
+    return NearDuplicateFilter(threshold, num_perm, post_of=itemgetter(0))
+
+def new_cleaning_stats():
+    return {'total_simplified_posts': 0, 'total_length': 0, 'duplicate_count': 0, 'dedup': None,
+            'near_duplicate_count': 0, 'near_duplicates': None}
+
+def print_cleaning_summary(stats):
+    print(f"Valid posts and comments read: {stats['total_simplified_posts']}")
+    print(f"Duplicated posts and comments: {stats['duplicate_count']}")
+    if stats['dedup'] is not None:
+        print(stats['dedup'])
+    if stats['near_duplicates'] is not None:
+        print(stats['near_duplicates'])
+
+# Function to filter and simplify posts and comments
+def filter_and_simplify(input_folder, output_file, legacy_json=False, workers=1, shard_size=64 * 1024 * 1024, dedup_memory_mb=1024,
+                        near_duplicate_threshold=None, near_duplicate_report=None):
+    stats = new_cleaning_stats()
+    near_duplicates = new_near_duplicate_filter(near_duplicate_threshold)
+
+    # Stream the simplified posts and comments straight to the output file
+    write_records(iter_cleaned_submissions(input_folder, stats, workers, shard_size, dedup_memory_mb, near_duplicates),
+                  output_file, legacy_json)
+    if near_duplicates is not None:
+        near_duplicates.write_report(near_duplicate_report or output_file + '.near-duplicates.jsonl')
+
+    print_cleaning_summary(stats)
 
 def main():
     parser = argparse.ArgumentParser(
         description='Filter and simplify user submissions JSON files for NLP projects.')
-    parser.add_argument('input_folder', type=str,
-                        help='Path to the input folder containing all user submissions')
+    parser.add_argument('input_folder', type=str, nargs='+',
+                        help='Path to the input folder containing posts.jsonl and comments.jsonl (optionally .zst or .gz); '
+                             'several folders are cleaned and deduplicated together')
     parser.add_argument('output_file', type=str,
-                        help='Path to save the simplified JSON file')
+                        help='Path to save the simplified JSONL file')
+    parser.add_argument('--legacy_json', action='store_true',
+                        help='Write a pretty-printed JSON array instead of one post per line')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes cleaning shards of the input in parallel')
+    parser.add_argument('--shard_size_mb', type=int, default=64,
+                        help='Size of the byte ranges (or decompressed line batches) handed to each process')
+    parser.add_argument('--dedup_memory_mb', type=int, default=1024,
+                        help='Memory for the digests of the texts seen; past it they are spilled to disk')
+    parser.add_argument('--near_duplicate_threshold', type=float, default=None,
+                        help='Also drop posts whose similarity (MinHash estimate of shingle Jaccard) to an earlier one is at least this, e.g. 0.8')
+    parser.add_argument('--near_duplicate_report', type=str, default=None,
+                        help='Where to write the dropped near-duplicate clusters (default: <output_file>.near-duplicates.jsonl)')
+    add_settings_arguments(parser)
 
     args = parser.parse_args()
+    print_settings(settings_from_args(args))
 
-    filter_and_simplify(args.input_folder, args.output_file)
+    filter_and_simplify(args.input_folder, args.output_file, args.legacy_json,
+                        args.workers, args.shard_size_mb * 1024 * 1024, args.dedup_memory_mb,
+                        args.near_duplicate_threshold, args.near_duplicate_report)
 
 if __name__ == '__main__':
     main()
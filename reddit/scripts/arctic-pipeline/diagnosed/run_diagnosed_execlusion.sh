@@ -4,8 +4,9 @@
 # B) No mention of any MH realated term
 # runs execlusion against A) and B) conditions and saves output in condition/final
 # Example run: 
-#     bash run_diagnosed_execlusion.sh adhd_output 20
-#     runs execlusion with 20 minimum posts per user
+#     bash run_diagnosed_execlusion.sh adhd_output
+# Reads diagnosed/diagnosed-users-all-submissions.jsonl, which generate_diagnosed.sh
+# keeps (it passes --persist final_clean)
 
 # Check if the user provided the required arguments
 if [ "$#" -lt 1 ]; then
@@ -15,42 +16,16 @@ fi
 
 # Input file path provided by the user
 INPUT_FOLDER=$1
-# Output file path provided by the user
-FINAL_OUTPUT="${INPUT_FOLDER}/diagnosed/data-diagnosed.final.json"
-FINAL_SUMMARY="${INPUT_FOLDER}/diagnosed/non_mh_subreddits_summary.json"
 
-# Threshold provided by the user
+PIPELINE_DIR="$(cd "$(dirname "$0")/.." && pwd)"
 
-# Hardcoded paths to the Python scripts
-EXECLUDE_MH_SUBREDDITS="exclude_mh_subreddits.py"
-EXECLUDE_MH_MENTIONS="exclude_mh_mentions.py"
-FORMATTER="../preprocessing/format_clean_diagnosed.py"
-
-
-# Intermediate file
-TEMP_OUTPUT="${INPUT_FOLDER}/diagnosed/exclusion.temp.json"
-
-# Execute the first Python script
 echo ""
-echo "A) Execluding submissions made in MH subreddits..."
-python3 "$EXECLUDE_MH_SUBREDDITS" "${INPUT_FOLDER}/diagnosed/diagnosed-users-all-submissions.json" "$TEMP_OUTPUT" 
-rm "${INPUT_FOLDER}/diagnosed/diagnosed-users-all-submissions.json"
-echo "Done excluding mh submissions..."
-echo ""
-
-# Check if the first script executed successfully
-if [ $? -eq 0 ]; then
-    # Execute the second Python script
-    echo "B) Excluding submissions with MH terms..."
-    python3 "$EXECLUDE_MH_MENTIONS" "$TEMP_OUTPUT" "$FINAL_OUTPUT" "$FINAL_SUMMARY"
-    rm $TEMP_OUTPUT
-    echo "Done excluding submissions with  mental health terms."
-    echo ""
-    echo "Generating CYMO format..."
-    echo ""
-    python3 $FORMATTER "${INPUT_FOLDER:0}/diagnosed/data-diagnosed.final.json" "${INPUT_FOLDER}/diagnosed/diagnosed-data.cymo.csv"
-    echo "Done generating cymo format"
-else
-    echo "Error: The first Python script did not execute successfully."
-    exit 1
+echo "Execluding submissions made in MH subreddits and submissions with MH terms..."
+PYTHONPATH="$PIPELINE_DIR" python3 -m pipeline --output_folder "$INPUT_FOLDER" --from exclude_subreddits --until format_diagnosed
+STATUS=$?
+if [ $STATUS -ne 0 ]; then
+    echo "Error: the exclusion stages did not execute successfully."
+    exit $STATUS
 fi
+rm -f "${INPUT_FOLDER}/diagnosed/diagnosed-users-all-submissions.jsonl"
+echo "Done generating cymo format"
@@ -1,12 +1,13 @@
-import json
-import re
 import argparse
+from collections import Counter
+import os
+import sys
 import time
 
-# Function to load posts from JSON file
-def load_json(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.diagnosis import DiagnosisEngine, MultiConditionDiagnosisEngine, diagnose_conditions_parallel, diagnose_parallel
+from common.records import read_records, write_records
+from common.settings import resource_path
 
 # Function to load patterns from text file
 def load_patterns(file_path):
@@ -14,89 +15,86 @@ def load_patterns(file_path):
         return [line.strip() for line in file.readlines()]
 
 # Function to find self-diagnosed users
-def find_self_diagnosed_users(posts, positive_patterns, negative_patterns, bipolar_synonyms):
-    diagnosed_users = []
-    unique_authors = set()
-
-    for post in posts:
-        text = post['selftext']  # Adjust based on your JSON structure
-        author = post['author']
-
-        if author in unique_authors:
-            continue  # Skip if author is already processed
-
-        bipolar_mentioned = False
-        negative_diagnosis_mentioned = False
-        positive_diagnosis_mentioned = False
-
-        # Check for negative diagnosis patterns
-        for pattern in negative_patterns:
-            if re.search(re.escape(pattern), text, re.IGNORECASE):
-                negative_diagnosis_mentioned = True
-                break
-
-        # Check for positive diagnosis patterns
-        for pattern in positive_patterns:
-            match = re.search(re.escape(pattern), text, re.IGNORECASE)
-            if match:
-                positive_diagnosis_mentioned = True
-                start_pos = match.start()
-                end_pos = match.end()
-
-                # Calculate the distance between the positive pattern and bipolar mention
-                for synonym in bipolar_synonyms:
-                    synonym_match = re.search(r'\b' + re.escape(synonym) + r'\b', text, re.IGNORECASE)
-                    if synonym_match:
-                        synonym_start_pos = synonym_match.start()
-                        synonym_end_pos = synonym_match.end()
-                        distance = min(abs(start_pos - synonym_end_pos), abs(end_pos - synonym_start_pos))
-                        if distance <= 40:
-                            bipolar_mentioned = True
-                            break
-
-        # Only consider users who mention bipolar, don't mention negative diagnosis patterns,
-        # mention positive diagnosis patterns, and satisfy the distance condition
-        if bipolar_mentioned and not negative_diagnosis_mentioned and positive_diagnosis_mentioned:
-            diagnosed_users.append(post)
-            unique_authors.add(author)
-
-    return diagnosed_users, list(unique_authors)
+def find_self_diagnosed_users(posts, positive_patterns, negative_patterns, bipolar_synonyms, workers=1, chunk_size=20000):
+    engine = DiagnosisEngine(positive_patterns, negative_patterns, bipolar_synonyms)
+    diagnosed_users = diagnose_parallel(engine, posts, workers, chunk_size)
+
+    # Authors in the order they were first diagnosed
+    unique_authors = [post['author'] for post in diagnosed_users]
+    return diagnosed_users, unique_authors
+
+# Function to find self-diagnosed users of several conditions in one pass,
+# returns a dict of condition -> authors in the order they were first diagnosed
+def find_self_diagnosed_users_by_condition(posts, positive_patterns, negative_patterns, condition_synonyms, workers=1, chunk_size=20000):
+    engine = MultiConditionDiagnosisEngine(positive_patterns, negative_patterns, condition_synonyms)
+    diagnosed_posts = diagnose_conditions_parallel(engine, posts, workers, chunk_size)
+    return {condition: [post['author'] for post in posts] for condition, posts in diagnosed_posts.items()}
+
+# Function to list the conditions with a conditions/<condition>-syns.txt lexicon
+def available_conditions():
+    return sorted(file_name[:-len('-syns.txt')] for file_name in os.listdir(resource_path('conditions'))
+                  if file_name.endswith('-syns.txt'))
+
+# Function to load the positive, negative and condition synonym patterns (under reddit/resources)
+def load_condition_patterns(condition_name):
+    positive_patterns = load_patterns(resource_path('positive_diagnosis_patterns.txt'))
+    negative_patterns = load_patterns(resource_path('negative_diagnosis_patterns.txt'))
+    condition_syns = load_patterns(resource_path('conditions', f'{condition_name}-syns.txt'))
+    return positive_patterns, negative_patterns, condition_syns
 
 def main():
     parser = argparse.ArgumentParser(description='Identify diagnosed users based on their posts.')
-    parser.add_argument('input_file', type=str, help='Path to the input JSON file containing cleaned posts')
-    parser.add_argument('diagnosed_authors_file', type=str, help='Path to save the diagnosed authors JSON file')
-    parser.add_argument('condition_name', type=str, help='Path to save the diagnosed authors JSON file')
+    parser.add_argument('input_file', type=str, help='Path to the input JSONL file containing cleaned posts')
+    parser.add_argument('diagnosed_authors_file', type=str,
+                        help='Path to save the diagnosed authors JSONL file; with several conditions it must contain '
+                             '{condition}, e.g. ../../../data/{condition}_output/diagnosed/diagnosed-usernames.jsonl')
+    parser.add_argument('condition_name', type=str,
+                        help="Condition to diagnose, several separated by commas, or 'all' for every conditions/*-syns.txt")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of processes used for diagnosis (1 disables the pool)')
+    parser.add_argument('--chunk_size', type=int, default=20000, help='Number of posts handed to a process at a time')
+    parser.add_argument('--legacy_json', action='store_true', help='Write a pretty-printed JSON array instead of one username per line')
 
     args = parser.parse_args()
 
-    # Hardcoded paths to the pattern text files
-    positive_patterns_file = '../../../resources/positive_diagnosis_patterns.txt'
-    negative_patterns_file = '../../../resources/negative_diagnosis_patterns.txt'
-    bipolar_synonyms_file = f'../../../resources/conditions/{args.condition_name}-syns.txt'
+    if args.condition_name == 'all':
+        conditions = available_conditions()
+    else:
+        conditions = [condition.strip() for condition in args.condition_name.split(',') if condition.strip()]
+    if len(conditions) > 1 and '{condition}' not in args.diagnosed_authors_file:
+        parser.error('diagnosed_authors_file must contain {condition} when diagnosing several conditions')
 
-    # Load the patterns and synonyms
-    positive_patterns = load_patterns(positive_patterns_file)
-    negative_patterns = load_patterns(negative_patterns_file)
-    condition_syns = load_patterns(bipolar_synonyms_file)
-
-    # Load posts data
-    posts_data = load_json(args.input_file)
+    # Stream posts data
+    posts_data = read_records(args.input_file)
 
     # Start timing the diagnosis process
     start_time = time.time()
 
-    # Find self-diagnosed users
-    diagnosed_users, unique_authors = find_self_diagnosed_users(posts_data, positive_patterns, negative_patterns, condition_syns)
+    if len(conditions) == 1:
+        positive_patterns, negative_patterns, condition_syns = load_condition_patterns(conditions[0])
+        # Find self-diagnosed users
+        diagnosed_users, unique_authors = find_self_diagnosed_users(posts_data, positive_patterns, negative_patterns, condition_syns, args.workers, args.chunk_size)
+        authors_by_condition = {conditions[0]: unique_authors}
+    else:
+        # Every post is matched once against the lexicons of all conditions
+        positive_patterns, negative_patterns, _ = load_condition_patterns(conditions[0])
+        condition_synonyms = {condition: load_condition_patterns(condition)[2] for condition in conditions}
+        authors_by_condition = find_self_diagnosed_users_by_condition(posts_data, positive_patterns, negative_patterns, condition_synonyms, args.workers, args.chunk_size)
+
     # End timing the diagnosis process
     end_time = time.time()
     elapsed_time = end_time - start_time
 
-    print(f"{len(unique_authors)} users diagnosed in {elapsed_time:.2f} seconds. Saved to {args.diagnosed_authors_file}")
+    for condition, unique_authors in authors_by_condition.items():
+        diagnosed_authors_file = args.diagnosed_authors_file.replace('{condition}', condition)
+        os.makedirs(os.path.dirname(diagnosed_authors_file) or '.', exist_ok=True)
+        print(f"{len(unique_authors)} {condition} users diagnosed in {elapsed_time:.2f} seconds. Saved to {diagnosed_authors_file}")
+
+        # Save unique authors, one per line
+        write_records(unique_authors, diagnosed_authors_file, args.legacy_json)
 
-    # Save unique authors to a JSON file
-    with open(args.diagnosed_authors_file, 'w') as f:
-        json.dump(unique_authors, f, indent=4)
+    if len(conditions) > 1:
+        conditions_per_author = Counter(author for authors in authors_by_condition.values() for author in authors)
+        print(f"{sum(1 for count in conditions_per_author.values() if count > 1)} users diagnosed with more than one condition")
 
 if __name__ == '__main__':
     main()
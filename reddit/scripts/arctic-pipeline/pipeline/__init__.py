@@ -0,0 +1 @@
+# Single-process runner of the diagnosed and control stages: python -m pipeline --help
@@ -0,0 +1,125 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.arctic_client import add_client_arguments
+from common.settings import add_settings_arguments, print_settings
+from common.telemetry import write_run_metrics
+from pipeline.runner import StageTimer, check_inputs, run_pipeline, select_stages
+from pipeline.stage_cache import StageCache
+from pipeline.stages import STAGES, PipelineContext, default_output_folder
+
+# Runs the diagnosed and control stages in one process, e.g.
+#     cd reddit/scripts/arctic-pipeline
+#     python3 -m pipeline --condition bipolar --input_folder ~/Downloads/bipolar
+#     python3 -m pipeline --condition bipolar --from candidates
+#     python3 -m pipeline --condition bipolar --from exclude_subreddits --until format_diagnosed --persist all
+# --list prints the stages and the files they read and write. Stages whose
+# inputs, resources, code, settings and options are unchanged since an earlier
+# run reuse its output (see stage_cache.py). Per-stage time, CPU, memory,
+# records, API and cache use of each run are added to <output_folder>/metrics.json.
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the diagnosed and control pipeline stages in one process.')
+    parser.add_argument('--condition', type=str, default=None,
+                        help='Condition name, selects reddit/resources/conditions/<condition>-syns.txt')
+    parser.add_argument('--input_folder', type=str, default=None,
+                        help='Folder with the arctic shift posts.jsonl and comments.jsonl (optionally .zst or .gz), needed by clean')
+    parser.add_argument('--output_folder', type=str, default=None,
+                        help='Condition folder for all outputs (default: reddit/data/<condition>_output)')
+    parser.add_argument('--from', dest='first', type=str, default=None, help='First stage to run')
+    parser.add_argument('--until', dest='last', type=str, default=None, help='Last stage to run')
+    parser.add_argument('--persist', type=str, action='append', default=[], metavar='STAGE',
+                        help="Also write the output of STAGE to its file ('all' for every stage), can be repeated")
+    parser.add_argument('--list', action='store_true', help='List the stages and exit')
+    parser.add_argument('--no_stage_cache', action='store_true',
+                        help='Run every selected stage, without reusing or storing outputs in <output_folder>/.stage_cache')
+    parser.add_argument('--stage_cache_keep', type=int, default=2, help='Cached outputs kept per stage')
+    parser.add_argument('--stage_cache_all', action='store_true',
+                        help='Also cache the outputs of stages that are neither kept nor persisted (e.g. clean)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Processes used for cleaning and diagnosis (1 disables the pools)')
+    parser.add_argument('--shard_size_mb', type=int, default=64, help='Input handed to a cleaning process at a time')
+    parser.add_argument('--dedup_memory_mb', type=int, default=1024,
+                        help='Memory for the digests of the texts seen by clean and format_diagnosed; past it they are spilled to disk')
+    parser.add_argument('--near_duplicate_threshold', type=float, default=None,
+                        help='Also drop cleaned posts this similar to an earlier one (e.g. 0.8), see common/near_duplicates.py')
+    parser.add_argument('--chunk_size', type=int, default=20000, help='Posts handed to a diagnosis process at a time')
+    parser.add_argument('--fetch_workers', type=int, default=16, help='Control candidates fetched and filtered at the same time')
+    parser.add_argument('--prefetch', type=int, default=8, help='Candidates each diagnosed user requests ahead of the one being decided')
+    parser.add_argument('--assignment', type=str, choices=['greedy', 'optimal'], default='greedy',
+                        help='How controls are assigned to diagnosed users, see match_controls.py')
+    parser.add_argument('--candidate_pool', type=int, default=2,
+                        help='With --assignment optimal, eligible candidates per diagnosed user as a multiple of the controls needed')
+    parser.add_argument('--no_prescreen', action='store_true', help='Fetch every candidate history in full without pre-screening')
+    parser.add_argument('--resume', action='store_true', help='Continue interrupted control matching from its progress journal '
+                             '(the whole assignment with --assignment greedy, only the rejected candidates with optimal)')
+    parser.add_argument('--parquet_dir', type=str, default=None,
+                        help='Also write the diagnosed and control posts with typed columns to this Parquet dataset')
+    add_client_arguments(parser)
+    add_settings_arguments(parser)
+
+    args = parser.parse_args()
+
+    if args.list:
+        for stage in STAGES:
+            reads = ', '.join(stage.inputs) or args.input_folder or '--input_folder'
+            print(f"{stage.name:<20} reads {reads:<20} writes {stage.output or '-'}{'' if stage.keep or stage.saves_output else ' (with --persist)'}")
+        return
+
+    try:
+        selected = [stage.name for stage in select_stages(STAGES, args.first, args.last)]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.output_folder is None and args.condition is None:
+        parser.error('--condition or --output_folder is required')
+    if 'diagnose' in selected and args.condition is None:
+        parser.error('--condition is required to run diagnose')
+    if 'clean' in selected and args.input_folder is None:
+        parser.error('--input_folder is required to run clean')
+    unknown = set(args.persist) - set(selected) - {'all'}
+    if unknown:
+        parser.error(f"--persist names stages that do not run: {', '.join(sorted(unknown))}")
+
+    output_folder = args.output_folder or default_output_folder(args.condition)
+    os.makedirs(os.path.join(output_folder, 'diagnosed'), exist_ok=True)
+    os.makedirs(os.path.join(output_folder, 'control'), exist_ok=True)
+
+    start_time = time.time()
+    started_at = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    timer = StageTimer()
+    cache = None if args.no_stage_cache else StageCache(os.path.join(output_folder, '.stage_cache'), args.stage_cache_keep,
+                                                    args.stage_cache_all)
+    with PipelineContext(args, output_folder) as context:
+        try:
+            check_inputs(STAGES, context, args.first, args.last)
+        except ValueError as e:
+            parser.error(str(e))
+        print_settings(context.settings)
+        status = 'failed'
+        try:
+            run_pipeline(STAGES, context, args.first, args.last, args.persist, timer, cache)
+            status = 'ok'
+        finally:
+            print("")
+            print(timer.summary(selected))
+            if cache is not None:
+                print(cache.summary())
+            write_run_metrics(os.path.join(output_folder, 'metrics.json'), {
+                'started_at': started_at,
+                'argv': sys.argv[1:],
+                'condition': args.condition,
+                'status': status,
+                'wall_seconds': round(time.time() - start_time, 3),
+                'stages': timer.metrics(selected),
+            })
+
+    elapsed_time = (time.time() - start_time) / 60
+    print(f"Pipeline finished in {elapsed_time:.2f} m")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Callable, Optional, Tuple
+
+from common.records import RecordWriter, read_records
+from common.telemetry import get_telemetry, peak_child_rss_mb, peak_rss_mb, reset_peak_rss
+
+# In-process execution of the pipeline stages.
+# Stages form a DAG: each one reads the records of the stages it names as
+# inputs and returns an iterator of its own records (or None when it only
+# writes files). Records flow from stage to stage as iterators without
+# touching the disk. An output is written to its file when it is kept, when
+# persisting it was asked for, when the run ends with it, or when more than
+# one stage of the run reads it (each reader then streams the file back).
+# A run covers the stages from --from until --until in execution order, and
+# can start at any stage as long as the outputs it needs from earlier stages
+# are on disk. With a stage cache, stages whose fingerprint is unchanged are
+# not run. Time, CPU, records, memory and API use are measured per stage,
+# excluding what upstream stages do while it waits on them.
+
+# Seconds between two readings of the peak memory as stages take turns
+MEMORY_SAMPLE_SECONDS = 0.1
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One step of the pipeline.
+
+    name:        name used by --from, --until and --persist
+    run:         function(context, *input iterators) -> iterator of records or None
+    inputs:      names of the stages whose records it reads
+    output:      file of its records, relative to the condition folder
+    keep:        always write the output (expensive to recompute, or a result)
+    saves_output: the stage writes its output itself (e.g. in batch files)
+    read_output: function(path) -> records, to read the output back from disk
+    exists:      function(path) -> whether the output is on disk, when that
+                 is more than the path existing (e.g. a folder of batches)
+    output_files: function(path) -> the files of an output that is a folder
+    What the output depends on besides its inputs, for the stage cache:
+    sources:     function(context) -> paths of the files it reads directly
+    resources:   files under reddit/resources, may use {option} placeholders
+    code:        modules whose code decides the output
+    settings:    keys of config/global.json it reads
+    options:     command line options that change the output
+    """
+    name: str
+    run: Callable
+    inputs: Tuple[str, ...] = ()
+    output: Optional[str] = None
+    keep: bool = False
+    saves_output: bool = False
+    read_output: Callable = read_records
+    exists: Callable = os.path.exists
+    output_files: Optional[Callable] = None
+    sources: Optional[Callable] = None
+    resources: Tuple[str, ...] = ()
+    code: Tuple[ModuleType, ...] = ()
+    settings: Tuple[str, ...] = ()
+    options: Tuple[str, ...] = ()
+
+
+class StageTimer:
+    """Exclusive wall and CPU time, records in and out and peak memory per stage.
+
+    API and cache counters are attributed through the process telemetry,
+    which is told which stage is running. Peak memory is read (and restarted,
+    on Linux) when a stage finishes, and at most every MEMORY_SAMPLE_SECONDS
+    when a step of a stage ends; the peak since the last reading goes to that
+    stage. Where it cannot be restarted it is the peak of the process so far.
+    """
+
+    def __init__(self, telemetry=None):
+        self.seconds = {}
+        self.cpu_seconds = {}
+        self.child_cpu_seconds = {}
+        self.records = {}
+        self.records_in = {}
+        self.peak_rss_mb = {}
+        self.peak_child_rss_mb = {}
+        self.cached = set()
+        self.telemetry = telemetry or get_telemetry()
+        self._running = []
+        self._peak_resets = reset_peak_rss()
+        self._memory_read_at = time.perf_counter()
+        self._child_peak = peak_child_rss_mb()
+
+    @contextmanager
+    def running(self, name):
+        start = time.perf_counter()
+        # os.times() has CPU time of this process and of its finished children in one call
+        start_times = os.times()
+        self._running.append(name)
+        self.telemetry.stage = name
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            times = os.times()
+            cpu = times.user + times.system - start_times.user - start_times.system
+            child_cpu = (times.children_user + times.children_system
+                         - start_times.children_user - start_times.children_system)
+            self._running.pop()
+            self.telemetry.stage = self._running[-1] if self._running else None
+            self._add(name, elapsed, cpu, child_cpu)
+            if self._running:
+                # The caller was only waiting on this stage
+                self._add(self._running[-1], -elapsed, -cpu, -child_cpu)
+            if time.perf_counter() - self._memory_read_at >= MEMORY_SAMPLE_SECONDS:
+                self._read_memory(name)
+
+    def _add(self, name, seconds, cpu_seconds, child_cpu_seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.cpu_seconds[name] = self.cpu_seconds.get(name, 0.0) + cpu_seconds
+        self.child_cpu_seconds[name] = self.child_cpu_seconds.get(name, 0.0) + child_cpu_seconds
+
+    # Function to note the memory high-water mark since the last reading under a stage
+    def _read_memory(self, name):
+        self.peak_rss_mb[name] = max(self.peak_rss_mb.get(name, 0.0), peak_rss_mb())
+        if self._peak_resets:
+            reset_peak_rss()
+        self._memory_read_at = time.perf_counter()
+
+    # Function to note the peak memory once a stage is done, and that of the
+    # child processes (worker pools) that finished while it ran
+    def finished(self, name):
+        self._read_memory(name)
+        child_peak = peak_child_rss_mb()
+        if child_peak > self._child_peak:
+            self.peak_child_rss_mb[name] = child_peak
+            self._child_peak = child_peak
+
+    # Generator of the records of a stage, timing every step it takes
+    def timed(self, name, records):
+        self.records.setdefault(name, 0)
+        iterator = iter(records)
+        while True:
+            with self.running(name):
+                try:
+                    record = next(iterator)
+                except StopIteration:
+                    self.finished(name)
+                    return
+            self.records[name] += 1
+            yield record
+
+    # Generator counting the records a stage reads
+    def counted(self, name, records):
+        self.records_in.setdefault(name, 0)
+        for record in records:
+            self.records_in[name] += 1
+            yield record
+
+    def summary(self, names):
+        lines = ["---------------------stage timing---------------------"]
+        total = 0.0
+        for name in names:
+            seconds = max(self.seconds.get(name, 0.0), 0.0)
+            total += seconds
+            records = self.records.get(name)
+            records = '-' if records is None else str(records)
+            cached = ' (cached)' if name in self.cached else ''
+            lines.append(f"{name:<20} {seconds:>10.2f} s {records:>12} records{cached}")
+        lines.append(f"{'total':<20} {total:>10.2f} s")
+        return '\n'.join(lines)
+
+    # Function to get the metrics of the stages as a JSON-serializable dict
+    def metrics(self, names):
+        stages = {}
+        for name in names:
+            seconds = max(self.seconds.get(name, 0.0), 0.0)
+            records = self.records.get(name)
+            records_in = self.records_in.get(name)
+            # Throughput is of the records read, a filter stage writes few of them
+            processed = records if records_in is None else records_in
+            rss = self.peak_rss_mb.get(name)
+            child_rss = self.peak_child_rss_mb.get(name)
+            stages[name] = {
+                'cached': name in self.cached,
+                'wall_seconds': round(seconds, 3),
+                'cpu_seconds': round(max(self.cpu_seconds.get(name, 0.0), 0.0), 3),
+                'child_cpu_seconds': round(max(self.child_cpu_seconds.get(name, 0.0), 0.0), 3),
+                'records_in': records_in,
+                'records_out': records,
+                'records_per_second': round(processed / seconds, 1) if processed and seconds > 0 else None,
+                'peak_rss_mb': round(rss, 1) if rss is not None else None,
+                'peak_child_rss_mb': round(child_rss, 1) if child_rss is not None else None,
+                **self.telemetry.stage_metrics(name),
+            }
+        return stages
+
+
+# Function to check stage names and order the stages so inputs come first
+def ordered_stages(stages):
+    by_name = {}
+    for stage in stages:
+        if stage.name in by_name:
+            raise ValueError(f"Duplicate stage '{stage.name}'")
+        by_name[stage.name] = stage
+
+    ordered = []
+    state = {}
+
+    def visit(stage, path):
+        if state.get(stage.name) == 'done':
+            return
+        if state.get(stage.name) == 'visiting':
+            raise ValueError(f"Stages depend on each other in a cycle: {' -> '.join(path + [stage.name])}")
+        state[stage.name] = 'visiting'
+        for input_name in stage.inputs:
+            if input_name not in by_name:
+                raise ValueError(f"Stage '{stage.name}' reads unknown stage '{input_name}'")
+            visit(by_name[input_name], path + [stage.name])
+        state[stage.name] = 'done'
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage, [])
+    return ordered
+
+
+# Function to pick the stages from first until last (inclusive), in execution order
+def select_stages(stages, first=None, last=None):
+    stages = ordered_stages(stages)
+    names = [stage.name for stage in stages]
+    for name in (first, last):
+        if name is not None and name not in names:
+            raise ValueError(f"Unknown stage '{name}', expected one of: {', '.join(names)}")
+
+    start = names.index(first) if first is not None else 0
+    end = names.index(last) + 1 if last is not None else len(names)
+    if start >= end:
+        raise ValueError(f"Stage '{first}' runs after '{last}'")
+    return stages[start:end]
+
+
+# Generator writing records to a file as they pass through
+def _persisted(records, file_path):
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    with RecordWriter(file_path) as writer:
+        for record in records:
+            writer.write(record)
+            yield record
+
+
+# Function to check that the inputs a run reads from earlier stages are on
+# disk, raises ValueError naming the first one missing
+def check_inputs(stages, context, first=None, last=None):
+    all_stages = {stage.name: stage for stage in stages}
+    selected = select_stages(stages, first, last)
+    selected_names = {stage.name for stage in selected}
+    for stage in selected:
+        for input_name in stage.inputs:
+            if input_name in selected_names:
+                continue
+            upstream = all_stages[input_name]
+            if upstream.output is None or not upstream.exists(context.path(upstream.output)):
+                # Kept outputs and outputs the stage saves itself need no --persist
+                persist = '' if upstream.keep or upstream.saves_output else f" with --persist {input_name}"
+                raise ValueError(
+                    f"Stage '{stage.name}' needs the output of '{input_name}', which is not on disk. "
+                    f"Run '{input_name}'{persist} first.")
+
+
+# Generator recording a stage's fingerprint once it has written all its output
+def _recorded(records, cache, stage, path, fingerprint):
+    yield from records
+    cache.record_output(stage, path, fingerprint)
+
+
+# Function to run the selected stages. Outputs read from earlier stages have
+# to be on disk; `persist` names stages whose output is written as well
+# ('all' for every stage). With a StageCache, stages whose fingerprint is
+# unchanged reuse their cached output instead of running. Returns the timer.
+def run_pipeline(stages, context, first=None, last=None, persist=(), timer=None, cache=None):
+    all_stages = {stage.name: stage for stage in stages}
+    selected = select_stages(stages, first, last)
+    selected_names = {stage.name for stage in selected}
+    timer = timer or StageTimer()
+
+    readers = {stage.name: [] for stage in selected}
+    for stage in selected:
+        for input_name in stage.inputs:
+            if input_name in readers:
+                readers[input_name].append(stage.name)
+
+    check_inputs(stages, context, first, last)
+
+    def open_input(input_name):
+        if input_name in streams:
+            return streams.pop(input_name)
+        return all_stages[input_name].read_output(context.path(all_stages[input_name].output))
+
+    def input_fingerprint(input_name):
+        if input_name in fingerprints:
+            return fingerprints[input_name]
+        upstream = all_stages[input_name]
+        return cache.output_fingerprint(upstream, context.path(upstream.output))
+
+    # Streamed stages run interleaved, so their output is mixed in the log
+    print(f"Running stages: {' -> '.join(stage.name for stage in selected)}")
+    streams = {}
+    fingerprints = {}
+    for stage in selected:
+        output_path = context.path(stage.output) if stage.output is not None else None
+        stored = stage.keep or 'all' in persist or stage.name in persist
+        write = output_path is not None and not stage.saves_output and (stored or len(readers[stage.name]) != 1)
+
+        fingerprint = None
+        if cache is not None:
+            fingerprint = cache.fingerprint(stage, context, [input_fingerprint(name) for name in stage.inputs])
+            fingerprints[stage.name] = fingerprint
+        opened = {input_name: open_input(input_name) for input_name in stage.inputs}
+        inputs = [timer.counted(stage.name, opened[input_name]) for input_name in stage.inputs]
+
+        hit = False
+        if fingerprint is not None:
+            if stage.saves_output:
+                hit = cache.output_fingerprint(stage, output_path) == fingerprint
+            else:
+                hit = cache.has_entry(stage, fingerprint)
+        if hit:
+            # Its inputs are left unread, so upstream stages only it reads never
+            # run; those that save their own output still do, to write it again
+            for input_name, records in opened.items():
+                if input_name in selected_names and input_name not in timer.cached and all_stages[input_name].saves_output:
+                    deque(records, maxlen=0)
+            print(f"{stage.name}: output unchanged, reusing it")
+            cache.hits.append(stage.name)
+            timer.cached.add(stage.name)
+            if len(readers[stage.name]) != 1:
+                if write:
+                    cache.restore(stage, fingerprint, output_path)
+                continue
+            if stage.saves_output:
+                records = stage.read_output(output_path)
+            else:
+                if write:
+                    cache.restore(stage, fingerprint, output_path)
+                records = cache.load(stage, fingerprint)
+        else:
+            with timer.running(stage.name):
+                records = stage.run(context, *inputs)
+            if records is None:
+                timer.finished(stage.name)
+            if fingerprint is not None and stage.saves_output:
+                if records is None:
+                    cache.record_output(stage, output_path, fingerprint)
+                else:
+                    records = _recorded(records, cache, stage, output_path, fingerprint)
+            elif fingerprint is not None and records is not None and (stored or cache.every_stage):
+                records = cache.store(stage, fingerprint, records, output_path if write else None)
+            elif write and records is not None:
+                records = _persisted(records, output_path)
+
+        if records is None:
+            continue
+        records = timer.timed(stage.name, records)
+
+        if len(readers[stage.name]) == 1:
+            # Streamed into its only reader, which pulls it when it runs
+            streams[stage.name] = records
+        else:
+            # Run now: the output is on disk for its readers, or nobody reads it
+            deque(records, maxlen=0)
+
+    return timer
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import shutil
+
+from common.records import RecordWriter, read_records
+from common.settings import resource_path
+
+# Content-addressed cache of stage outputs.
+# A stage's fingerprint hashes everything its output depends on: the
+# fingerprints of its inputs, the content of its source files (raw dumps),
+# resource files and code, and the settings and options it reads. A stage
+# run before with the same fingerprint is not run again: its records are
+# read back from the cache. Changing one threshold therefore recomputes only
+# the stages that read it and the stages downstream of them. Only the
+# outputs of kept and persisted stages are stored, unless every_stage is
+# set; the others are cheap to recompute from them.
+#
+# Layout, under <condition folder>/.stage_cache:
+#     <stage>/<fingerprint>.jsonl  cached records of a stage
+#     state.json                   fingerprints of the files at the stages'
+#                                  output paths, and file content hashes
+#                                  (reused while size and mtime are unchanged)
+# Stages that write their own output (batch files, CSVs) are not copied into
+# the cache; their files are reused while their recorded fingerprint matches.
+# For an output folder that is the names, sizes and mtimes of its files.
+
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class StageCache:
+    """Fingerprints stages and stores or restores their outputs.
+
+    cache_dir:   directory of the cache, created if needed
+    keep:        cached outputs kept per stage, the most recent first
+    every_stage: also store the outputs of stages neither kept nor persisted
+    """
+
+    def __init__(self, cache_dir, keep=2, every_stage=False):
+        self.cache_dir = cache_dir
+        self.keep = keep
+        self.every_stage = every_stage
+        self.hits = []
+        os.makedirs(cache_dir, exist_ok=True)
+        self._state_path = os.path.join(cache_dir, 'state.json')
+        self._state = {'outputs': {}, 'hashes': {}}
+        if os.path.exists(self._state_path):
+            with open(self._state_path, 'r', encoding='utf-8') as file:
+                self._state.update(json.load(file))
+
+    def _save_state(self):
+        with open(self._state_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self._state, file, indent=4)
+        os.replace(self._state_path + '.tmp', self._state_path)
+
+    # Function to hash the content of a file, reusing the hash while its size and mtime are unchanged
+    def file_hash(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self._state['hashes'].get(path)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        self._state['hashes'][path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        self._save_state()
+        return digest.hexdigest()
+
+    # Function to compute the fingerprint of a stage from the fingerprints of its inputs.
+    # Returns None when an input has no fingerprint (the stage then always runs).
+    def fingerprint(self, stage, context, input_fingerprints):
+        if any(fingerprint is None for fingerprint in input_fingerprints):
+            return None
+        args = vars(context.args)
+        description = {
+            'stage': stage.name,
+            'inputs': list(input_fingerprints),
+            'sources': [self.file_hash(path) for path in stage.sources(context)] if stage.sources else [],
+            'resources': {name: self.file_hash(resource_path(*name.format(**args).split('/')))
+                          for name in stage.resources},
+            'code': {module.__name__: self.file_hash(module.__file__) for module in stage.code},
+            'settings': {key: getattr(context.settings, key) for key in stage.settings},
+            'options': {key: args.get(key) for key in stage.options},
+        }
+        encoded = json.dumps(description, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    # Function to get the fingerprint of what is on disk at a stage's output path,
+    # None if it cannot be told (e.g. a folder not written by the runner)
+    def output_fingerprint(self, stage, path):
+        if not stage.exists(path):
+            return None
+        recorded = self._state['outputs'].get(stage.name)
+        stat = _stat(stage, path)
+        if recorded is not None and stat is not None and recorded['stat'] == stat:
+            return recorded['fingerprint']
+        if os.path.isfile(path):
+            return self.file_hash(path)
+        return None
+
+    # Function to record the fingerprint of the output now at a stage's output path
+    def record_output(self, stage, path, fingerprint):
+        self._state['outputs'][stage.name] = {'fingerprint': fingerprint, 'stat': _stat(stage, path)}
+        self._save_state()
+
+    def entry_path(self, stage, fingerprint):
+        return os.path.join(self.cache_dir, stage.name, f'{fingerprint}.jsonl')
+
+    def has_entry(self, stage, fingerprint):
+        return os.path.exists(self.entry_path(stage, fingerprint))
+
+    # Function to copy a cached output to the stage's output path
+    def restore(self, stage, fingerprint, path):
+        if self.output_fingerprint(stage, path) == fingerprint:
+            return
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        shutil.copyfile(self.entry_path(stage, fingerprint), path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self.record_output(stage, path, fingerprint)
+
+    # Generator storing records in the cache as they pass through; the entry
+    # only appears once the records are complete. With output_path the
+    # complete output is also copied there.
+    def store(self, stage, fingerprint, records, output_path=None):
+        entry = self.entry_path(stage, fingerprint)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        with RecordWriter(entry + '.tmp') as writer:
+            for record in records:
+                writer.write(record)
+                yield record
+        os.replace(entry + '.tmp', entry)
+        self._prune(stage)
+        if output_path is not None:
+            self.restore(stage, fingerprint, output_path)
+
+    # Function to read the cached records of a stage
+    def load(self, stage, fingerprint):
+        entry = self.entry_path(stage, fingerprint)
+        os.utime(entry)  # Most recently used, pruned last
+        return read_records(entry)
+
+    # Function to drop the oldest cached outputs of a stage beyond `keep`
+    def _prune(self, stage):
+        stage_dir = os.path.join(self.cache_dir, stage.name)
+        entries = [os.path.join(stage_dir, name) for name in os.listdir(stage_dir) if name.endswith('.jsonl')]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for entry in entries[self.keep:]:
+            os.remove(entry)
+
+    def summary(self):
+        if not self.hits:
+            return "Stage cache: no stage reused"
+        return f"Stage cache: reused {', '.join(self.hits)}"
+
+
+# Function to describe a stage's output by size and mtime, and an output
+# folder by the names, sizes and mtimes of the stage's files in it. None for
+# a folder without a list of its files (it is shared with other stages).
+def _stat(stage, path):
+    if stage.output_files is not None:
+        return [[os.path.basename(file_path), *_stat_file(file_path)] for file_path in stage.output_files(path)]
+    if os.path.isdir(path):
+        return None
+    return _stat_file(path)
+
+
+def _stat_file(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
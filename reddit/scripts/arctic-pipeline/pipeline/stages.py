@@ -0,0 +1,208 @@
+import os
+
+from common import assignment, candidate_scheduler, columnar, dedup, diagnosis, near_duplicates, normalize, patterns, shards
+from common.arctic_client import client_from_args
+from common.patterns import PatternMatcher
+from common.settings import PROJECT_ROOT, resource_path, settings_from_args
+from control import get_control_candidates, match_controls
+from diagnosed import (exclude_mh_mentions, exclude_mh_subreddits, fetch_all_user_submissions,
+                       final_cleaning, initial_cleaning, separate_diagnosed_users)
+from pipeline.runner import Stage
+from preprocessing import format_clean_control, format_clean_diagnosed
+
+# The diagnosed and control stages of generate_diagnosed.sh and
+# generate_control.sh as functions of the pipeline runner. Each stage calls
+# the same code as its script and prints the same summary; file names in the
+# condition folder are the ones the scripts use. Each stage also declares
+# what its output depends on, for the stage cache.
+
+DATA_DIR = os.path.join(PROJECT_ROOT, 'reddit', 'data')
+FINAL_OUTPUT = 'diagnosed/data-diagnosed.final.jsonl'
+SUMMARY_OUTPUT = 'diagnosed/non_mh_subreddits_summary.jsonl'
+DIAGNOSED_CSV = 'diagnosed/diagnosed-data.cymo.csv'
+CONTROL_CSV = 'control/control-data.cymo.csv'
+NEAR_DUPLICATES_REPORT = 'diagnosed/near-duplicates.jsonl'
+
+
+class PipelineContext:
+    """What the stages of one run share: options, settings and one API client.
+
+    args:          parsed command line of the pipeline
+    output_folder: condition folder the stage outputs are relative to
+    """
+
+    def __init__(self, args, output_folder):
+        self.args = args
+        self.output_folder = output_folder
+        self.settings = settings_from_args(args)
+        self._client = None
+
+    def path(self, file_name):
+        return os.path.join(self.output_folder, file_name)
+
+    # The client is only opened when a stage needs the API
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = client_from_args(self.args)
+        return self._client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._client is not None:
+            print(self._client.summary())
+            self._client.close()
+        return False
+
+
+# Function to get the default condition folder of a condition
+def default_output_folder(condition_name):
+    return os.path.join(DATA_DIR, f'{condition_name}_output')
+
+
+def clean(context):
+    stats = initial_cleaning.new_cleaning_stats()
+    near_duplicate_filter = initial_cleaning.new_near_duplicate_filter(context.args.near_duplicate_threshold)
+    yield from initial_cleaning.iter_cleaned_submissions(
+        context.args.input_folder, stats, context.args.workers, context.args.shard_size_mb * 1024 * 1024,
+        context.args.dedup_memory_mb, near_duplicate_filter)
+    if near_duplicate_filter is not None:
+        near_duplicate_filter.write_report(context.path(NEAR_DUPLICATES_REPORT))
+    initial_cleaning.print_cleaning_summary(stats)
+
+
+def diagnose(context, posts):
+    condition_patterns = separate_diagnosed_users.load_condition_patterns(context.args.condition)
+    _, unique_authors = separate_diagnosed_users.find_self_diagnosed_users(
+        posts, *condition_patterns, context.args.workers, context.args.chunk_size)
+    print(f"{len(unique_authors)} {context.args.condition} users diagnosed")
+    yield from unique_authors
+
+
+def fetch(context, usernames):
+    threshold = context.settings.minimum_posts_per_diagnosed_user
+    stats = fetch_all_user_submissions.new_fetch_stats()
+    # Usernames are read here rather than on the client's event loop thread
+    usernames = list(usernames)
+    yield from fetch_all_user_submissions.iter_qualified_users(usernames, context.client, threshold, stats)
+    fetch_all_user_submissions.print_fetch_summary(stats, threshold)
+
+
+def final_clean(context, users):
+    stats = {'total_simplified_posts': 0, 'total_length': 0}
+    yield from final_cleaning.simplify_users(users, stats, context.settings.min_diagnosed_post_word_count)
+    final_cleaning.print_final_cleaning_summary(stats)
+
+
+def exclude_subreddits(context, users):
+    subreddits = exclude_mh_subreddits.load_subreddits(resource_path('mh_subreddits.txt'))
+    count = 0
+    for user in exclude_mh_subreddits.iter_non_mental_health_users(users, subreddits):
+        count += 1
+        yield user
+    print(f"Kept {count} users with non-mental health posts")
+
+
+def exclude_mentions(context, users):
+    matcher = PatternMatcher(exclude_mh_mentions.load_patterns(resource_path('mh_patterns.txt')))
+    threshold = context.settings.non_mh_posts_per_diagnosed_user
+    stats = exclude_mh_mentions.new_exclusion_stats()
+    yield from exclude_mh_mentions.iter_qualified_users(users, matcher, threshold, stats)
+    exclude_mh_mentions.print_exclusion_summary(
+        stats, threshold, context.path(FINAL_OUTPUT), context.path(SUMMARY_OUTPUT))
+
+
+def summarize(context, users):
+    for user in users:
+        yield exclude_mh_mentions.summarize_user(user)
+
+
+def format_diagnosed(context, users):
+    format_clean_diagnosed.write_users_csv(users, context.path(DIAGNOSED_CSV), context.args.parquet_dir,
+                                           context.args.dedup_memory_mb)
+
+
+def candidates(context, summary):
+    return get_control_candidates.expand_users_with_candidates(list(summary), context.client)
+
+
+def match(context, expanded_users):
+    args = context.args
+    os.makedirs(context.path('control'), exist_ok=True)
+    mental_health_subreddits = match_controls.load_patterns(resource_path('mh_subreddits.txt'))
+    mental_health_patterns = PatternMatcher(match_controls.load_patterns(resource_path('mh_patterns.txt')))
+    return match_controls.iter_control_matches(
+        list(expanded_users), context.client, mental_health_subreddits, mental_health_patterns,
+        context.path('control'), context.settings.controls_per_diagnosed, 'matched_control',
+        context.settings.control_batch_size, args.fetch_workers, args.prefetch, not args.no_prescreen,
+        args.assignment, args.candidate_pool, args.resume)
+
+
+def format_control(context, results):
+    total_posts, invalid_posts, duplicate_posts = format_clean_control.format_to_csv(
+        results, context.path(CONTROL_CSV), context.args.parquet_dir)
+    print(f"------------summary-----------")
+    print(f"Total number of posts processed: {total_posts}")
+    print(f"Number of invalid posts ignored: {invalid_posts}")
+    print(f"Number of duplicate posts ignored: {duplicate_posts}")
+
+
+# Function to read the matched controls back from their batch files
+def read_matched_controls(folder_path):
+    return format_clean_control.load_json_files_from_folder(folder_path)[0]
+
+
+# Function to list the matched control batch files, the output of match in
+# the control folder
+def matched_control_files(folder_path):
+    if not os.path.isdir(folder_path):
+        return []
+    return [os.path.join(folder_path, file_name) for file_name in format_clean_control.list_batch_files(folder_path)]
+
+
+# Function to tell whether any matched control batch is on disk; the control
+# folder itself always exists
+def has_matched_controls(folder_path):
+    return bool(matched_control_files(folder_path))
+
+
+# Function to list the raw dumps clean reads
+def clean_sources(context):
+    return [source_file for source_file, _, _ in initial_cleaning.iter_sources(context.args.input_folder)]
+
+
+# Options that choose where API data comes from
+CLIENT_OPTIONS = ('api_base_url', 'offline', 'author_store')
+
+# In execution order; generate_diagnosed.sh ran clean to format_diagnosed and
+# generate_control.sh candidates to format_control
+STAGES = [
+    Stage('clean', clean, output='diagnosed/cleaned-pre-diagnosis-data.jsonl',
+          sources=clean_sources, code=(initial_cleaning, dedup, near_duplicates, normalize, shards),
+          options=('near_duplicate_threshold',)),
+    Stage('diagnose', diagnose, ('clean',), 'diagnosed/diagnosed-usernames.jsonl',
+          resources=('positive_diagnosis_patterns.txt', 'negative_diagnosis_patterns.txt', 'conditions/{condition}-syns.txt'),
+          code=(separate_diagnosed_users, diagnosis, patterns)),
+    Stage('fetch', fetch, ('diagnose',), 'all_user_submissions.jsonl', keep=True,
+          code=(fetch_all_user_submissions,), settings=('minimum_posts_per_diagnosed_user',), options=CLIENT_OPTIONS),
+    Stage('final_clean', final_clean, ('fetch',), 'diagnosed/diagnosed-users-all-submissions.jsonl',
+          code=(final_cleaning,), settings=('min_diagnosed_post_word_count',)),
+    Stage('exclude_subreddits', exclude_subreddits, ('final_clean',), 'diagnosed/exclusion.temp.jsonl',
+          resources=('mh_subreddits.txt',), code=(exclude_mh_subreddits,)),
+    Stage('exclude_mentions', exclude_mentions, ('exclude_subreddits',), FINAL_OUTPUT, keep=True,
+          resources=('mh_patterns.txt',), code=(exclude_mh_mentions, patterns), settings=('non_mh_posts_per_diagnosed_user',)),
+    Stage('summarize', summarize, ('exclude_mentions',), SUMMARY_OUTPUT, keep=True, code=(exclude_mh_mentions,)),
+    Stage('format_diagnosed', format_diagnosed, ('exclude_mentions',), DIAGNOSED_CSV, saves_output=True,
+          code=(format_clean_diagnosed, dedup, normalize, columnar), options=('parquet_dir',)),
+    Stage('candidates', candidates, ('summarize',), 'control/candidate-controls.jsonl', keep=True,
+          code=(get_control_candidates,), options=CLIENT_OPTIONS),
+    Stage('match', match, ('candidates',), 'control', saves_output=True, read_output=read_matched_controls,
+          exists=has_matched_controls, output_files=matched_control_files,
+          resources=('mh_subreddits.txt', 'mh_patterns.txt'), code=(match_controls, assignment, candidate_scheduler, dedup, patterns),
+          settings=('controls_per_diagnosed', 'control_batch_size'),
+          options=CLIENT_OPTIONS + ('assignment', 'candidate_pool', 'resume')),
+    Stage('format_control', format_control, ('match',), CONTROL_CSV, saves_output=True,
+          code=(format_clean_control, normalize, columnar), options=('parquet_dir',)),
+]
@@ -1,60 +1,36 @@
 import json
 import csv
 import argparse
-import re
 import os
+import sys
+from contextlib import nullcontext
 
-def preprocess_text(text):
-    # Lowercasing Text
-    text = text.lower()
-    
-    # Removing Hyperlinks
-    text = re.sub(r'https?://\S+', '', text)
-    
-    # Removing HTML Tags
-    text = re.sub(r'<.*?>', '', text)
-    
-    # Removing User Mentions
-    text = re.sub(r'@\w+', '', text)
-    
-    # Removing HTML Entities
-    text = re.sub(r'&\w+;', ' ', text)
-    
-    # Processing Hashtags
-    text = re.sub(r'#(\w+)', r'\1', text)
-    
-    # Preserving Certain Characters and Whitespace
-    text = re.sub(r'[^a-zA-Z0-9\s\.\'\!\?\,\;\-]', ' ', text)
-    
-    # Normalizing Spaces and Punctuation
-    text = re.sub(r'(?<=[.,!?])(?=[^\s])', r' ', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'(\.|\!|\?|\,|\;)\1+', r'\1', text)  # Deduplicate sentence-ending symbols
-    text = re.sub(r'\.{3,}', '.', text)  # Replace consecutive ellipsis with a single full stop
-    text = text.strip()
-    text = re.sub(r'(?<=\w)([.,;])(?=\S)', r'\1 ', text)
-    
-    # Ensure post ends with a full stop if it doesn't end with a sentence-ending symbol
-    if not re.search(r'[.!?]$', text):
-        text += '.'
-    
-    return text
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.columnar import CONTROL_LABEL, ParquetPostWriter
+from common.normalize import normalize_text as preprocess_text
+
+# Function to list the matched control batch files in a folder, by name
+def list_batch_files(folder_path):
+    return sorted(f for f in os.listdir(folder_path) if f.startswith("matched_control_batch") and f.endswith(".json"))
 
 def load_json_files_from_folder(folder_path):
-    json_files = [f for f in os.listdir(folder_path) if f.startswith("matched_control_batch") and f.endswith(".json")]
+    json_files = list_batch_files(folder_path)
     data = []
     for file in json_files:
         with open(os.path.join(folder_path, file), 'r', encoding='utf-8') as f:
             data.extend(json.load(f))
     return data, len(json_files)
 
-def format_to_csv(data, output_file):
+# Function to write the control posts as TID,text rows, and with
+# parquet_dir as the control partition of a Parquet dataset too
+def format_to_csv(data, output_file, parquet_dir=None):
     total_posts = 0
     invalid_posts = 0
     duplicate_posts = 0
     seen_post_ids = set()
+    parquet_writer = ParquetPostWriter(parquet_dir, CONTROL_LABEL) if parquet_dir else nullcontext()
 
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile, parquet_writer:
         fieldnames = ['TID', 'text']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
@@ -74,6 +50,9 @@ def format_to_csv(data, output_file):
                         else:
                             cleaned_text = preprocess_text(text)
                             writer.writerow({'TID': tid, 'text': cleaned_text})
+                            if parquet_dir:
+                                parquet_writer.write(control_user, post['id'], post['subreddit'], post.get('created_utc'),
+                                                     cleaned_text, diagnosed_user)
                             seen_post_ids.add(tid)
                             total_posts += 1
                     else:
@@ -84,17 +63,21 @@ def main():
     parser = argparse.ArgumentParser(description='Format JSON data to CSV and perform text cleaning.')
     parser.add_argument('input_folder', type=str, help='Path to the input folder containing JSON files')
     parser.add_argument('output_file', type=str, help='Path to the output CSV file')
+    parser.add_argument('--parquet_dir', type=str, default=None,
+                        help='Also write the posts with typed columns to this Parquet dataset (label=0 partition)')
 
     args = parser.parse_args()
 
     data, file_count = load_json_files_from_folder(args.input_folder)
-    total_posts, invalid_posts, duplicate_posts = format_to_csv(data, args.output_file)
+    total_posts, invalid_posts, duplicate_posts = format_to_csv(data, args.output_file, args.parquet_dir)
 
     print(f"------------summary-----------")
     print(f"Number of files read: {file_count}")
     print(f"Total number of posts processed: {total_posts}")
     print(f"Number of invalid posts ignored: {invalid_posts}")
     print(f"Number of duplicate posts ignored: {duplicate_posts}")
+    if args.parquet_dir:
+        print(f"Posts also written to {args.parquet_dir}")
 
 if __name__ == '__main__':
     main()
@@ -1,52 +1,27 @@
-import json
 import csv
 import argparse
-import re
+import os
+import sys
+from contextlib import nullcontext
 
-def daniel_cleaning(text):
-    # Lowercasing Text
-    text = text.lower()
-    
-    # Removing Hyperlinks
-    text = re.sub(r'https?://\S+', '', text)
-    
-    # Removing HTML Tags
-    text = re.sub(r'<.*?>', '', text)
-    
-    # Removing User Mentions
-    text = re.sub(r'@\w+', '', text)
-    
-    # Removing HTML Entities
-    text = re.sub(r'&\w+;', ' ', text)
-    
-    # Processing Hashtags
-    text = re.sub(r'#(\w+)', r'\1', text)
-    
-    # Preserving Certain Characters and Whitespace
-    text = re.sub(r'[^a-zA-Z0-9\s\.\'\!\?\,\;\-]', ' ', text)
-    
-    # Normalizing Spaces and Punctuation
-    text = re.sub(r'(?<=[.,!?])(?=[^\s])', r' ', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'(\.|\!|\?|\,|\;)\1+', r'\1', text)  # Deduplicate sentence-ending symbols
-    text = re.sub(r'\.{3,}', '.', text)  # Replace consecutive ellipsis with a single full stop
-    text = text.strip()
-    text = re.sub(r'(?<=\w)([.,;])(?=\S)', r'\1 ', text)
-    
-    # Ensure post ends with a full stop if it doesn't end with a sentence-ending symbol
-    if not re.search(r'[.!?]$', text):
-        text += '.'
-    
-    return text
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.columnar import DIAGNOSED_LABEL, ParquetPostWriter
+from common.dedup import DigestSet
+from common.normalize import normalize_text as daniel_cleaning
+from common.records import read_records
 
-def convert_json_to_csv(input_file, output_file):
-    with open(input_file, 'r', encoding='utf-8') as json_file:
-        data = json.load(json_file)
+def convert_json_to_csv(input_file, output_file, parquet_dir=None, dedup_memory_mb=1024):
+    # Users are streamed one at a time from the JSONL (or legacy JSON) file
+    write_users_csv(read_records(input_file), output_file, parquet_dir, dedup_memory_mb)
 
-    unique_texts = set()
+# Function to write the posts of an iterable of users as TID,text rows,
+# and with parquet_dir as the diagnosed partition of a Parquet dataset too
+def write_users_csv(data, output_file, parquet_dir=None, dedup_memory_mb=1024):
+    unique_texts = DigestSet(memory_mb=dedup_memory_mb)
     duplicate_count = 0
+    parquet_writer = ParquetPostWriter(parquet_dir, DIAGNOSED_LABEL) if parquet_dir else nullcontext()
 
-    with open(output_file, 'w', newline='', encoding='utf-8') as csv_file:
+    with open(output_file, 'w', newline='', encoding='utf-8') as csv_file, parquet_writer, unique_texts:
         csv_writer = csv.writer(csv_file)
         # Write the header
         csv_writer.writerow(['TID', 'text'])
@@ -57,25 +32,33 @@ def convert_json_to_csv(input_file, output_file):
                 tid = f"1_{username}_{post['id']}"
                 text = post.get('selftext', '')
                 cleaned_text = daniel_cleaning(text)
-                if cleaned_text in unique_texts:
+                if not unique_texts.add(cleaned_text):
                     duplicate_count += 1
                     continue
-                unique_texts.add(cleaned_text)
                 csv_writer.writerow([tid, cleaned_text])
+                if parquet_dir:
+                    parquet_writer.write(username, post['id'], post.get('subreddit'), post.get('created_utc'), cleaned_text)
 
     print(f"Data has been successfully converted to {output_file}")
+    if parquet_dir:
+        print(f"{parquet_writer.rows} posts written to {parquet_dir}")
     print(f"# of duplicated posts: {duplicate_count}")
+    print(unique_texts.summary())
     if len(unique_texts) > 0:
         print(f"Ratio of duplicate posts: {duplicate_count/len(unique_texts)}")
 
 def main():
     parser = argparse.ArgumentParser(description='Convert JSON file to CSV with specified format and perform text cleaning.')
-    parser.add_argument('input_file', type=str, help='Path to the input JSON file')
+    parser.add_argument('input_file', type=str, help='Path to the input JSONL file')
     parser.add_argument('output_file', type=str, help='Path to save the output CSV file')
+    parser.add_argument('--parquet_dir', type=str, default=None,
+                        help='Also write the posts with typed columns to this Parquet dataset (label=1 partition)')
+    parser.add_argument('--dedup_memory_mb', type=int, default=1024,
+                        help='Memory for the digests of the texts seen; past it they are spilled to disk')
 
     args = parser.parse_args()
 
-    convert_json_to_csv(args.input_file, args.output_file)
+    convert_json_to_csv(args.input_file, args.output_file, args.parquet_dir, args.dedup_memory_mb)
 
 if __name__ == '__main__':
     main()
@@ -1,45 +1,14 @@
 import json
 import csv
 import argparse
-import re
 import os
+import sys
+from contextlib import nullcontext
 from collections import defaultdict
 
-def preprocess_text(text):
-    # Lowercasing Text
-    text = text.lower()
-    
-    # Removing Hyperlinks
-    text = re.sub(r'https?://\S+', '', text)
-    
-    # Removing HTML Tags
-    text = re.sub(r'<.*?>', '', text)
-    
-    # Removing User Mentions
-    text = re.sub(r'@\w+', '', text)
-    
-    # Removing HTML Entities
-    text = re.sub(r'&\w+;', ' ', text)
-    
-    # Processing Hashtags
-    text = re.sub(r'#(\w+)', r'\1', text)
-    
-    # Preserving Certain Characters and Whitespace
-    text = re.sub(r'[^a-zA-Z0-9\s\.\'\!\?\,\;\-]', ' ', text)
-    
-    # Normalizing Spaces and Punctuation
-    text = re.sub(r'(?<=[.,!?])(?=[^\s])', r' ', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'(\.|\!|\?|\,|\;)\1+', r'\1', text)  # Deduplicate sentence-ending symbols
-    text = re.sub(r'\.{3,}', '.', text)  # Replace consecutive ellipsis with a single full stop
-    text = text.strip()
-    text = re.sub(r'(?<=\w)([.,;])(?=\S)', r'\1 ', text)
-    
-    # Ensure post ends with a full stop if it doesn't end with a sentence-ending symbol
-    if not re.search(r'[.!?]$', text):
-        text += '.'
-    
-    return text
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.columnar import CONTROL_LABEL, ParquetPostWriter
+from common.normalize import normalize_text as preprocess_text
 
 def load_json_files_from_folder(folder_path):
     json_files = []
@@ -54,15 +23,16 @@ def load_json_files_from_folder(folder_path):
             data.extend(json.load(f))
     return data, len(json_files)
 
-def format_to_csv(data, output_file, diagnosed_summary_file, control_threshold=None):
+def format_to_csv(data, output_file, diagnosed_summary_file, control_threshold=None, parquet_dir=None):
     total_posts = 0
     invalid_posts = 0
     duplicate_posts = 0
     seen_post_ids = set()
+    parquet_writer = ParquetPostWriter(parquet_dir, CONTROL_LABEL) if parquet_dir else nullcontext()
     diagnosed_counts = defaultdict(int)
     users_meeting_threshold = 0
 
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile, parquet_writer:
         fieldnames = ['TID', 'text']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
@@ -86,6 +56,9 @@ def format_to_csv(data, output_file, diagnosed_summary_file, control_threshold=N
                         else:
                             cleaned_text = preprocess_text(text)
                             writer.writerow({'TID': tid, 'text': cleaned_text})
+                            if parquet_dir:
+                                parquet_writer.write(control_user, post['id'], post['subreddit'], post.get('created_utc'),
+                                                     cleaned_text, diagnosed_user)
                             seen_post_ids.add(tid)
                             total_posts += 1
                     else:
@@ -109,17 +82,21 @@ def main():
     parser.add_argument('output_file', type=str, help='Path to the output CSV file')
     parser.add_argument('diagnosed_summary_file', type=str, help='Path to the output CSV file for diagnosed summary')
     parser.add_argument('--control_threshold', type=int, default=9, help='Minimum number of controls required to include a diagnosed user')
+    parser.add_argument('--parquet_dir', type=str, default=None,
+                        help='Also write the posts with typed columns to this Parquet dataset (label=0 partition)')
 
     args = parser.parse_args()
 
     data, file_count = load_json_files_from_folder(args.input_folder)
-    total_posts, invalid_posts, duplicate_posts, unique_diagnosed_count, users_meeting_threshold = format_to_csv(data, args.output_file, args.diagnosed_summary_file, args.control_threshold)
+    total_posts, invalid_posts, duplicate_posts, unique_diagnosed_count, users_meeting_threshold = format_to_csv(data, args.output_file, args.diagnosed_summary_file, args.control_threshold, args.parquet_dir)
 
     print(f"------------summary-----------")
     print(f"Number of files read: {file_count}")
     print(f"Total number of posts processed: {total_posts}")
     print(f"Number of invalid posts ignored: {invalid_posts}")
     print(f"Number of duplicate posts ignored: {duplicate_posts}")
+    if args.parquet_dir:
+        print(f"Posts also written to {args.parquet_dir}")
     print(f"Number of unique diagnosed users: {unique_diagnosed_count}")
     print(f"Number of diagnosed users meeting the control threshold: {users_meeting_threshold}")
 
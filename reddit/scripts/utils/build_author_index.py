@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arctic-pipeline'))
+from common.author_store import DEFAULT_STORE_PATH, AuthorStoreBuilder, find_dump_files
+
+# Builds the offline author store read by --offline in
+# fetch_all_user_submissions.py and match_controls.py.
+# Example run:
+#     python3 build_author_index.py ~/Downloads/dumps --store ../../data/author_store
+# where ~/Downloads/dumps holds monthly dumps such as RS_2024-06.zst and
+# RC_2024-06.zst, or per-subreddit *_posts.jsonl / *_comments.jsonl files.
+
+def main():
+    parser = argparse.ArgumentParser(description='Index local Reddit dump files by author for offline lookups.')
+    parser.add_argument('dumps', type=str, nargs='+', help='Dump files, or folders searched for .zst/.gz/.jsonl/.ndjson files')
+    parser.add_argument('--store', type=str, default=DEFAULT_STORE_PATH, help='Directory of the author store to (re)build')
+    parser.add_argument('--partitions', type=int, default=64, help='Number of partition files; raise for dumps larger than memory')
+
+    args = parser.parse_args()
+
+    dump_files = [dump_file for path in args.dumps for dump_file in find_dump_files(path)]
+    if not dump_files:
+        print("No dump files found")
+        sys.exit(1)
+
+    start_time = time.time()
+    builder = AuthorStoreBuilder(args.store, args.partitions)
+    builder.build(dump_files)
+    elapsed_time = (time.time() - start_time) / 60
+
+    print("-------------Summary-----------------")
+    print(f"Dump files: {len(dump_files)}")
+    print(builder.summary())
+    print(f"Author store written to {args.store}")
+    print(f"Time taken for indexing: {elapsed_time:.2f} m")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
-import json
 import argparse
 import os
+import sys
 
-def split_json_file(input_file, output_dir, sections=2):
-    # Read the JSON file
-    with open(input_file, 'r', encoding='utf-8') as file:
-        data = json.load(file)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arctic-pipeline'))
+from common.records import read_records, write_records
+
+def split_json_file(input_file, output_dir, sections=2, legacy_json=False):
+    # Read the JSONL (or legacy JSON) summary file
+    data = list(read_records(input_file))
     
     # Determine the size of each section
     total_length = len(data)
@@ -22,11 +24,10 @@ def split_json_file(input_file, output_dir, sections=2):
         os.makedirs(section_dir, exist_ok=True)
         
         # Define the output file path
-        output_file = os.path.join(section_dir, 'non_mh_subreddits_summary.json')
+        output_file = os.path.join(section_dir, 'non_mh_subreddits_summary.jsonl')
         
-        # Write the section to a new JSON file
-        with open(output_file, 'w', encoding='utf-8') as outfile:
-            json.dump(section_data, outfile, indent=4)
+        # Write the section to a new JSONL file
+        write_records(section_data, output_file, legacy_json)
         
         print(f"Section {i+1} saved to {output_file}")
 
@@ -35,8 +36,9 @@ if __name__ == "__main__":
     parser.add_argument('input_file', type=str, help='Path to the input JSON file')
     parser.add_argument('output_dir', type=str, help='Directory to save the output JSON files')
     parser.add_argument('--sections', type=int, default=2, help='Number of sections to split the file into (default: 2)')
+    parser.add_argument('--legacy_json', action='store_true', help='Write pretty-printed JSON arrays instead of one user per line')
 
     args = parser.parse_args()
     
     # Split the JSON file
-    split_json_file(args.input_file, args.output_dir, args.sections)
+    split_json_file(args.input_file, args.output_dir, args.sections, args.legacy_json)
@@ -1,29 +1,48 @@
 import os
-import json
+import sys
 import argparse
 
-def process_files(input_folder):
-    comments_output_path = os.path.join(input_folder, 'combined_commentsw.jsonl')
-    posts_output_path = os.path.join(input_folder, 'combined_postsw.jsonl')
-
-    with open(comments_output_path, 'w') as comments_outfile, open(posts_output_path, 'w') as posts_outfile:
-        for filename in os.listdir(input_folder):
-            if filename.endswith('_comments.jsonl'):
-                with open(os.path.join(input_folder, filename), 'r') as infile:
-                    for line in infile:
-                        comments_outfile.write(line)
-            elif filename.endswith('_posts.jsonl'):
-                with open(os.path.join(input_folder, filename), 'r') as infile:
-                    for line in infile:
-                        posts_outfile.write(line)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arctic-pipeline'))
+from common.compression import BUFFER_SIZE, base_name, open_binary, open_output_binary
+
+# Input files may be plain, .zst or .gz; they are decompressed while copying
+COMPRESSED_EXTENSIONS = {'none': '', 'zst': '.zst', 'gz': '.gz'}
+
+# Function to copy one (possibly compressed) file into an open output, line terminated
+def copy_lines(input_path, outfile):
+    last_chunk = b'\n'
+    with open_binary(input_path) as infile:
+        while True:
+            chunk = infile.read(BUFFER_SIZE)
+            if not chunk:
+                break
+            outfile.write(chunk)
+            last_chunk = chunk
+    if not last_chunk.endswith(b'\n'):
+        outfile.write(b'\n')  # Keep the last record of this file off the next file's first line
+
+def process_files(input_folder, compress='none', level=None):
+    extension = COMPRESSED_EXTENSIONS[compress]
+    comments_output_path = os.path.join(input_folder, 'combined_commentsw.jsonl' + extension)
+    posts_output_path = os.path.join(input_folder, 'combined_postsw.jsonl' + extension)
+
+    with open_output_binary(comments_output_path, level) as comments_outfile, open_output_binary(posts_output_path, level) as posts_outfile:
+        for filename in sorted(os.listdir(input_folder)):
+            if base_name(filename).endswith('_comments.jsonl'):
+                copy_lines(os.path.join(input_folder, filename), comments_outfile)
+            elif base_name(filename).endswith('_posts.jsonl'):
+                copy_lines(os.path.join(input_folder, filename), posts_outfile)
             print(f'processed file {filename}')
-    
+
     print(f"Combined comments written to: {comments_output_path}")
     print(f"Combined posts written to: {posts_output_path}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Combine JSONL files for comments and posts.')
-    parser.add_argument('input_folder', type=str, help='The input folder containing the JSONL files.')
+    parser.add_argument('input_folder', type=str, help='The input folder containing the JSONL files (plain, .zst or .gz).')
+    parser.add_argument('--compress', type=str, choices=sorted(COMPRESSED_EXTENSIONS), default='none',
+                        help='Compress the combined files with zstd or gzip.')
+    parser.add_argument('--level', type=int, default=None, help='Compression level, the library default if omitted.')
     args = parser.parse_args()
 
-    process_files(args.input_folder)
+    process_files(args.input_folder, args.compress, args.level)